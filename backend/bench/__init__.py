@@ -0,0 +1 @@
+# Benchmarks and load-testing helpers (run from the backend directory, e.g. `python -m bench.bench_http_pool`)
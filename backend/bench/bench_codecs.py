@@ -0,0 +1,106 @@
+"""
+Per-request CPU cost on the status hot path, in microseconds per call:
+
+- decoding an upstream status body (`response.json()` vs `decode_json`)
+  and mapping it to our status shape,
+- encoding the result (`jsonable_encoder` + `JSONResponse` vs
+  `FastJSONResponse`),
+- serializing a HeyGen start request body,
+- a full in-process GET /api/status/{provider}/{task_id} answered from
+  the status cache (routing, middleware and encoding, no upstream call).
+
+    cd backend && python -m bench.bench_codecs --iterations 20000
+
+Without orjson installed, `decode_json` and `FastJSONResponse` fall back to
+the standard library, so the comparison shows what orjson buys.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Callable
+
+import httpx
+
+TALK = {
+    "id": "tlk_0123456789abcdef",
+    "user_id": "auth0|0123456789",
+    "source_url": "https://example.com/uploads/ab/ab0123456789.jpg",
+    "created_at": "2024-01-01T00:00:00.000Z",
+    "created_by": "auth0|0123456789",
+    "status": "done",
+    "started_at": "2024-01-01T00:00:01.000Z",
+    "modified_at": "2024-01-01T00:00:30.000Z",
+    "result_url": "https://d-id-talks-prod.s3.us-west-2.amazonaws.com/auth0/tlk_0123456789abcdef/result.mp4",
+    "duration": 6.4,
+    "config": {"stitch": False, "fluent": False, "pad_audio": 0.0, "align_driver": True},
+    "audio_url": "https://d-id-talks-prod.s3.us-west-2.amazonaws.com/auth0/tlk_0123456789abcdef/audio.wav",
+    "metadata": {"num_faces": 1, "resolution": {"width": 512, "height": 512}},
+}
+
+
+def per_call_us(fn: Callable[[], object], iterations: int) -> float:
+    for _ in range(min(iterations, 1000)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def per_request_us(client: httpx.AsyncClient, path: str, iterations: int) -> float:
+    for _ in range(min(iterations, 200)):
+        await client.get(path)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await client.get(path)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def row(label: str, before: float, after: float) -> None:
+    print(f"  {label:<28} {before:8.2f}us -> {after:8.2f}us  ({before / after:4.1f}x)")
+
+
+async def main(args: argparse.Namespace) -> None:
+    os.environ.setdefault("DID_KEY", "bench")
+    os.environ.setdefault("HEYGEN_KEY", "bench")
+    os.environ.setdefault("HEYGEN_AVATAR_ID", "avatar")
+    os.environ.setdefault("HEYGEN_VOICE_ID", "voice")
+    os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from main import app
+    from provider_router import status_cache
+    from services import codecs
+    from services.provider_registry import provider_registry
+
+    did = provider_registry.get("did")
+    heygen = provider_registry.get("heygen")
+    response = httpx.Response(200, content=json.dumps(TALK).encode())
+    result = did._normalize_talk(TALK)
+    n = args.iterations
+
+    print(f"orjson: {'yes' if codecs.orjson is not None else 'no (standard library fallback)'}")
+    row("decode + normalize", per_call_us(lambda: did._normalize_talk(response.json()), n),
+        per_call_us(lambda: did._normalize_talk(codecs.decode_json(response)), n))
+    row("encode status response", per_call_us(lambda: JSONResponse(jsonable_encoder(result)).body, n),
+        per_call_us(lambda: codecs.FastJSONResponse(result).body, n))
+    row("encode request body", per_call_us(lambda: json.dumps(heygen._build_video_body("", "hi")).encode(), n),
+        per_call_us(lambda: codecs.json_dumps(heygen._build_video_body("", "hi")), n))
+
+    status_cache.put(("did", TALK["id"]), result)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cached = await per_request_us(client, f"/api/status/did/{TALK['id']}", max(1, n // 10))
+    print(f"  {'GET /api/status (cache hit)':<28} {cached:8.2f}us per request, end to end in process")
+    await provider_registry.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""
+Compare a fresh httpx.AsyncClient per request (the old behaviour) with the
+shared ProviderHTTPClient pool against a local stub server.
+
+    cd backend && python -m bench.bench_http_pool --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from bench.stub_server import StubServer
+from services.http_client import ProviderHTTPClient
+
+PATH = "/api/v1/userImage2Video/stub"
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def fresh_client_call(base_url: str) -> None:
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        response = await client.get(f"{base_url}{PATH}")
+        response.raise_for_status()
+
+
+async def run(label: str, call, total: int, concurrency: int) -> None:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<14} requests={total:<6} rps={total / elapsed:8.1f} "
+        f"p50={statistics.median(latencies):6.2f}ms p95={percentile(latencies, 95):6.2f}ms "
+        f"p99={percentile(latencies, 99):6.2f}ms"
+    )
+
+
+async def main(total: int, concurrency: int) -> None:
+    with StubServer() as server:
+        await run("fresh-client", lambda: fresh_client_call(server.base_url), total, concurrency)
+
+        pooled = ProviderHTTPClient("stub", server.base_url)
+        await pooled.open()
+
+        async def pooled_call() -> None:
+            response = await pooled.get(PATH)
+            response.raise_for_status()
+
+        try:
+            await run("pooled-client", pooled_call, total, concurrency)
+        finally:
+            await pooled.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,75 @@
+"""
+Measure cold-start cost: how long `import main` takes in a fresh
+interpreter, which modules dominate it, and how long uvicorn needs until
+/api/health answers.
+
+    cd backend && python -m bench.bench_startup --runs 10
+
+Run it with the environment you deploy with (provider keys set), since
+only configured providers would be built eagerly.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from bench.load_test import BACKEND_DIR, spawn, wait_ready
+from bench.stub_server import free_port
+
+
+def import_time(env: Dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND_DIR, env=env, check=True)
+    return time.perf_counter() - started
+
+
+def heaviest_imports(env: Dict[str, str], top: int) -> List[Tuple[int, str]]:
+    """Modules with the largest self import time (microseconds), from -X importtime."""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stderr
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+async def time_to_ready(env: Dict[str, str]) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    process = spawn(["-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env)
+    try:
+        await wait_ready(f"http://127.0.0.1:{port}/api/health")
+        return time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ)
+        env.setdefault("DATA_DIR", data_dir)
+        imports = [import_time(env) for _ in range(args.runs)]
+        ready = [await time_to_ready(env) for _ in range(max(1, args.runs // 2))]
+        print(f"import main      median {statistics.median(imports) * 1000:8.1f}ms  min {min(imports) * 1000:8.1f}ms")
+        print(f"ready (uvicorn)  median {statistics.median(ready) * 1000:8.1f}ms  min {min(ready) * 1000:8.1f}ms")
+        print("heaviest modules (self time):")
+        for self_us, name in heaviest_imports(env, args.top):
+            print(f"  {self_us / 1000:7.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+"""
+Repeated-fetch throughput for /api/uploads/{filename}: full downloads versus
+conditional revalidation (304) and byte-range reads.
+
+    cd backend && python -m bench.bench_static --requests 2000 --concurrency 20 --size-kb 2048
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from bench.stub_server import StubServer
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+async def run(client: httpx.AsyncClient, label: str, path: str, headers: dict, total: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    received = 0
+    statuses = set()
+
+    async def fetch() -> None:
+        nonlocal received
+        async with semaphore:
+            response = await client.get(path, headers=headers)
+            statuses.add(response.status_code)
+            received += len(response.content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<14} status={sorted(statuses)} rps={total / elapsed:8.1f} "
+        f"transferred={received / (1024 * 1024):8.1f}MB"
+    )
+
+
+async def main(total: int, concurrency: int, size_kb: int) -> None:
+    from main import app
+
+    payload = PNG_HEADER + os.urandom(size_kb * 1024 - len(PNG_HEADER))
+    with StubServer(app) as server:
+        async with httpx.AsyncClient(base_url=server.base_url, timeout=60.0) as client:
+            response = await client.post("/api/upload-image", files={"file": ("bench.png", payload, "image/png")})
+            response.raise_for_status()
+            filename = response.json()["filename"]
+            path = f"/api/uploads/{filename}"
+            etag = (await client.get(path)).headers["etag"]
+
+            await run(client, "full", path, {}, total, concurrency)
+            await run(client, "if-none-match", path, {"If-None-Match": etag}, total, concurrency)
+            await run(client, "range-64k", path, {"Range": "bytes=0-65535"}, total, concurrency)
+
+    upload_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+    os.remove(os.path.join(upload_dir, filename))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--size-kb", type=int, default=2048)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.size_kb))
@@ -0,0 +1,105 @@
+"""
+Load test for /api/upload-image: concurrent multi-megabyte uploads against
+the real app while sampling the server process RSS.
+
+    cd backend && python -m bench.bench_upload --uploads 40 --concurrency 10 --size-mb 15
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+
+from bench.stub_server import StubServer
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, current_rss_mb())
+            time.sleep(self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+async def main(uploads: int, concurrency: int, size_mb: int) -> None:
+    from main import app
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as sample:
+        sample.write(JPEG_HEADER)
+        remaining = size_mb * 1024 * 1024 - len(JPEG_HEADER)
+        while remaining > 0:
+            chunk = os.urandom(min(remaining, 1024 * 1024))
+            sample.write(chunk)
+            remaining -= len(chunk)
+    semaphore = asyncio.Semaphore(concurrency)
+    filenames = []
+
+    with StubServer(app) as server:
+        baseline = current_rss_mb()
+        sampler = RSSSampler()
+        sampler.start()
+        started = time.perf_counter()
+
+        async with httpx.AsyncClient(base_url=server.base_url, timeout=120.0) as client:
+
+            async def upload() -> None:
+                async with semaphore:
+                    # Passing an open file lets httpx stream the body instead of buffering it
+                    with open(sample.name, "rb") as handle:
+                        response = await client.post(
+                            "/api/upload-image", files={"file": ("photo.jpg", handle, "image/jpeg")}
+                        )
+                    response.raise_for_status()
+                    filenames.append(response.json()["filename"])
+
+            await asyncio.gather(*(upload() for _ in range(uploads)))
+
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+
+    os.remove(sample.name)
+    upload_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(upload_dir, filename))
+        except FileNotFoundError:
+            pass
+
+    total_mb = uploads * size_mb
+    print(
+        f"uploads={uploads} concurrency={concurrency} size={size_mb}MB "
+        f"throughput={total_mb / elapsed:.1f}MB/s elapsed={elapsed:.2f}s"
+    )
+    print(
+        f"rss baseline={baseline:.1f}MB peak={sampler.peak:.1f}MB "
+        f"growth={sampler.peak - baseline:.1f}MB (uploaded {total_mb}MB in total)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--size-mb", type=int, default=15)
+    args = parser.parse_args()
+    asyncio.run(main(args.uploads, args.concurrency, args.size_mb))
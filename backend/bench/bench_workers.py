@@ -0,0 +1,98 @@
+"""
+Measure how /api/status and /api/upload-image throughput scales with the
+number of uvicorn worker processes sharing state through SHARED_STATE.
+
+    cd backend && python -m bench.bench_workers --workers 1,2,4 --shared-state sqlite
+
+For each worker count the app is started with `uvicorn --workers N` against
+the provider simulator and driven at a fixed concurrency; the report shows
+requests per second and the speed-up relative to the first worker count.
+Scaling is bounded by the host's cores (the load generator needs one too).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from typing import Dict, List
+
+import httpx
+
+from bench.load_test import backend_env, run_step, sample_jpeg, spawn, wait_ready
+from bench.stub_server import free_port
+
+
+async def measure(workers: int, simulator_url: str, args: argparse.Namespace) -> Dict[str, Dict]:
+    port = free_port()
+    backend_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = backend_env(simulator_url, data_dir)
+        env["SHARED_STATE"] = args.shared_state
+        process = spawn(
+            ["-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+            env,
+        )
+        try:
+            await wait_ready(f"{backend_url}/api/health")
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=backend_url, limits=limits, timeout=120.0) as client:
+                task_ids: List[str] = []
+                for _ in range(20):
+                    response = await client.post("/api/start-image2video", json={
+                        "provider": "did", "image_url": "https://example.com/portrait.jpg",
+                        "text": f"scaling {uuid.uuid4().hex}",
+                    })
+                    response.raise_for_status()
+                    task_ids.append(response.json()["task_id"])
+                upload_body = sample_jpeg(args.upload_kb)
+
+                async def status(client: httpx.AsyncClient, index: int) -> httpx.Response:
+                    return await client.get(f"/api/status/did/{task_ids[index % len(task_ids)]}")
+
+                async def upload(client: httpx.AsyncClient, index: int) -> httpx.Response:
+                    content = upload_body + uuid.uuid4().bytes
+                    return await client.post("/api/upload-image", files={"file": ("scale.jpg", content, "image/jpeg")})
+
+                return {
+                    "status": await run_step(client, status, args.requests, args.concurrency),
+                    "upload": await run_step(client, upload, max(1, args.requests // 4), args.concurrency),
+                }
+        finally:
+            process.terminate()
+            process.wait(timeout=15)
+
+
+async def main(args: argparse.Namespace) -> None:
+    simulator_port = free_port()
+    simulator_url = f"http://127.0.0.1:{simulator_port}"
+    simulator = spawn(
+        ["-m", "bench.provider_simulator", "--port", str(simulator_port), "--latency-ms", "20", "--job-seconds", "5"],
+        dict(os.environ),
+    )
+    try:
+        await wait_ready(f"{simulator_url}/_simulator/stats")
+        print(f"host cores={os.cpu_count()} shared_state={args.shared_state} concurrency={args.concurrency}")
+        print(f"{'workers':>7} {'scenario':<8} {'rps':>9} {'speedup':>8} {'p50':>10} {'p99':>10} {'errors':>7}")
+        baseline: Dict[str, float] = {}
+        for workers in args.workers:
+            results = await measure(workers, simulator_url, args)
+            for scenario, step in results.items():
+                baseline.setdefault(scenario, step["rps"])
+                print(
+                    f"{workers:>7} {scenario:<8} {step['rps']:>9.1f} {step['rps'] / baseline[scenario]:>7.2f}x "
+                    f"{step['p50_ms']:>8.2f}ms {step['p99_ms']:>8.2f}ms {step['errors']:>7}"
+                )
+    finally:
+        simulator.terminate()
+        simulator.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=lambda value: [int(part) for part in value.split(",")], default=[1, 2, 4])
+    parser.add_argument("--shared-state", default="sqlite", choices=("memory", "sqlite", "redis"))
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000, help="status requests per run (uploads use a quarter)")
+    parser.add_argument("--upload-kb", type=int, default=256)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,173 @@
+"""
+Exercise the resilience layer (services/resilience.py) against a local
+fault-injecting stub: 429 with Retry-After, transient 5xx, a provider that is
+down (circuit breaker), refused connections, an exhausted local connection
+pool and rate limiting; plus
+idempotent replay of start requests whose render failed.
+
+    cd backend && python -m bench.fault_injection
+
+Prints one PASS/FAIL line per scenario and exits non-zero on any failure.
+"""
+import asyncio
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+from fastapi import HTTPException
+
+from bench.stub_server import StubServer, free_port
+from services.http_client import ProviderHTTPClient
+from services.idempotency import IdempotencyLayer, MemoryIdempotencyStore
+from services.resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy, RetryPolicy, TokenBucket
+
+
+class FaultInjector:
+    """ASGI app whose next responses are scripted per path, e.g. [429, 200]."""
+
+    def __init__(self):
+        self.scripts: Dict[str, List[int]] = {}
+        self.hits: Dict[str, int] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        path = scope["path"]
+        self.hits[path] = self.hits.get(path, 0) + 1
+        script = self.scripts.get(path) or [200]
+        status = script.pop(0) if len(script) > 1 else script[0]
+        headers = [(b"content-type", b"application/json")]
+        if status == 429:
+            headers.append((b"retry-after", b"1"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+def make_client(name: str, base_url: str, rate: float = 0, burst: float = 1,
+                threshold: int = 3, reset: float = 1.0) -> ProviderHTTPClient:
+    client = ProviderHTTPClient(name, base_url)
+    client.policy = ResiliencePolicy(
+        name,
+        TokenBucket(rate, burst),
+        CircuitBreaker(name, failure_threshold=threshold, reset_timeout=reset),
+        RetryPolicy(attempts=3, base_delay=0.05, max_delay=0.2, max_retry_after=2.0),
+    )
+    return client
+
+
+results: List[bool] = []
+
+
+def check(name: str, ok: bool, detail: str) -> None:
+    results.append(ok)
+    print(f"{'PASS' if ok else 'FAIL'}  {name}: {detail}")
+
+
+async def main() -> int:
+    injector = FaultInjector()
+    with StubServer(injector) as server:
+        # 429 + Retry-After: both GET and POST are retried after the advertised delay
+        client = make_client("stub", server.base_url)
+        injector.scripts["/throttled"] = [429, 200]
+        started = time.perf_counter()
+        response = await client.post("/throttled")
+        elapsed = time.perf_counter() - started
+        check("429 honours Retry-After", response.status_code == 200 and elapsed >= 0.9,
+              f"status={response.status_code} hits={injector.hits['/throttled']} waited={elapsed:.2f}s")
+
+        # Transient 503: GET retried with jittered backoff, POST is not (could duplicate a render)
+        injector.scripts["/flaky-get"] = [503, 503, 200]
+        response = await client.get("/flaky-get")
+        check("GET retries transient 5xx", response.status_code == 200 and injector.hits["/flaky-get"] == 3,
+              f"status={response.status_code} hits={injector.hits['/flaky-get']}")
+        injector.scripts["/flaky-post"] = [503, 200]
+        response = await client.post("/flaky-post")
+        check("POST does not retry 5xx", response.status_code == 503 and injector.hits["/flaky-post"] == 1,
+              f"status={response.status_code} hits={injector.hits['/flaky-post']}")
+        await client.aclose()
+
+        # Provider down: the circuit opens, then fails fast, then recovers through a probe
+        client = make_client("down", server.base_url, threshold=3, reset=1.0)
+        injector.scripts["/down"] = [500]
+        await client.get("/down")
+        hits_when_open = injector.hits["/down"]
+        started = time.perf_counter()
+        try:
+            await client.get("/down")
+            fast_failed = False
+        except CircuitOpenError:
+            fast_failed = True
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        check("circuit opens and fails fast", fast_failed and injector.hits["/down"] == hits_when_open,
+              f"state={client.policy.breaker.state} upstream_hits={injector.hits['/down']} fail_fast={elapsed_ms:.2f}ms")
+        await asyncio.sleep(1.1)
+        injector.scripts["/down"] = [200]
+        response = await client.get("/down")
+        check("half-open probe closes circuit", response.status_code == 200 and client.policy.breaker.state == "closed",
+              f"status={response.status_code} state={client.policy.breaker.state}")
+        await client.aclose()
+
+        # Rate limiting: 5 burst + 20/s means 45 calls need at least 2 seconds
+        client = make_client("limited", server.base_url, rate=20, burst=5)
+        started = time.perf_counter()
+        await asyncio.gather(*(client.get("/limited") for _ in range(45)))
+        elapsed = time.perf_counter() - started
+        check("token bucket limits rate", elapsed >= 1.9, f"45 calls in {elapsed:.2f}s at 20/s burst 5")
+        await client.aclose()
+
+    # Connection refused: the request never left, so even a POST is retried
+    client = make_client("refused", f"http://127.0.0.1:{free_port()}", threshold=10)
+    try:
+        await client.post("/start")
+        refused_ok = False
+    except httpx.ConnectError:
+        refused_ok = True
+    except HTTPException:
+        refused_ok = False
+    check("POST retries refused connections", refused_ok and client.policy.retries == 2,
+          f"retries={client.policy.retries}")
+    await client.aclose()
+
+    # Our own connection pool is exhausted: retried, but the provider's circuit stays closed
+    client = make_client("pool", "http://127.0.0.1", threshold=2)
+
+    async def exhausted_pool() -> httpx.Response:
+        raise httpx.PoolTimeout("no connection available")
+
+    for _ in range(2):
+        try:
+            await client.policy.execute(exhausted_pool, idempotent=False)
+        except httpx.PoolTimeout:
+            pass
+    breaker = client.policy.breaker
+    check("pool timeouts do not open the circuit", breaker.state == "closed" and breaker.failures == 0
+          and client.policy.retries == 4, f"state={breaker.state} failures={breaker.failures} retries={client.policy.retries}")
+    await client.aclose()
+
+    # Idempotent replay: a repeat returns the running task, but a failed render is started again
+    layer = IdempotencyLayer(MemoryIdempotencyStore(window=600))
+    statuses: Dict[str, str] = {}
+
+    async def start() -> Dict:
+        task_id = f"task-{len(statuses) + 1}"
+        statuses[task_id] = "processing"
+        return {"task_id": task_id, "status": "processing"}
+
+    async def replayable(result: Dict) -> bool:
+        return statuses[result["task_id"]] != "failed"
+
+    first = await layer.run("fingerprint", start, replayable=replayable)
+    repeat = await layer.run("fingerprint", start, replayable=replayable)
+    statuses[first["task_id"]] = "failed"
+    retried = await layer.run("fingerprint", start, replayable=replayable)
+    check("resubmitting a failed render starts a new task",
+          repeat.get("idempotent_replay") and repeat["task_id"] == first["task_id"]
+          and not retried.get("idempotent_replay") and retried["task_id"] != first["task_id"],
+          f"first={first['task_id']} repeat={repeat['task_id']} after_failure={retried['task_id']}")
+
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,225 @@
+"""
+Load test the backend against the provider simulator.
+
+Starts bench.provider_simulator and the app (uvicorn main:app) as separate
+processes, then drives start, status and upload requests at each
+concurrency level and prints throughput and p50/p99 latency.
+
+    cd backend && python -m bench.load_test --concurrency 1,8,32 --requests 200
+    cd backend && python -m bench.load_test --save baseline.json
+    cd backend && python -m bench.load_test --baseline baseline.json --tolerance 0.25
+
+With --baseline the run exits non-zero when any scenario's p99 grew, or its
+throughput dropped, by more than the tolerance. Extra backend settings are
+passed through the environment, e.g. STATUS_CACHE_TTL=0 to measure uncached
+status lookups. Provider rate limits default to off unless set explicitly.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from bench.bench_http_pool import percentile
+from bench.provider_simulator import add_arguments
+from bench.stub_server import free_port
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample_jpeg(size_kb: int) -> bytes:
+    """A decodable JPEG of roughly `size_kb`, so uploads exercise the image pipeline realistically."""
+    if Image is None:
+        return JPEG_HEADER + os.urandom(size_kb * 1024)
+    side = 64
+    while True:
+        buffer = io.BytesIO()
+        Image.effect_noise((side, side), 64).convert("RGB").save(buffer, "JPEG", quality=90)
+        if buffer.tell() >= size_kb * 1024 or side >= 4096:
+            return buffer.getvalue()
+        side *= 2
+
+
+def spawn(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env=env)
+
+
+async def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready in {timeout:.0f}s")
+
+
+def backend_env(simulator_url: str, data_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    for provider in ("A2E", "DID", "HEYGEN"):
+        env[f"{provider}_BASE_URL"] = simulator_url
+        env.setdefault(f"{provider}_RATE_LIMIT", "0")
+    env.setdefault("A2E_TOKEN", "simulated")
+    env.setdefault("DID_KEY", "simulated")
+    env.setdefault("HEYGEN_KEY", "simulated")
+    env.setdefault("HEYGEN_AVATAR_ID", "simulated")
+    env.setdefault("HEYGEN_VOICE_ID", "simulated")
+    env.setdefault("DATA_DIR", data_dir)
+    return env
+
+
+async def run_step(client: httpx.AsyncClient, call, total: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await call(client, index)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p99 {previous['p99_ms']}ms -> {current['p99_ms']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{key}: rps {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    simulator_port, backend_port = free_port(), free_port()
+    simulator_url = f"http://127.0.0.1:{simulator_port}"
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    simulator_args = [
+        "-m", "bench.provider_simulator", "--port", str(simulator_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate),
+        "--job-seconds", str(args.job_seconds), "--failure-rate", str(args.failure_rate),
+    ]
+    if args.seed is not None:
+        simulator_args += ["--seed", str(args.seed)]
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        processes = [spawn(simulator_args, dict(os.environ))]
+        processes.append(spawn(
+            ["-m", "uvicorn", "main:app", "--port", str(backend_port), "--log-level", "warning"],
+            backend_env(simulator_url, data_dir),
+        ))
+        try:
+            await wait_ready(f"{simulator_url}/_simulator/stats")
+            await wait_ready(f"{backend_url}/api/health")
+            results = await run_scenarios(backend_url, args)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump(results, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION  {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+async def run_scenarios(backend_url: str, args: argparse.Namespace) -> Dict:
+    task_ids: List[str] = []
+    upload_body = sample_jpeg(args.upload_kb)
+
+    async def start(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        # Unique text so the idempotency layer does not collapse the requests
+        response = await client.post("/api/start-image2video", json={
+            "provider": args.provider,
+            "image_url": "https://example.com/portrait.jpg",
+            "text": f"load test {uuid.uuid4().hex}",
+        })
+        if response.status_code == 200 and response.json().get("task_id"):
+            task_ids.append(response.json()["task_id"])
+        return response
+
+    async def status(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        return await client.get(f"/api/status/{args.provider}/{task_ids[index % len(task_ids)]}")
+
+    async def upload(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        # Trailing bytes after the JPEG end marker make every upload distinct, so
+        # content-addressed dedup does not skip the write
+        content = upload_body + uuid.uuid4().bytes
+        return await client.post("/api/upload-image", files={"file": ("load.jpg", content, "image/jpeg")})
+
+    scenarios = [("start", start), ("status", status), ("upload", upload)]
+    results: Dict[str, Dict] = {}
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=backend_url, limits=limits, timeout=120.0) as client:
+        print(f"{'scenario':<8} {'conc':>5} {'requests':>9} {'errors':>7} {'rps':>9} {'p50':>10} {'p99':>10}")
+        for name, call in scenarios:
+            for concurrency in args.concurrency:
+                if name == "status" and not task_ids:
+                    print("status   skipped: no job was started successfully")
+                    break
+                step = await run_step(client, call, args.requests, concurrency)
+                results[f"{name}@{concurrency}"] = step
+                print(
+                    f"{name:<8} {concurrency:>5} {step['requests']:>9} {step['errors']:>7} {step['rps']:>9.1f} "
+                    f"{step['p50_ms']:>8.2f}ms {step['p99_ms']:>8.2f}ms"
+                )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", default="did", choices=("a2e", "did", "heygen"))
+    parser.add_argument("--concurrency", type=lambda value: [int(part) for part in value.split(",")],
+                        default=[1, 8, 32], help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and level")
+    parser.add_argument("--upload-kb", type=int, default=256)
+    parser.add_argument("--save", help="write results as JSON, e.g. to use as a baseline later")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    add_arguments(parser)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,253 @@
+"""
+Local stand-in for the A2E, D-ID and HeyGen APIs, so the backend can be
+load-tested without spending credits.
+
+    cd backend && python -m bench.provider_simulator --port 8090 --latency-ms 80 --error-rate 0.02
+
+Then point the backend at it:
+
+    A2E_BASE_URL=http://127.0.0.1:8090 DID_BASE_URL=http://127.0.0.1:8090 \\
+    HEYGEN_BASE_URL=http://127.0.0.1:8090 uvicorn main:app
+
+Every endpoint waits `latency` (+/- `jitter`) seconds, then answers 503 with
+probability `error_rate` or 429 with probability `throttle_rate`. Jobs stay
+processing for `job_seconds` and then complete, or fail with probability
+`failure_rate`. Any API key is accepted.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+# A few bytes standing in for a rendered MP4 (served at /results/{id}.mp4)
+FAKE_VIDEO = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom" + b"\x00" * 4096
+
+
+class SimulatedJob:
+    __slots__ = ("job_id", "provider", "created_at", "fails")
+
+    def __init__(self, provider: str, fails: bool):
+        self.job_id = uuid.uuid4().hex
+        self.provider = provider
+        self.created_at = time.monotonic()
+        self.fails = fails
+
+
+class ProviderSimulator:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, job_seconds: float = 10.0, failure_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.job_seconds = job_seconds
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.jobs: Dict[str, SimulatedJob] = {}
+        self.requests = 0
+
+    async def delay(self) -> Optional[Response]:
+        """Simulate network and API latency; return an injected error response, if any."""
+        self.requests += 1
+        seconds = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if seconds:
+            await asyncio.sleep(seconds)
+        roll = self.random.random()
+        if roll < self.error_rate:
+            return JSONResponse({"message": "simulated upstream error"}, status_code=503)
+        if roll < self.error_rate + self.throttle_rate:
+            return JSONResponse({"message": "simulated rate limit"}, status_code=429, headers={"Retry-After": "1"})
+        return None
+
+    def create(self, provider: str) -> SimulatedJob:
+        job = SimulatedJob(provider, self.random.random() < self.failure_rate)
+        self.jobs[job.job_id] = job
+        return job
+
+    def state(self, job: SimulatedJob) -> str:
+        if time.monotonic() - job.created_at < self.job_seconds:
+            return "processing"
+        return "failed" if job.fails else "completed"
+
+    def result_url(self, request: Request, job: SimulatedJob) -> str:
+        return f"{str(request.base_url).rstrip('/')}/results/{job.job_id}.mp4"
+
+
+def not_found() -> JSONResponse:
+    return JSONResponse({"message": "task not found"}, status_code=404)
+
+
+def page(sim: ProviderSimulator, provider: str, limit: int, token: Optional[str]) -> Tuple[List[SimulatedJob], Optional[str]]:
+    """One page of a provider's jobs, newest first; the token is the offset of the next page."""
+    jobs = [job for job in reversed(list(sim.jobs.values())) if job.provider == provider]
+    offset = int(token or 0)
+    next_offset = offset + limit
+    return jobs[offset:next_offset], (str(next_offset) if next_offset < len(jobs) else None)
+
+
+def create_app(sim: ProviderSimulator) -> FastAPI:
+    app = FastAPI(title="Provider simulator")
+
+    # A2E
+    @app.post("/api/v1/userImage2Video/start")
+    async def a2e_start():
+        error = await sim.delay()
+        if error:
+            return error
+        job = sim.create("a2e")
+        return {"code": 0, "data": {"_id": job.job_id, "current_status": "initialized"}}
+
+    @app.get("/api/v1/userImage2Video/{task_id}")
+    async def a2e_status(task_id: str, request: Request):
+        error = await sim.delay()
+        if error:
+            return error
+        job = sim.jobs.get(task_id)
+        if job is None:
+            return not_found()
+        data = {"_id": job.job_id, "current_status": sim.state(job)}
+        if data["current_status"] == "completed":
+            data["result_url"] = sim.result_url(request, job)
+        elif data["current_status"] == "failed":
+            data["failed_message"] = "simulated render failure"
+        return {"code": 0, "data": data}
+
+    # D-ID
+    @app.post("/talks", status_code=201)
+    async def did_start():
+        error = await sim.delay()
+        if error:
+            return error
+        job = sim.create("did")
+        return {"id": job.job_id, "object": "talk", "status": "created"}
+
+    def did_body(request: Request, job: SimulatedJob) -> Dict:
+        state = sim.state(job)
+        body = {"id": job.job_id, "status": {"processing": "started", "completed": "done", "failed": "error"}[state]}
+        if state == "completed":
+            body["result_url"] = sim.result_url(request, job)
+        elif state == "failed":
+            body["error"] = {"kind": "SimulatedError", "message": "simulated render failure"}
+        return body
+
+    @app.get("/talks")
+    async def did_list(request: Request, limit: int = 100, token: Optional[str] = None):
+        error = await sim.delay()
+        if error:
+            return error
+        jobs, next_token = page(sim, "did", limit, token)
+        body = {"talks": [did_body(request, job) for job in jobs]}
+        if next_token:
+            body["token"] = next_token
+        return body
+
+    @app.get("/talks/{talk_id}")
+    async def did_status(talk_id: str, request: Request):
+        error = await sim.delay()
+        if error:
+            return error
+        job = sim.jobs.get(talk_id)
+        return did_body(request, job) if job else not_found()
+
+    # HeyGen
+    @app.post("/v2/video/generate")
+    async def heygen_start():
+        error = await sim.delay()
+        if error:
+            return error
+        job = sim.create("heygen")
+        return {"error": None, "data": {"video_id": job.job_id, "task_id": job.job_id}}
+
+    def heygen_body(request: Request, job: SimulatedJob) -> Dict:
+        state = sim.state(job)
+        body = {"id": job.job_id, "status": state}
+        if state == "completed":
+            body["video_url"] = sim.result_url(request, job)
+        elif state == "failed":
+            body["error"] = {"code": "simulated", "message": "simulated render failure"}
+        return body
+
+    @app.get("/v1/video/task/{task_id}")
+    async def heygen_task(task_id: str, request: Request):
+        error = await sim.delay()
+        if error:
+            return error
+        job = sim.jobs.get(task_id)
+        return heygen_body(request, job) if job else not_found()
+
+    @app.get("/v1/video.list")
+    async def heygen_list(limit: int = 100, token: Optional[str] = None):
+        error = await sim.delay()
+        if error:
+            return error
+        jobs, next_token = page(sim, "heygen", limit, token)
+        videos = [{"video_id": job.job_id, "status": sim.state(job), "type": "GENERATED"} for job in jobs]
+        return {"code": 100, "data": {"videos": videos, "token": next_token}}
+
+    @app.get("/v1/video_status.get")
+    async def heygen_video_status(video_id: str, request: Request):
+        error = await sim.delay()
+        if error:
+            return error
+        job = sim.jobs.get(video_id)
+        return {"code": 100, "data": heygen_body(request, job)} if job else not_found()
+
+    # Credential checks used by the readiness probe
+    @app.get("/credits")
+    async def did_credits():
+        return {"credits": [], "remaining": 100, "total": 100}
+
+    @app.get("/v2/user/remaining_quota")
+    async def heygen_quota():
+        return {"error": None, "data": {"remaining_quota": 3600}}
+
+    # Rendered videos
+    @app.get("/results/{task_id}.mp4")
+    async def result_video(task_id: str):
+        if task_id not in sim.jobs:
+            return not_found()
+        return Response(FAKE_VIDEO, media_type="video/mp4")
+
+    @app.get("/_simulator/stats")
+    async def stats():
+        return {"requests": sim.requests, "jobs": len(sim.jobs)}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="uniform +/- jitter around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--job-seconds", type=float, default=10.0, help="time a job stays processing")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of jobs that end failed")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def simulator_from_args(args: argparse.Namespace) -> ProviderSimulator:
+    return ProviderSimulator(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        job_seconds=args.job_seconds,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(simulator_from_args(args)), host=args.host, port=args.port, log_level="warning")
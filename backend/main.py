@@ -1,15 +1,74 @@
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-# Load environment variables before importing router (router initializes services immediately)
+# Load environment variables before importing router (settings are read at import time)
 load_dotenv()
 
-from provider_router import router
+from provider_router import (
+    image_pipeline, job_queue, job_store, resume_tracking, router, segmented_jobs, status_poller, upload_janitor,
+    video_mirror,
+)
+from services.codecs import FastJSONResponse
+from services.metrics import MetricsMiddleware, loop_lag_monitor, registry
+from services.provider_registry import provider_registry
+from services.readiness import readiness_checker
+from services.shared_state import shared_state
+from services.status_cache import TERMINAL_STATUSES
+from services.tracing import SERVER_TIMING, TracingMiddleware, install_log_context, tracer
+from services.upload_store import UPLOAD_MAX_BYTES, UploadSizeLimitMiddleware
+
+# Log lines carry the trace id of the request they were written for
+install_log_context()
+logging.basicConfig(
+    level=(os.getenv("LOG_LEVEL") or "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s [trace_id=%(trace_id)s] %(message)s",
+)
+# Upstream calls are already counted in /metrics and traced; skip httpx's per-request INFO lines
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Providers are loaded on first use; each opens one pooled HTTP client then
+    job_store.start()
+    if tracer.exporter is not None:
+        tracer.exporter.start()
+    await status_poller.start()
+    # Resume tracking jobs that were still running when the previous process stopped
+    for job in await job_store.in_flight(time.time() - status_poller.max_age, TERMINAL_STATUSES):
+        resume_tracking(job["provider"], job["task_id"])
+    await job_queue.start()
+    upload_janitor.start()
+    # Warms provider connections in the background; /api/health/ready reports when done
+    readiness_checker.start()
+    loop_lag_monitor.start()
+    try:
+        yield
+    finally:
+        await loop_lag_monitor.stop()
+        await readiness_checker.stop()
+        await upload_janitor.stop()
+        await job_queue.stop()
+        await segmented_jobs.aclose()
+        await status_poller.stop()
+        job_store.stop()
+        image_pipeline.shutdown()
+        await video_mirror.aclose()
+        await provider_registry.aclose()
+        await shared_state.close()
+        if tracer.exporter is not None:
+            tracer.exporter.stop()
+
+
+# Routes that return plain dicts are encoded with orjson when it is installed
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 default_allowed_origins = [
     "http://localhost:3000",
@@ -25,6 +84,13 @@ allowed_origins = [
     if origin.strip()
 ] or default_allowed_origins
 
+# Added before CORS so early 413 rejections still carry CORS headers
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    paths=("/api/upload-image", "/api/upload"),
+    max_bytes=UPLOAD_MAX_BYTES,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -33,10 +99,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Root span and Server-Timing header for every request, including rejected ones
+app.add_middleware(TracingMiddleware, tracer=tracer, timing_header=SERVER_TIMING)
+
+# Outermost, so rejected and preflight requests are counted too
+app.add_middleware(MetricsMiddleware)
+
 # Include provider router
 app.include_router(router)
 
 @app.get("/api/health")
 async def health():
+    """Liveness: the process is up and serving requests."""
     return {"status": "ok"}
 
+
+@app.get("/api/health/ready")
+async def health_ready():
+    """
+    Readiness: 200 once at least one configured provider has been warmed up
+    (DNS resolved, pooled connections open, credentials accepted), 503 while
+    starting or when none is. Per-provider results come from the last
+    background check, so this never waits on a provider.
+    """
+    report = readiness_checker.report()
+    return FastJSONResponse(report, status_code=200 if readiness_checker.ready() else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of request, upstream, upload, queue and event-loop metrics."""
+    try:
+        # Queue depth lives in the queue backend (possibly Redis), so it is read per scrape
+        await job_queue.depth()
+    except Exception as exc:
+        logger.warning("Could not read the job queue depth: %s", exc)
+    return registry.response()
+
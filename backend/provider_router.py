@@ -1,14 +1,33 @@
+import asyncio
+import logging
 import os
-import uuid
-from typing import Dict, Optional
+import time
+from typing import Dict, List, Optional, Set, Tuple, Union
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Request
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Header, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 
-from services.a2e_service import A2EService
-from services.did_service import DIDService
-from services.heygen_service import HeyGenService
+from services.codecs import FastJSONResponse, json_dumps, json_loads
+from services.concurrency import provider_limiter
+from services.idempotency import create_idempotency_layer, request_fingerprint
+from services.image_pipeline import IMAGE_WORKERS, ImagePipeline, load_presets
+from services.job_queue import create_job_queue
+from services.job_store import create_job_store
+from services.metrics import jobs_started, registry
+from services.provider_metrics import provider_metrics
+from services.provider_registry import provider_registry
+from services.resilience import LOCAL_ERRORS, UNSENT_ERRORS, CircuitOpenError
+from services.segmented_jobs import create_segmented_jobs
+from services.settings import env_int
+from services.shared_state import shared_state
+from services.status_cache import TERMINAL_STATUSES, status_cache
+from services.status_poller import create_status_poller
+from services.tracing import tracer
+from services.upload_janitor import create_upload_janitor
+from services.upload_store import UPLOAD_CHUNK_BYTES, UPLOAD_MAX_BYTES, UPLOAD_TTL_SECONDS, UploadStore, serve_file
+from services.video_mirror import create_video_mirror
+from services.webhooks import WEBHOOK_FALLBACK_INTERVAL, verify_webhook
 
 
 class StartRequest(BaseModel):
@@ -17,133 +36,597 @@ class StartRequest(BaseModel):
     text: str
 
 
+class SegmentedStartRequest(StartRequest):
+    max_chars: Optional[int] = None
+
+
+class QueuedStartRequest(StartRequest):
+    priority: str = "normal"
+
+
+class BatchStartRequest(BaseModel):
+    items: List[StartRequest]
+
+
+class StatusLookup(BaseModel):
+    provider: str
+    task_id: str
+
+
+class BatchStatusRequest(BaseModel):
+    items: List[StatusLookup]
+
+
 class HeyGenTestRequest(BaseModel):
     image_url: str
     text: str
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api", tags=["image2video"])
 
-# Create uploads directory if it doesn't exist (relative to backend directory)
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+MAX_BATCH_ITEMS = env_int("MAX_BATCH_ITEMS", 500)
+# Uncached lookups for one provider from which /status/batch tries the provider's list endpoint first
+BULK_STATUS_MIN_ITEMS = env_int("BULK_STATUS_MIN_ITEMS", 3)
 
-# Initialize services (will raise RuntimeError if API keys are missing)
-# This is intentional - services should be configured before use
-try:
-    a2e_service = A2EService()
-except RuntimeError:
-    a2e_service = None
+AUTO_PROVIDER = "auto"
+# HeyGen reads image_url as an avatar_id, so it is only an auto candidate if listed explicitly
+AUTO_PROVIDERS = [
+    name.strip().lower()
+    for name in (os.getenv("AUTO_PROVIDERS") or "a2e,did").split(",")
+    if name.strip()
+]
+# Start rejections about the provider (credentials, quota) rather than the request; another provider may take it
+FAILOVER_STATUSES = frozenset({401, 403, 429})
 
-try:
-    did_service = DIDService()
-except RuntimeError:
-    did_service = None
+# Seconds between SSE keep-alive comments so idle proxies do not drop the stream
+SSE_KEEPALIVE_SECONDS = 15
+# Open event streams allowed per task in each worker
+SSE_MAX_SUBSCRIBERS_PER_TASK = env_int("SSE_MAX_SUBSCRIBERS_PER_TASK", 10)
+
+# Uploads directory (relative to backend directory) is created by the store
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+upload_store = UploadStore(UPLOAD_DIR, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_BYTES, UPLOAD_TTL_SECONDS)
+image_pipeline = ImagePipeline(
+    upload_store.path_for,
+    load_presets(provider_registry.canonical(name) or name for name in AUTO_PROVIDERS),
+    IMAGE_WORKERS,
+)
+job_store = create_job_store()
+video_mirror = create_video_mirror(shared_state)
 
-try:
-    heygen_service = HeyGenService()
-except RuntimeError:
-    heygen_service = None
+
+def configured_services() -> List:
+    """Return every provider service that is configured, loading it if needed."""
+    return provider_registry.configured()
 
 
 def get_service(provider: str):
-    """Get the appropriate service based on provider name."""
-    provider_lower = provider.lower()
-    if provider_lower == "a2e":
-        if a2e_service is None:
-            raise HTTPException(
-                status_code=500,
-                detail="A2E service is not configured. Please set A2E_TOKEN in .env"
-            )
-        return a2e_service
-    elif provider_lower == "did" or provider_lower == "d-id":
-        if did_service is None:
-            raise HTTPException(
-                status_code=500,
-                detail="D-ID service is not configured. Please set DID_KEY in .env"
-            )
-        return did_service
-    elif provider_lower == "heygen":
-        if heygen_service is None:
-            raise HTTPException(
-                status_code=500,
-                detail="HeyGen service is not configured. Please set HEYGEN_KEY in .env"
-            )
-        return heygen_service
-    else:
+    """Get the service for a provider name; providers are loaded on first use."""
+    return provider_registry.get(provider)
+
+
+def _status_ttl(service) -> Optional[float]:
+    """Statuses of jobs that report back by webhook stay fresh until the fallback poll."""
+    return WEBHOOK_FALLBACK_INTERVAL if service.webhook_url else None
+
+
+def resume_tracking(provider: str, task_id: str) -> None:
+    """Track a job again after a restart, polled as often as when it was started."""
+    try:
+        interval = _status_ttl(get_service(provider))
+    except HTTPException:
+        # Unknown or unconfigured provider: the poller records its error and gives up
+        interval = None
+    status_poller.track(provider, task_id, interval=interval)
+
+
+def _record_status(provider: str, task_id: str, result: Dict) -> None:
+    """Record a fresh status; finished videos are also queued for the local mirror."""
+    job_store.record_status(provider, task_id, result)
+    if result.get("status") in TERMINAL_STATUSES:
+        provider_metrics.record_terminal(provider, task_id, result["status"] == "completed")
+    if video_mirror.enabled and result.get("status") == "completed" and result.get("result_url"):
+        result["mirror_url"] = video_mirror.mirror_path(provider, task_id)
+        video_mirror.prefetch(provider, task_id, result["result_url"])
+
+
+async def fetch_status(provider: str, task_id: str) -> Dict:
+    """Look up task status through the shared status cache."""
+    with tracer.span("resolve"):
+        service = get_service(provider)
+
+    async def load() -> Dict:
+        async with provider_limiter.slot(service.http.name):
+            with tracer.span("status", provider=service.http.name):
+                result = await service.get_status(task_id)
+        _record_status(service.http.name, task_id, result)
+        return result
+
+    with tracer.span("cache"):
+        return await status_cache.get((service.http.name, task_id), load, _status_ttl(service))
+
+
+status_poller = create_status_poller(fetch_status)
+segmented_jobs = create_segmented_jobs(shared_state, fetch_status, status_poller, video_mirror)
+
+
+async def _finished_images(since: float) -> Set[str]:
+    return await job_store.finished_images(since, TERMINAL_STATUSES)
+
+
+async def _active_images() -> Set[str]:
+    jobs = await job_store.in_flight(time.time() - status_poller.max_age, TERMINAL_STATUSES)
+    return {job["image_url"] for job in jobs if job["image_url"]}
+
+
+upload_janitor = create_upload_janitor(upload_store, shared_state, _finished_images, _active_images)
+idempotency = create_idempotency_layer()
+
+
+def _is_client_error(exc: Exception) -> bool:
+    """A 4xx caused by the request itself (bad image_url, text too long), which any provider would reject."""
+    return isinstance(exc, HTTPException) and 400 <= exc.status_code < 500 and exc.status_code not in FAILOVER_STATUSES
+
+
+async def _start_on(service, request: StartRequest) -> Dict:
+    """Start a video on one provider, recording it for metrics, the job registry and the poller."""
+    provider_name = service.http.name
+    async with provider_limiter.slot(provider_name):
+        started = time.monotonic()
+        try:
+            with tracer.span("start", provider=provider_name):
+                result = await service.start_video(request.image_url, request.text)
+        except Exception as exc:
+            # Neither a bad request nor our own exhausted connection pool says anything about the provider
+            if not _is_client_error(exc) and not isinstance(exc, LOCAL_ERRORS):
+                provider_metrics.record_start(provider_name, time.monotonic() - started, ok=False)
+            jobs_started.inc(provider_name, "error")
+            raise
+    provider_metrics.record_start(provider_name, time.monotonic() - started, ok=True, task_id=result.get("task_id"))
+    jobs_started.inc(provider_name, "ok")
+    job_store.record_start(
+        provider_name, result.get("task_id"), result.get("status"), request.image_url, request.text
+    )
+    if service.webhook_url and result.get("task_id"):
+        # The start result answers status lookups until the provider reports back
+        await status_cache.publish((provider_name, result["task_id"]), result, _status_ttl(service))
+    status_poller.track(provider_name, result.get("task_id"), result, _status_ttl(service))
+    return result
+
+
+def auto_candidates() -> List:
+    """Configured auto-mode providers, best first by recent latency and error rate."""
+    services = {service.http.name: service for service in provider_registry.configured(AUTO_PROVIDERS)}
+    if not services:
         raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported provider: {provider}. Supported providers: a2e, did, heygen"
+            status_code=500,
+            detail=f"No provider is configured for auto mode (AUTO_PROVIDERS={','.join(AUTO_PROVIDERS)})",
         )
+    ranked = provider_metrics.rank(services)
+    # Providers whose circuit is open go last rather than being dropped
+    ranked.sort(key=lambda name: services[name].http.policy.breaker.state == "open")
+    return [services[name] for name in ranked]
 
 
-@router.post("/start-image2video")
-async def start_image2video(request: StartRequest):
+async def _start_with_failover(candidates: List, request: StartRequest) -> Dict:
     """
-    Start image to video generation with the specified provider.
-    
-    Body:
-    - provider: "a2e", "did", or "heygen"
-    - image_url: URL of the image to use
-    - text: Text to speak in the video
+    Try candidates in order, falling over only when the provider itself turned
+    the request down (401, 403 or 429, open circuit, unsent request). Other
+    4xx answers are about the request and are raised right away, without
+    counting against the provider. A 5xx is raised as is too: the render may
+    already be running, and starting it on another provider would pay for it
+    twice.
+    """
+    errors = []
+    for service in candidates:
+        try:
+            return await _start_on(service, request)
+        except HTTPException as exc:
+            if exc.status_code not in FAILOVER_STATUSES and not isinstance(exc, CircuitOpenError):
+                raise
+            errors.append({"provider": service.http.name, "status_code": exc.status_code, "error": exc.detail})
+        except UNSENT_ERRORS as exc:
+            errors.append({"provider": service.http.name, "status_code": 502, "error": str(exc)})
+    raise HTTPException(
+        status_code=errors[-1]["status_code"],
+        detail={"error": "All providers failed to start the video", "attempts": errors},
+    )
+
+
+async def _task_replayable(result: Dict) -> bool:
+    latest = await status_cache.latest((result.get("provider"), result.get("task_id")))
+    return latest is None or latest.get("status") != "failed"
+
+
+async def _segmented_replayable(result: Dict) -> bool:
+    try:
+        return (await segmented_jobs.get(result["job_id"]))["status"] != "failed"
+    except HTTPException:
+        # Expired job record: nothing left to replay
+        return False
+
+
+async def start_job(request: StartRequest, idempotency_key: Optional[str] = None) -> Dict:
+    """
+    Validate a start request and dispatch it under the provider's concurrency limit.
+
+    With provider "auto" the best-ranked configured provider is used, falling
+    over to the next one if it fails to start. Repeats of the same request (or
+    Idempotency-Key) within the idempotency window return the original task
+    instead of starting a new paid render, unless that render failed.
+    """
+    with tracer.span("validate"):
+        if not request.image_url:
+            raise HTTPException(status_code=400, detail="image_url is required")
+
+        if not request.text:
+            raise HTTPException(status_code=400, detail="text is required")
+
+    try:
+        with tracer.span("resolve"):
+            if request.provider.lower() == AUTO_PROVIDER:
+                candidates = auto_candidates()
+                # Any candidate may serve it, so a config change on any of them starts a new render
+                config = {service.http.name: service.request_config() for service in candidates}
+                fingerprint = request_fingerprint(AUTO_PROVIDER, request.image_url, request.text, config)
+                dispatch = lambda: _start_with_failover(candidates, request)
+            else:
+                service = get_service(request.provider)
+                fingerprint = request_fingerprint(
+                    service.http.name, request.image_url, request.text, service.request_config()
+                )
+                dispatch = lambda: _start_on(service, request)
+
+        with tracer.span("dispatch"):
+            result = await idempotency.run(fingerprint, dispatch, idempotency_key, _task_replayable)
+        if result.get("idempotent_replay"):
+            # Report the latest known state of the original task, e.g. its result_url
+            latest = await status_cache.latest((result.get("provider"), result.get("task_id")))
+            if latest is not None:
+                result.update(latest)
+        return result
+    except HTTPException:
+        raise
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting video: {str(e)}")
+
+
+def _segmented_service(provider: str):
+    """Provider for a segmented job; every segment must render on it for the stitch to work."""
+    if provider.lower() == AUTO_PROVIDER:
+        candidates = [service for service in auto_candidates() if service.script_segment_chars]
+        if not candidates:
+            raise HTTPException(status_code=400, detail="No auto-mode provider narrates text; pick did or heygen")
+        return candidates[0]
+    service = get_service(provider)
+    if not service.script_segment_chars:
+        raise HTTPException(status_code=400, detail=f"{service.label} does not narrate text, so it cannot render segments")
+    return service
+
+
+async def _start_segments(service, image_url: str, segments: List[str]) -> Dict:
+    """
+    Start every segment at once (bounded by the provider's concurrency limit)
+    and record the job; if some fail to start, it is recorded as failed.
+    """
+    provider_name = service.http.name
+    outcomes = await asyncio.gather(
+        *(_start_on(service, StartRequest(provider=provider_name, image_url=image_url, text=segment))
+          for segment in segments),
+        return_exceptions=True,
+    )
+    errors = [
+        {"index": index, **_batch_error(outcome)}
+        for index, outcome in enumerate(outcomes)
+        if isinstance(outcome, Exception)
+    ]
+    if errors:
+        started = [
+            {"index": index, "task_id": outcome.get("task_id")}
+            for index, outcome in enumerate(outcomes)
+            if not isinstance(outcome, Exception)
+        ]
+        # The started segments keep rendering (and are billed), so keep them visible under a job id
+        job_id = await segmented_jobs.record_failed_start(
+            provider_name,
+            image_url,
+            [None if isinstance(outcome, Exception) else outcome.get("task_id") for outcome in outcomes],
+            f"{len(errors)} of {len(segments)} segments failed to start",
+        )
+        raise HTTPException(
+            status_code=errors[0]["status_code"],
+            detail={"error": "Some segments failed to start", "job_id": job_id, "started": started, "attempts": errors},
+        )
+    return await segmented_jobs.create(provider_name, image_url, outcomes)
+
+
+async def start_segmented_job(request: SegmentedStartRequest, idempotency_key: Optional[str] = None) -> Dict:
+    """
+    Split a long script at sentence boundaries and render the segments in
+    parallel as one logical job, stitched into a single video once all of
+    them complete. Repeats within the idempotency window return the original
+    job with its latest state, unless it failed.
     """
     if not request.image_url:
         raise HTTPException(status_code=400, detail="image_url is required")
-    
+
     if not request.text:
         raise HTTPException(status_code=400, detail="text is required")
-    
+
     try:
-        service = get_service(request.provider)
-        result = await service.start_video(request.image_url, request.text)
+        service = _segmented_service(request.provider)
+        max_chars = min(request.max_chars or service.script_segment_chars, service.script_segment_chars)
+        if max_chars < 1:
+            raise HTTPException(status_code=400, detail="max_chars must be positive")
+        segments = segmented_jobs.plan(request.text, max_chars)
+        config = {**service.request_config(), "segmented": True, "max_chars": max_chars}
+        fingerprint = request_fingerprint(service.http.name, request.image_url, request.text, config)
+        result = await idempotency.run(
+            fingerprint, lambda: _start_segments(service, request.image_url, segments), idempotency_key,
+            _segmented_replayable,
+        )
+        if result.get("idempotent_replay"):
+            result = {**await segmented_jobs.get(result["job_id"]), "idempotent_replay": True}
         return result
     except HTTPException:
         raise
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error starting video: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error starting segmented video: {str(e)}")
+
+
+async def _run_queued(job: Dict) -> Dict:
+    return await start_job(StartRequest(**job["request"]), job.get("idempotency_key"))
+
+
+job_queue = create_job_queue(_run_queued)
+
+registry.gauge(
+    "i2v_jobs_tracked", "Started jobs the status poller is still following.",
+    callback=lambda: {(): status_poller.stats()["tracked"]},
+)
+registry.gauge(
+    "i2v_sse_subscribers", "Open /api/events streams.",
+    callback=lambda: {(): status_poller.stats()["subscribers"]},
+)
+registry.gauge(
+    "i2v_video_mirror_bytes", "Bytes of finished videos in the mirror directory, as of the last scan.",
+    callback=lambda: {(): video_mirror.stats()["bytes"]},
+)
+registry.gauge(
+    "i2v_upload_store_bytes", "Bytes of uploads and derivatives on disk, as of the last janitor sweep.",
+    callback=lambda: {(): upload_janitor.stats()["bytes"]},
+)
+registry.gauge(
+    "i2v_queue_jobs_starting", "Queued jobs a worker is currently starting.",
+    callback=lambda: {(): job_queue.active},
+)
+registry.gauge(
+    "i2v_queue_depth", "Jobs waiting in each priority lane, as of the last scrape.", ("lane",),
+    callback=lambda: {(lane,): count for lane, count in job_queue.last_depth.items()},
+)
+
+
+def _batch_error(exc: Exception) -> Dict:
+    if isinstance(exc, HTTPException):
+        return {"error": exc.detail, "status_code": exc.status_code}
+    return {"error": str(exc), "status_code": 500}
+
+
+def _check_batch_size(items: List) -> None:
+    if not items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items: {len(items)} (max {MAX_BATCH_ITEMS})",
+        )
+
+
+@router.post("/start-image2video")
+async def start_image2video(
+    request: StartRequest,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+):
+    """
+    Start image to video generation with the specified provider.
+    
+    Body:
+    - provider: "a2e", "did", "heygen", or "auto" (fastest healthy provider)
+    - image_url: URL of the image to use
+    - text: Text to speak in the video
+
+    Headers:
+    - Idempotency-Key: optional; retries with the same key return the original task
+    """
+    return await start_job(request, idempotency_key)
+
+
+@router.post("/start-image2video/batch")
+async def start_image2video_batch(payload: BatchStartRequest):
+    """
+    Start many generations in one call.
+
+    Items are dispatched concurrently, bounded per provider by
+    <PROVIDER>_MAX_CONCURRENCY. The response lists one entry per item, in
+    request order, with either the start result or an error.
+    """
+    _check_batch_size(payload.items)
+
+    async def run(index: int, item: StartRequest) -> Dict:
+        try:
+            result = await start_job(item)
+        except Exception as exc:
+            return {"index": index, "provider": item.provider, **_batch_error(exc)}
+        return {"index": index, **result}
+
+    results = await asyncio.gather(*(run(i, item) for i, item in enumerate(payload.items)))
+    failed = sum(1 for result in results if "error" in result)
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
+
+
+@router.post("/start-image2video/segmented")
+async def start_image2video_segmented(
+    request: SegmentedStartRequest,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+):
+    """
+    Render a long script as several segments in parallel, stitched into one video.
+
+    Body is the same as /start-image2video plus:
+    - max_chars: optional segment length, capped by the provider's limit (SEGMENT_MAX_CHARS)
+
+    Returns a job_id to poll at /segmented/{job_id}. Needs ffmpeg on the server.
+    """
+    return await start_segmented_job(request, idempotency_key)
+
+
+@router.get("/segmented/{job_id}")
+async def get_segmented_job(job_id: str):
+    """
+    State of a segmented job: processing, stitching, completed (with
+    `result_url`) or failed, plus the status of every segment.
+    """
+    return FastJSONResponse(await segmented_jobs.get(job_id))
+
+
+@router.get("/segmented/{job_id}/video")
+async def get_segmented_video(job_id: str, request: Request):
+    """Serve a stitched video, with Range support for seeking."""
+    report = await segmented_jobs.get(job_id)
+    if report["status"] != "completed":
+        raise HTTPException(status_code=404, detail="Video is not ready")
+    return await serve_file(segmented_jobs.file_for(job_id), request.headers, etag=f'"{job_id}"')
+
+
+@router.post("/queue/jobs", status_code=202)
+async def enqueue_image2video(
+    request: QueuedStartRequest,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+):
+    """
+    Queue a generation instead of starting it inline.
+
+    Body is the same as /start-image2video plus:
+    - priority: "high", "normal" (default) or "low"
+
+    Returns a job_id to poll at /queue/jobs/{job_id}. Responds 429 with
+    Retry-After when the queue is full.
+    """
+    payload = {"provider": request.provider, "image_url": request.image_url, "text": request.text}
+    return await job_queue.enqueue(payload, request.priority, idempotency_key)
+
+
+@router.get("/queue/jobs/{job_id}")
+async def get_queued_job(job_id: str):
+    """
+    State of a queued generation: queued, starting, started (with the
+    provider's task in `result`) or failed (with `error`).
+    """
+    return FastJSONResponse(await job_queue.get(job_id))
+
+
+@router.get("/queue/stats")
+async def get_queue_stats():
+    """Queue depth per priority lane, wait times and worker outcomes."""
+    return await job_queue.stats()
 
 
 @router.post("/upload-image")
 @router.post("/upload")
-async def upload_image(request: Request, file: UploadFile = File(...)):
+async def upload_image(
+    request: Request,
+    file: UploadFile = File(...),
+    provider: Optional[str] = None,
+    preset: Optional[str] = None,
+):
     """
     Upload an image file and get a URL to use for video generation.
+
+    Query parameters:
+    - provider: optional provider ("a2e", "did", "heygen", or "auto" for the strictest
+      of the auto candidates) whose preset is used to resize and re-encode the image
+    - preset: optional preset name ("default" or a provider) when no provider is given;
+      without either, `url` is the image exactly as uploaded. Unknown names are rejected with 400.
     
     Returns:
     - url: HTTPS URL that can be used in /start-image2video
+    - original_url: URL of the image exactly as uploaded
     """
-    # Validate file type
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1] if file.filename else ".jpg"
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    # Save file
+    preset_name = preset
+    if provider:
+        # Aliases ("d-id") name their provider's preset; providers without one of their own use the default box
+        canonical = provider_registry.canonical(provider)
+        preset_name = provider if canonical is None else canonical
+        if canonical is not None and canonical not in image_pipeline.presets:
+            preset_name = "default"
+    if preset_name:
+        image_pipeline.preset(preset_name)
+
+    # Stream to disk in chunks; identical images share one content-addressed file
     try:
-        contents = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        saved = await upload_store.save(file)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
+    unique_filename = saved["filename"]
+
+    # Resized, EXIF-stripped derivative when asked for; falls back to the original if it cannot be rendered
+    derived_filename = None
+    if preset_name:
+        derived_filename = await image_pipeline.derive(saved["sha256"], unique_filename, preset_name)
+    if derived_filename:
+        await upload_store.track_derivative(saved["sha256"], derived_filename)
+    served_filename = derived_filename or unique_filename
     
     base_url = str(request.base_url).rstrip("/")
-    file_url = f"{base_url}/api/uploads/{unique_filename}"
+    file_url = f"{base_url}/api/uploads/{served_filename}"
     
-    return {"url": file_url, "filename": unique_filename}
+    return {
+        "url": file_url,
+        "original_url": f"{base_url}/api/uploads/{unique_filename}",
+        "filename": served_filename,
+        "sha256": saved["sha256"],
+        "deduplicated": saved["deduplicated"],
+    }
 
 
 @router.get("/uploads/{filename}")
-async def get_uploaded_image(filename: str):
-    """Serve uploaded images."""
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path)
+async def get_uploaded_image(filename: str, request: Request):
+    """Serve uploaded images with ETag/Last-Modified validators, caching and Range support."""
+    return await upload_store.serve(filename, request.headers)
+
+
+@router.get("/videos/{provider}/{task_id}")
+async def get_mirrored_video(provider: str, task_id: str, request: Request):
+    """
+    Serve a finished video from the local mirror (VIDEO_MIRROR=1), with Range
+    support for seeking. The first request for a video not yet mirrored waits
+    for the download; if mirroring fails it redirects to the provider's URL.
+    """
+    if not video_mirror.enabled:
+        raise HTTPException(status_code=404, detail="Video mirroring is disabled")
+    service = get_service(provider)
+    provider_name = service.http.name
+
+    path = await video_mirror.cached(provider_name, task_id)
+    if path is None:
+        status = await fetch_status(provider_name, task_id)
+        if status.get("status") != "completed" or not status.get("result_url"):
+            raise HTTPException(status_code=404, detail="Video is not ready")
+        try:
+            path = await video_mirror.ensure(provider_name, task_id, status["result_url"])
+        except Exception:
+            return RedirectResponse(status["result_url"], status_code=307)
+
+    etag = f'"{os.path.splitext(video_mirror.filename(provider_name, task_id))[0]}"'
+    return await serve_file(path, request.headers, etag)
 
 
 @router.get("/status/{provider}/{task_id}")
@@ -159,9 +642,7 @@ async def get_status(provider: str, task_id: str):
         raise HTTPException(status_code=400, detail="task_id is required")
     
     try:
-        service = get_service(provider)
-        result = await service.get_status(task_id)
-        return result
+        return FastJSONResponse(await fetch_status(provider, task_id))
     except HTTPException:
         raise
     except RuntimeError as e:
@@ -170,17 +651,195 @@ async def get_status(provider: str, task_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting status: {str(e)}")
 
 
-@router.post("/heygen/test-call")
-async def heygen_test_call(payload: HeyGenTestRequest):
+async def _bulk_statuses(service, task_ids: List[str]) -> Dict[str, Dict]:
+    """Statuses answered by the provider's list endpoint, recorded like any other fresh status."""
+    provider_name = service.http.name
+    try:
+        async with provider_limiter.slot(provider_name):
+            results = await service.list_statuses(set(task_ids))
+    except Exception as exc:
+        # The per-task lookups still answer everything, just with more calls
+        logger.warning("Bulk status lookup failed for %s: %s", provider_name, exc)
+        return {}
+    for task_id, result in results.items():
+        _record_status(provider_name, task_id, result)
+        await status_cache.publish((provider_name, task_id), result, _status_ttl(service))
+        status_poller.publish(provider_name, task_id, result)
+    return results
+
+
+@router.post("/status/batch")
+async def get_status_batch(payload: BatchStatusRequest):
     """
-    Diagnostic helper to verify the exact HeyGen endpoint and status code being used.
+    Look up many task statuses in one request; results are returned in request order.
+
+    Repeated (provider, task_id) pairs are looked up once and cached statuses
+    are answered directly. The rest are grouped per provider: providers with
+    a list endpoint (D-ID, HeyGen) answer recent jobs in a few list calls,
+    and the remainder are looked up concurrently under the per-provider
+    limits.
+    """
+    _check_batch_size(payload.items)
+
+    # (provider, task_id) -> result, exception, or None while still unknown
+    lookups: Dict[Tuple[str, str], Union[Dict, Exception, None]] = {}
+    services: Dict[str, object] = {}
+    item_keys: List[Union[Tuple[str, str], Exception]] = []
+    for item in payload.items:
+        try:
+            service = get_service(item.provider)
+        except HTTPException as exc:
+            item_keys.append(exc)
+            continue
+        key = (service.http.name, item.task_id)
+        item_keys.append(key)
+        if key not in lookups:
+            services[key[0]] = service
+            lookups[key] = status_cache.peek(key)
+    cached = sum(1 for result in lookups.values() if result is not None)
+
+    missing: Dict[str, List[str]] = {}
+    for (provider, task_id), result in lookups.items():
+        if result is None:
+            missing.setdefault(provider, []).append(task_id)
+
+    async def lookup(provider: str, task_id: str) -> None:
+        try:
+            lookups[(provider, task_id)] = await fetch_status(provider, task_id)
+        except Exception as exc:
+            lookups[(provider, task_id)] = exc
+
+    async def lookup_provider(provider: str, task_ids: List[str]) -> int:
+        service = services[provider]
+        found: Dict[str, Dict] = {}
+        if service.supports_bulk_status and len(task_ids) >= BULK_STATUS_MIN_ITEMS:
+            found = await _bulk_statuses(service, task_ids)
+        for task_id, result in found.items():
+            lookups[(provider, task_id)] = result
+        await asyncio.gather(*(lookup(provider, task_id) for task_id in task_ids if task_id not in found))
+        return len(found)
+
+    bulk = sum(await asyncio.gather(*(lookup_provider(p, task_ids) for p, task_ids in missing.items())))
+
+    results = []
+    for index, (item, key) in enumerate(zip(payload.items, item_keys)):
+        outcome = lookups[key] if isinstance(key, tuple) else key
+        if isinstance(outcome, Exception):
+            results.append({"index": index, "task_id": item.task_id, "provider": item.provider, **_batch_error(outcome)})
+        else:
+            results.append({"index": index, "task_id": item.task_id, **outcome})
+    return FastJSONResponse({
+        "results": results,
+        "lookups": {"unique": len(lookups), "cached": cached, "bulk": bulk, "individual": len(lookups) - cached - bulk},
+    })
+
+
+@router.get("/jobs")
+async def list_jobs(
+    provider: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+):
+    """
+    List recorded jobs, newest first.
+
+    Query parameters:
+    - provider, status: optional filters
+    - limit: page size (1-200)
+    - cursor: `next_cursor` from the previous page
     """
-    if heygen_service is None:
+    if provider:
+        provider = get_service(provider).http.name
+    return FastJSONResponse(await job_store.list(provider=provider, status=status, limit=limit, cursor=cursor))
+
+
+@router.get("/events/{provider}/{task_id}")
+async def status_events(provider: str, task_id: str, request: Request):
+    """
+    Server-Sent Events stream of status changes for a task.
+
+    Emits `status` events with the same payload as /status/{provider}/{task_id},
+    `status-error` events when an upstream poll fails, and a final `end` event
+    once the task reaches a terminal state or stops being tracked.
+
+    Only tasks this backend started can be watched (404 otherwise), since every
+    stream keeps the task polled upstream; each task takes at most
+    SSE_MAX_SUBSCRIBERS_PER_TASK streams per worker (429 beyond that).
+    """
+    service = get_service(provider)
+    provider_name = service.http.name
+    # Tracked covers a task started moments ago whose job_store row is still queued
+    if not status_poller.tracking(provider_name, task_id) and not await job_store.known(provider_name, task_id):
+        raise HTTPException(status_code=404, detail=f"Unknown {provider_name} task: {task_id}")
+    if status_poller.subscriber_count(provider_name, task_id) >= SSE_MAX_SUBSCRIBERS_PER_TASK:
         raise HTTPException(
-            status_code=500,
-            detail="HeyGen service is not configured. Please set HEYGEN_KEY in .env",
+            status_code=429,
+            detail=f"Too many event streams for {provider_name} task {task_id}",
+            headers={"Retry-After": str(SSE_KEEPALIVE_SECONDS)},
         )
 
+    async def event_stream():
+        queue = status_poller.subscribe(provider_name, task_id)
+        try:
+            while True:
+                try:
+                    event, payload = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if event == "error":
+                    event = "status-error"
+                yield f"event: {event}\ndata: {json_dumps(payload).decode()}\n\n"
+                if event == "end":
+                    break
+        finally:
+            status_poller.unsubscribe(provider_name, task_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/webhooks/{provider}/{token}")
+async def provider_webhook(provider: str, token: str, request: Request):
+    """
+    Receive job updates pushed by a provider.
+
+    The URL, including its per-provider token, is sent with each start request
+    (D-ID `webhook`, HeyGen `callback_url`) or registered on the A2E account.
+    Updates refresh the status cache, the job registry and SSE subscribers, so
+    status lookups are answered without calling the provider.
+    """
+    # Authenticated before the provider is resolved, so callers without the token
+    # cannot tell configured, unconfigured and unknown providers apart
+    name = provider_registry.canonical(provider) or provider.lower()
+    body = await request.body()
+    verify_webhook(name, token, body, request.headers)
+    service = get_service(name)
+    try:
+        payload = json_loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body must be JSON")
+
+    task_id, result = service.parse_webhook(payload)
+    _record_status(service.http.name, task_id, result)
+    await status_cache.publish((service.http.name, task_id), result, _status_ttl(service))
+    status_poller.publish(service.http.name, task_id, result)
+    return {"received": True}
+
+
+@router.post("/heygen/test-call")
+async def heygen_test_call(payload: HeyGenTestRequest):
+    """
+    Diagnostic helper to verify the exact HeyGen endpoint and status code being used.
+    """
+    heygen_service = get_service("heygen")
     try:
         return await heygen_service.debug_generate(payload.image_url, payload.text)
     except HTTPException:
@@ -190,3 +849,28 @@ async def heygen_test_call(payload: HeyGenTestRequest):
             status_code=500, detail=f"Error testing HeyGen integration: {str(exc)}"
         )
 
+
+@router.get("/providers/metrics")
+async def providers_metrics():
+    """Rolling-window metrics and the current auto-mode ranking."""
+    services = configured_services()
+    return {
+        "auto_providers": AUTO_PROVIDERS,
+        "ranking": provider_metrics.rank(
+            service.http.name for service in services if service.http.name in AUTO_PROVIDERS
+        ),
+        "providers": {
+            service.http.name: {
+                **provider_metrics.snapshot(service.http.name),
+                "score": provider_metrics.score(service.http.name),
+                **service.http.policy.stats(),
+            }
+            for service in services
+        },
+    }
+
+
+@router.get("/status-cache/stats")
+async def status_cache_stats():
+    """Hit/miss counters for the task status cache."""
+    return status_cache.stats()
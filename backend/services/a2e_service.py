@@ -1,82 +1,71 @@
-import os
-from typing import Dict, Optional
-import httpx
+from typing import Dict, Tuple
 from fastapi import HTTPException
 
+from services.codecs import decode_json
+from services.provider_base import ProviderService
+from services.settings import env_bool
+from services.webhooks import webhook_url
+
+
+class A2EService(ProviderService):
+    name = "a2e"
+    label = "A2E"
+    credential_env = "A2E_TOKEN"
+    default_base_url = "https://video.a2e.ai"
+    # `text` is a motion prompt rather than a script, so it cannot be split into segments
+    script_segment_chars = 0
+
+    START_PATH = "/api/v1/userImage2Video/start"
+    JOB_NAME = "Cursor Demo"
+    DEFAULT_PROMPT = "the person is speaking. Looking at the camera. detailed eyes, clear teeth, still background"
+    NEGATIVE_PROMPT = "low quality, static image, lowres, moving camera"
 
-class A2EService:
     def __init__(self):
-        self.base_url = "https://video.a2e.ai"
-        self.token = os.getenv("A2E_TOKEN")
-        if not self.token:
-            raise RuntimeError("A2E_TOKEN not found in environment variables")
+        super().__init__()
+        # A2E callbacks are configured on the account, not per request; set
+        # A2E_WEBHOOK_CONFIGURED once this URL is registered there
+        self.webhook_url = webhook_url("a2e") if env_bool("A2E_WEBHOOK_CONFIGURED") else None
 
     async def start_video(self, image_url: str, text: str) -> Dict:
         """
         Start A2E image to video generation.
         Note: A2E uses prompt/negative_prompt, so we'll convert text to prompt.
         """
-        url = f"{self.base_url}/api/v1/userImage2Video/start"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-        
         # A2E uses prompt and negative_prompt, so we'll use text as prompt
-        prompt = text if text else "the person is speaking. Looking at the camera. detailed eyes, clear teeth, still background"
-        negative_prompt = "low quality, static image, lowres, moving camera"
-        
         body = {
-            "name": "Cursor Demo",
+            "name": self.JOB_NAME,
             "image_url": image_url,
-            "prompt": prompt,
-            "negative_prompt": negative_prompt
+            "prompt": text or self.DEFAULT_PROMPT,
+            "negative_prompt": self.NEGATIVE_PROMPT,
         }
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, headers=headers, json=body)
+        response = await self.post_json(self.START_PATH, body, operation="start")
 
         if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"A2E API error: {response.text}"
-            )
+            raise self.api_error(response)
 
-        data = response.json()
-        task = data.get("data", {})
-        
-        return {
-            "task_id": task.get("_id"),
-            "status": task.get("current_status", "processing"),
-            "provider": "a2e"
-        }
+        task = decode_json(response).get("data", {})
+        return self.started(task.get("_id"), task.get("current_status"))
 
     async def get_status(self, task_id: str) -> Dict:
         """Get status of A2E video generation task."""
-        url = f"{self.base_url}/api/v1/userImage2Video/{task_id}"
-        headers = {"Authorization": f"Bearer {self.token}"}
-
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(url, headers=headers)
+        path = f"/api/v1/userImage2Video/{task_id}"
+        response = await self.http.get(path, operation="status", headers=self.auth_headers)
 
         if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"A2E API error: {response.text}"
-            )
+            raise self.api_error(response)
 
-        data = response.json()
-        task = data.get("data", {})
-        
-        result = {
-            "status": task.get("current_status", "processing"),
-            "provider": "a2e"
-        }
-        
-        if task.get("current_status") == "completed":
-            result["result_url"] = task.get("result_url")
-        elif task.get("current_status") == "failed":
-            result["failed_message"] = task.get("failed_message", "Unknown error")
-        
-        return result
+        return self._normalize_task(decode_json(response).get("data", {}))
+
+    def build_auth_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def parse_webhook(self, payload: Dict) -> Tuple[str, Dict]:
+        """A2E callbacks carry the task object, either bare or wrapped in `data`."""
+        task = payload.get("data", payload) if isinstance(payload, dict) else None
+        if not isinstance(task, dict) or not task.get("_id"):
+            raise HTTPException(status_code=400, detail="A2E webhook without a task id")
+        return task["_id"], self._normalize_task(task)
 
+    def _normalize_task(self, task: Dict) -> Dict:
+        return self.normalize(task.get("current_status"), task.get("result_url"), task.get("failed_message"))
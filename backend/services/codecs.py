@@ -0,0 +1,45 @@
+import json
+from typing import Any, Union
+
+import httpx
+from starlette.responses import JSONResponse
+
+from services.tracing import tracer
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library is used without it
+    orjson = None
+
+
+if orjson is not None:
+    def json_loads(data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+    def json_dumps(value: Any) -> bytes:
+        return orjson.dumps(value)
+else:
+    def json_loads(data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def json_dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def decode_json(response: httpx.Response) -> Any:
+    """Parse an upstream JSON body; raises ValueError if it is not JSON."""
+    with tracer.span("decode"):
+        return json_loads(response.content)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse serialized with orjson when available.
+
+    Route handlers return it directly for plain-JSON payloads (dicts of
+    strings and numbers), which also skips FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with tracer.span("encode"):
+            return json_dumps(content)
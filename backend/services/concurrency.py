@@ -0,0 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from services.settings import env_int
+from services.tracing import tracer
+
+# Default in-flight upstream calls per provider; override with <PROVIDER>_MAX_CONCURRENCY
+DEFAULT_PROVIDER_CONCURRENCY = {
+    "a2e": 5,
+    "did": 5,
+    "heygen": 3,
+}
+
+
+class ProviderLimiter:
+    """Per-provider asyncio semaphores bounding concurrent upstream calls."""
+
+    def __init__(self, defaults: Dict[str, int], fallback: int = 5):
+        self.defaults = defaults
+        self.fallback = fallback
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def limit(self, provider: str) -> int:
+        default = self.defaults.get(provider, self.fallback)
+        return max(1, env_int(f"{provider.upper()}_MAX_CONCURRENCY", default))
+
+    def semaphore(self, provider: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit(provider))
+            self._semaphores[provider] = semaphore
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self, provider: str) -> AsyncIterator[None]:
+        """Hold one of the provider's slots; the wait for it is traced as `limiter`."""
+        semaphore = self.semaphore(provider)
+        with tracer.span("limiter", provider=provider):
+            await semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+provider_limiter = ProviderLimiter(DEFAULT_PROVIDER_CONCURRENCY)
@@ -1,86 +1,89 @@
-import os
-from typing import Dict
-import httpx
+from typing import Dict, Set, Tuple
 from fastapi import HTTPException
 
+from services.codecs import decode_json
+from services.provider_base import STATUS_LIST_MAX_PAGES, STATUS_LIST_PAGE_SIZE, ProviderService
+from services.webhooks import webhook_url
+
+
+class DIDService(ProviderService):
+    name = "did"
+    label = "D-ID"
+    credential_env = "DID_KEY"
+    default_base_url = "https://api.d-id.com"
+    # D-ID status can be: created, processing, done, error
+    status_map = {"done": "completed", "error": "failed"}
+    supports_bulk_status = True
+    readiness_path = "/credits"
+
+    DEFAULT_SCRIPT = "Hello there, welcome to my video!"
 
-class DIDService:
     def __init__(self):
-        self.base_url = "https://api.d-id.com"
-        # Strip whitespace/newlines to avoid invalid header bytes
-        self.api_key = os.getenv("DID_KEY", "").strip()
-        if not self.api_key:
-            raise RuntimeError("DID_KEY not found in environment variables")
-        self.auth_header = (
+        super().__init__()
+        # D-ID POSTs the finished talk here when set
+        self.webhook_url = webhook_url("did")
+        self._start_extra = {"webhook": self.webhook_url} if self.webhook_url else {}
+
+    def build_auth_headers(self) -> Dict[str, str]:
+        auth_header = (
             self.api_key
             if self.api_key.lower().startswith(("basic ", "bearer "))
             else f"Basic {self.api_key}"
         )
+        return {"Authorization": auth_header}
 
     async def start_video(self, image_url: str, text: str) -> Dict:
         """
         Start D-ID talking avatar video generation.
         D-ID uses source_url for image and script for text.
         """
-        url = f"{self.base_url}/talks"
-        headers = {
-            "Authorization": self.auth_header,
-            "Content-Type": "application/json"
-        }
-        
         body = {
             "source_url": image_url,
-            "script": {
-                "type": "text",
-                "input": text or "Hello there, welcome to my video!"
-            }
+            "script": {"type": "text", "input": text or self.DEFAULT_SCRIPT},
+            **self._start_extra,
         }
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, headers=headers, json=body)
+        response = await self.post_json("/talks", body, operation="start")
 
         if response.status_code not in [200, 201]:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"D-ID API error: {response.text}"
-            )
+            raise self.api_error(response)
 
-        data = response.json()
-        
-        return {
-            "task_id": data.get("id"),
-            "status": data.get("status", "processing"),
-            "provider": "did"
-        }
+        data = decode_json(response)
+        return self.started(data.get("id"), data.get("status"))
 
     async def get_status(self, task_id: str) -> Dict:
         """Get status of D-ID video generation task."""
-        url = f"{self.base_url}/talks/{task_id}"
-        headers = {"Authorization": self.auth_header}
-
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(url, headers=headers)
+        response = await self.http.get(f"/talks/{task_id}", operation="status", headers=self.auth_headers)
 
         if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"D-ID API error: {response.text}"
+            raise self.api_error(response)
+
+        return self._normalize_talk(decode_json(response))
+
+    async def list_statuses(self, task_ids: Set[str]) -> Dict[str, Dict]:
+        """Page through GET /talks (newest first) until every requested talk is found."""
+        results: Dict[str, Dict] = {}
+        params = {"limit": STATUS_LIST_PAGE_SIZE}
+        for _ in range(STATUS_LIST_MAX_PAGES):
+            response = await self.http.get(
+                "/talks", operation="list", headers=self.auth_headers, params=params
             )
+            if response.status_code != 200:
+                raise self.api_error(response)
+            data = decode_json(response)
+            for talk in data.get("talks") or []:
+                if talk.get("id") in task_ids:
+                    results[talk["id"]] = self._normalize_talk(talk)
+            if len(results) == len(task_ids) or not data.get("token"):
+                break
+            params = {"limit": STATUS_LIST_PAGE_SIZE, "token": data["token"]}
+        return results
 
-        data = response.json()
-        
-        result = {
-            "status": data.get("status", "processing"),
-            "provider": "did"
-        }
-        
-        # D-ID status can be: created, processing, done, error
-        if data.get("status") == "done":
-            result["status"] = "completed"
-            result["result_url"] = data.get("result_url")
-        elif data.get("status") == "error":
-            result["status"] = "failed"
-            result["failed_message"] = data.get("error", {}).get("message", "Unknown error")
-        
-        return result
+    def parse_webhook(self, payload: Dict) -> Tuple[str, Dict]:
+        """D-ID webhooks carry the same talk object as GET /talks/{id}."""
+        if not isinstance(payload, dict) or not payload.get("id"):
+            raise HTTPException(status_code=400, detail="D-ID webhook without a talk id")
+        return payload["id"], self._normalize_talk(payload)
 
+    def _normalize_talk(self, data: Dict) -> Dict:
+        return self.normalize(data.get("status"), data.get("result_url"), (data.get("error") or {}).get("message"))
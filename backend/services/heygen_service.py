@@ -1,25 +1,32 @@
 import logging
 import os
-from typing import Dict, Tuple
+from typing import Dict, Set, Tuple
 
 import httpx
 from fastapi import HTTPException
 
+from services.codecs import decode_json
+from services.provider_base import STATUS_LIST_MAX_PAGES, STATUS_LIST_PAGE_SIZE, ProviderService
+from services.webhooks import webhook_url
+
 logger = logging.getLogger(__name__)
 
 
-class HeyGenService:
+class HeyGenService(ProviderService):
     """Client for the HeyGen REST API."""
 
+    name = "heygen"
+    label = "HeyGen"
+    credential_env = "HEYGEN_KEY"
+    default_base_url = "https://api.heygen.com"
+    supports_bulk_status = True
+    readiness_path = "/v2/user/remaining_quota"
+
     def __init__(self):
-        self.base_url = "https://api.heygen.com"
+        super().__init__()
         self.generate_path = "/v2/video/generate"
         self.task_path = "/v1/video/task"
 
-        self.api_key = (os.getenv("HEYGEN_KEY") or "").strip()
-        if not self.api_key:
-            raise RuntimeError("HEYGEN_KEY not found in environment variables")
-
         # Optional defaults for avatar/voice configuration
         self.default_avatar_id = (os.getenv("HEYGEN_AVATAR_ID") or "").strip()
         self.default_voice_id = (os.getenv("HEYGEN_VOICE_ID") or "").strip()
@@ -29,6 +36,19 @@ class HeyGenService:
         self.dimension_width = self._safe_int(os.getenv("HEYGEN_DIMENSION_WIDTH"), 1280)
         self.dimension_height = self._safe_int(os.getenv("HEYGEN_DIMENSION_HEIGHT"), 720)
 
+        # HeyGen posts avatar_video.success/fail events here when set
+        self.webhook_url = webhook_url("heygen")
+
+        # Request parts that never change; each start only fills in avatar and text
+        self._dimension = {"width": self.dimension_width, "height": self.dimension_height}
+        self._voice_template = {
+            "type": "text",
+            "voice_id": self.default_voice_id,
+            "language": self.voice_language or "en-US",
+            "speed": self.voice_speed,
+        }
+        self._body_extra = {"callback_url": self.webhook_url} if self.webhook_url else {}
+
     @staticmethod
     def _safe_int(value: str, fallback: int) -> int:
         try:
@@ -43,15 +63,21 @@ class HeyGenService:
         except (TypeError, ValueError):
             return fallback
 
-    def _json_headers(self) -> Dict[str, str]:
+    def build_auth_headers(self) -> Dict[str, str]:
+        return {"X-Api-Key": self.api_key}
+
+    def request_config(self) -> Dict:
+        """Settings that change the rendered video; part of the idempotency fingerprint."""
         return {
-            "X-Api-Key": self.api_key,
-            "Content-Type": "application/json",
+            "avatar_id": self.default_avatar_id,
+            "avatar_style": self.avatar_style,
+            "voice_id": self.default_voice_id,
+            "language": self.voice_language,
+            "speed": self.voice_speed,
+            "width": self.dimension_width,
+            "height": self.dimension_height,
         }
 
-    def _auth_headers(self) -> Dict[str, str]:
-        return {"X-Api-Key": self.api_key}
-
     def _resolve_avatar_id(self, avatar_hint: str) -> str:
         candidate = (avatar_hint or "").strip()
         if candidate:
@@ -88,13 +114,7 @@ class HeyGenService:
                 },
             )
 
-        return {
-            "type": "text",
-            "input_text": (text or "Hello there, welcome to my video!").strip(),
-            "voice_id": self.default_voice_id,
-            "language": self.voice_language or "en-US",
-            "speed": self.voice_speed,
-        }
+        return {**self._voice_template, "input_text": (text or "Hello there, welcome to my video!").strip()}
 
     def _build_video_body(self, image_url: str, text: str) -> Dict:
         return {
@@ -104,23 +124,20 @@ class HeyGenService:
                     "voice": self._build_voice_payload(text),
                 }
             ],
-            "dimension": {
-                "width": self.dimension_width,
-                "height": self.dimension_height,
-            },
+            "dimension": self._dimension,
+            **self._body_extra,
         }
 
     async def _send_generate_request(self, payload: Dict) -> Tuple[str, httpx.Response]:
-        url = f"{self.base_url}{self.generate_path}"
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, headers=self._json_headers(), json=payload)
+        url = self.http.url(self.generate_path)
+        response = await self.post_json(self.generate_path, payload, operation="start")
         logger.info("HeyGen POST %s returned HTTP %s", url, response.status_code)
         return url, response
 
     @staticmethod
     def _extract_error_detail(response: httpx.Response) -> str:
         try:
-            data = response.json()
+            data = decode_json(response)
         except ValueError:
             return response.text[:200] or "Empty response"
 
@@ -163,7 +180,7 @@ class HeyGenService:
             self._raise_api_error(url, response)
 
         try:
-            data = response.json()
+            data = decode_json(response)
         except ValueError:
             self._raise_api_error(url, response)
         task_id = (
@@ -172,11 +189,7 @@ class HeyGenService:
             or data.get("data", {}).get("task_id")
         )
 
-        return {
-            "task_id": task_id,
-            "status": data.get("status", "processing"),
-            "provider": "heygen",
-        }
+        return self.started(task_id, data.get("status"))
 
     async def debug_generate(self, image_url: str, text: str) -> Dict:
         """
@@ -192,7 +205,7 @@ class HeyGenService:
             response.status_code,
         )
         try:
-            body = response.json()
+            body = decode_json(response)
         except ValueError:
             body = {"raw": response.text[:500]}
 
@@ -202,35 +215,59 @@ class HeyGenService:
             "response": body,
         }
 
+    async def list_statuses(self, task_ids: Set[str]) -> Dict[str, Dict]:
+        """
+        Page through GET /v1/video.list (newest first). The list carries no
+        video URL or error message, so finished videos are left for the
+        per-video lookup; only pending ones are answered from the list.
+        """
+        results: Dict[str, Dict] = {}
+        seen = 0
+        params = {"limit": STATUS_LIST_PAGE_SIZE}
+        for _ in range(STATUS_LIST_MAX_PAGES):
+            url = self.http.url("/v1/video.list")
+            response = await self.http.get("/v1/video.list", operation="list", headers=self.auth_headers, params=params)
+            if response.status_code != 200:
+                self._raise_api_error(url, response)
+            data = decode_json(response).get("data") or {}
+            for video in data.get("videos") or []:
+                if video.get("video_id") not in task_ids:
+                    continue
+                seen += 1
+                if video.get("status") not in ("completed", "failed"):
+                    results[video["video_id"]] = self.normalize(video.get("status"))
+            if seen == len(task_ids) or not data.get("token"):
+                break
+            params = {"limit": STATUS_LIST_PAGE_SIZE, "token": data["token"]}
+        return results
+
+    def parse_webhook(self, payload: Dict) -> Tuple[str, Dict]:
+        """Map a HeyGen avatar_video.success/fail event to a status result."""
+        event = payload.get("event_data") if isinstance(payload, dict) else None
+        if not isinstance(event, dict) or not event.get("video_id"):
+            raise HTTPException(status_code=400, detail="HeyGen webhook without a video_id")
+
+        event_type = payload.get("event_type", "")
+        status = "completed" if event_type.endswith(".success") else "failed" if event_type.endswith(".fail") else None
+        return event["video_id"], self.normalize(status, event.get("url") or event.get("video_url"), event.get("msg"))
+
     async def get_status(self, task_id: str) -> Dict:
         """Get status of HeyGen video generation task."""
-        url = f"{self.base_url}{self.task_path}/{task_id}"
+        path = f"{self.task_path}/{task_id}"
+        url = self.http.url(path)
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(url, headers=self._auth_headers())
+        response = await self.http.get(path, operation="status", headers=self.auth_headers)
 
         if response.status_code != 200:
             self._raise_api_error(url, response)
 
         try:
-            data = response.json()
+            data = decode_json(response)
         except ValueError:
             self._raise_api_error(url, response)
 
-        result = {
-            "status": data.get("status", "processing"),
-            "provider": "heygen",
-        }
-
-        if data.get("status") == "completed":
-            result["result_url"] = data.get("result_url") or data.get("video_url")
-        elif data.get("status") == "failed":
-            error_payload = data.get("error", {})
-            if isinstance(error_payload, dict):
-                result["failed_message"] = error_payload.get("message", "Unknown error")
-            else:
-                result["failed_message"] = str(error_payload or "Unknown error")
-
-        return result
+        error_payload = data.get("error") or {}
+        error = error_payload.get("message") if isinstance(error_payload, dict) else str(error_payload)
+        return self.normalize(data.get("status"), data.get("result_url") or data.get("video_url"), error)
 
 
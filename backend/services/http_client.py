@@ -0,0 +1,129 @@
+import logging
+import time
+from typing import Optional
+
+import httpx
+
+from services.metrics import upstream_in_flight, upstream_requests, upstream_seconds
+from services.resilience import create_resilience_policy
+from services.settings import env_bool, env_float, env_int
+from services.tracing import KIND_CLIENT, tracer
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_enabled() -> bool:
+    if not env_bool("HTTP_HTTP2"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("HTTP_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def build_limits() -> httpx.Limits:
+    """Connection pool limits, configurable through the environment."""
+    return httpx.Limits(
+        max_connections=env_int("HTTP_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20),
+        keepalive_expiry=env_float("HTTP_KEEPALIVE_EXPIRY", 30.0),
+    )
+
+
+def build_timeout() -> httpx.Timeout:
+    """Per-phase timeouts, configurable through the environment."""
+    return httpx.Timeout(
+        connect=env_float("HTTP_CONNECT_TIMEOUT", 10.0),
+        read=env_float("HTTP_READ_TIMEOUT", 60.0),
+        write=env_float("HTTP_WRITE_TIMEOUT", 30.0),
+        pool=env_float("HTTP_POOL_TIMEOUT", 10.0),
+    )
+
+
+class ProviderHTTPClient:
+    """
+    Long-lived, connection-pooled HTTP client for a single provider.
+
+    The underlying httpx.AsyncClient is created on first use (or by open())
+    and reused across requests so keep-alive connections are shared; the
+    application lifespan closes it through the provider registry. Every request goes through the
+    provider's ResiliencePolicy (rate limit, retries, circuit breaker) and each
+    attempt is timed for the /metrics endpoint, labelled by `operation`
+    ("start", "status", ...). Inside a request, each call is traced as an
+    `upstream` span, each attempt as `upstream.attempt` and its connect, TLS,
+    send, wait (time to first byte) and receive phases as `upstream.<phase>`.
+    """
+
+    def __init__(self, name: str, base_url: str):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.policy = create_resilience_policy(name)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._client is not None and not self._client.is_closed
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if not self.is_open:
+            # Building the client loads the TLS context, which is slow enough to show up in traces
+            with tracer.span("upstream.client_init", provider=self.name):
+                self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=build_limits(),
+            timeout=build_timeout(),
+            http2=_http2_enabled(),
+        )
+
+    async def open(self) -> None:
+        if not self.is_open:
+            self._client = self._create_client()
+            logger.info("Opened pooled HTTP client for %s (%s)", self.name, self.base_url)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Closed pooled HTTP client for %s", self.name)
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    async def _send(self, operation: str, method: str, path: str, **kwargs) -> httpx.Response:
+        code = "error"
+        started = time.perf_counter()
+        upstream_in_flight.inc(self.name)
+        hook = tracer.http_trace_hook("upstream")
+        if hook is not None:
+            kwargs["extensions"] = {**kwargs.get("extensions", {}), "trace": hook}
+        try:
+            with tracer.span("upstream.attempt", KIND_CLIENT, **{"http.request.method": method}) as span:
+                response = await self.client.request(method, path, **kwargs)
+                if span is not None:
+                    span.set("http.response.status_code", response.status_code)
+            code = str(response.status_code)
+            return response
+        finally:
+            upstream_in_flight.dec(self.name)
+            upstream_seconds.observe(self.name, operation, value=time.perf_counter() - started)
+            upstream_requests.inc(self.name, operation, code)
+
+    async def request(self, method: str, path: str, operation: str = "other", **kwargs) -> httpx.Response:
+        with tracer.span("upstream", provider=self.name, operation=operation, **{"url.path": path}):
+            return await self.policy.execute(
+                lambda: self._send(operation, method, path, **kwargs),
+                idempotent=method in ("GET", "HEAD"),
+            )
+
+    async def get(self, path: str, operation: str = "other", **kwargs) -> httpx.Response:
+        return await self.request("GET", path, operation, **kwargs)
+
+    async def post(self, path: str, operation: str = "other", **kwargs) -> httpx.Response:
+        return await self.request("POST", path, operation, **kwargs)
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from services.settings import DATA_DIR, env_float, env_int
+from services.shared_state import SharedState, shared_state
+
+logger = logging.getLogger(__name__)
+
+# Upload URLs are host-dependent; the content hash inside them identifies the image
+UPLOAD_URL_HASH = re.compile(r"/api/uploads/([0-9a-f]{64})")
+
+
+def image_reference(image_url: str) -> str:
+    match = UPLOAD_URL_HASH.search(image_url or "")
+    return f"sha256:{match.group(1)}" if match else (image_url or "").strip()
+
+
+def request_fingerprint(provider: str, image_url: str, text: str, config: Dict) -> str:
+    payload = {
+        "provider": provider,
+        "image": image_reference(image_url),
+        "text": (text or "").strip(),
+        "config": config,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class IdempotencyStore:
+    """Maps an idempotency key to the fingerprint and result of the request that first used it."""
+
+    async def get(self, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def put(self, key: str, fingerprint: str, result: Dict) -> None:
+        raise NotImplementedError
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Process-local store with a TTL window and LRU eviction."""
+
+    def __init__(self, window: float, max_entries: int = 10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        record = self._entries.get(key)
+        if record is None:
+            return None
+        if time.time() - record["created_at"] > self.window:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return record
+
+    async def put(self, key: str, fingerprint: str, result: Dict) -> None:
+        self._entries[key] = {"fingerprint": fingerprint, "result": result, "created_at": time.time()}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """Persistent store so replays survive restarts and redeploys."""
+
+    def __init__(self, path: str, window: float):
+        self.window = window
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS idempotency (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_created_at ON idempotency (created_at)")
+
+    def _get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, result, created_at FROM idempotency WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.window),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"fingerprint": row[0], "result": json.loads(row[1]), "created_at": row[2]}
+
+    def _put(self, key: str, fingerprint: str, result: Dict) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO idempotency (key, fingerprint, result, created_at) VALUES (?, ?, ?, ?)",
+                (key, fingerprint, json.dumps(result), now),
+            )
+            self._conn.execute("DELETE FROM idempotency WHERE created_at < ?", (now - self.window,))
+
+    async def get(self, key: str) -> Optional[Dict]:
+        return await run_in_threadpool(self._get, key)
+
+    async def put(self, key: str, fingerprint: str, result: Dict) -> None:
+        await run_in_threadpool(self._put, key, fingerprint, result)
+
+
+class SharedIdempotencyStore(IdempotencyStore):
+    """Store in the SharedState backend, so every worker process sees the same keys."""
+
+    def __init__(self, state: SharedState, window: float):
+        self.state = state
+        self.window = window
+
+    async def get(self, key: str) -> Optional[Dict]:
+        return await self.state.get(f"idempotency:{key}")
+
+    async def put(self, key: str, fingerprint: str, result: Dict) -> None:
+        record = {"fingerprint": fingerprint, "result": result, "created_at": time.time()}
+        await self.state.set(f"idempotency:{key}", record, self.window)
+
+
+class IdempotencyLayer:
+    """
+    Returns the original result for repeated start requests instead of
+    starting another paid render.
+
+    Requests are keyed by the client's Idempotency-Key header when present,
+    otherwise by a fingerprint of provider, image, text and provider config.
+    Identical requests that arrive while the first is still running wait for
+    its result rather than racing it upstream. A fingerprint is not replayed
+    once `replayable` says its result failed, so resubmitting a failed render
+    starts a new one; an explicit Idempotency-Key always replays.
+    """
+
+    def __init__(self, store: IdempotencyStore):
+        self.store = store
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def run(
+        self,
+        fingerprint: str,
+        start: Callable[[], Awaitable[Dict]],
+        idempotency_key: Optional[str] = None,
+        replayable: Optional[Callable[[Dict], Awaitable[bool]]] = None,
+    ) -> Dict:
+        key = f"key:{idempotency_key}" if idempotency_key else f"fp:{fingerprint}"
+
+        record = await self.store.get(key)
+        if record is not None:
+            self._check_fingerprint(record["fingerprint"], fingerprint)
+            if idempotency_key or replayable is None or await replayable(record["result"]):
+                return {**record["result"], "idempotent_replay": True}
+            # Its render failed: start again, and the new result replaces the record
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            pending_fingerprint, pending = inflight
+            self._check_fingerprint(pending_fingerprint, fingerprint)
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The first request was cancelled before starting; try again unless we were too
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.run(fingerprint, start, idempotency_key, replayable)
+            return {**result, "idempotent_replay": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (fingerprint, future)
+        try:
+            result = await start()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            self._inflight.pop(key, None)
+
+        try:
+            await self.store.put(key, fingerprint, result)
+        except Exception as exc:
+            # The render has started; failing the request now would invite a duplicate retry
+            logger.warning("Could not record idempotency key %s: %s", key, exc)
+        return result
+
+    @staticmethod
+    def _check_fingerprint(stored: str, fingerprint: str) -> None:
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request",
+            )
+
+
+def create_idempotency_layer() -> IdempotencyLayer:
+    window = env_float("IDEMPOTENCY_WINDOW_SECONDS", 600.0)
+    default = "memory" if shared_state.name == "memory" else "shared"
+    backend = (os.getenv("IDEMPOTENCY_STORE") or default).strip().lower()
+    if backend == "shared":
+        store: IdempotencyStore = SharedIdempotencyStore(shared_state, window)
+    elif backend == "sqlite":
+        path = os.getenv("IDEMPOTENCY_DB_PATH") or os.path.join(DATA_DIR, "idempotency.sqlite3")
+        store = SQLiteIdempotencyStore(path, window)
+    elif backend == "memory":
+        store = MemoryIdempotencyStore(window, env_int("IDEMPOTENCY_MAX_ENTRIES", 10000))
+    else:
+        raise RuntimeError(f"Unsupported IDEMPOTENCY_STORE: {backend}. Use 'memory', 'sqlite' or 'shared'")
+    return IdempotencyLayer(store)
@@ -0,0 +1,205 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+
+from services.settings import env_int
+
+logger = logging.getLogger(__name__)
+
+# Pillow is optional; without it uploads are served as-is. Only the render
+# workers import it, which keeps it off the web process's cold start.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# Pillow save format and file extension for each supported output format
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+}
+# Formats that keep an alpha channel; transparent images meant for JPEG are saved as PNG instead
+ALPHA_FORMATS = {"webp"}
+ALPHA_FALLBACK = ("PNG", ".png")
+
+
+class ImagePreset:
+    """Target bounding box and encoding for a provider-ready derivative."""
+
+    __slots__ = ("name", "width", "height", "output_format", "quality")
+
+    def __init__(self, name: str, width: int, height: int, output_format: str = "jpeg", quality: int = 85):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported image format: {output_format}")
+        self.name = name
+        self.width = width
+        self.height = height
+        self.output_format = output_format
+        self.quality = quality
+
+    @property
+    def key(self) -> str:
+        """Identifies the preset's output, so changing its settings yields a new derivative."""
+        return f"{self.name}{self.width}x{self.height}q{self.quality}"
+
+    @property
+    def extension(self) -> str:
+        return OUTPUT_FORMATS[self.output_format][1]
+
+
+def load_presets(auto_providers: Iterable[str] = ()) -> Dict[str, ImagePreset]:
+    """
+    Presets by name. "auto" fits within every one of `auto_providers`' boxes,
+    so the image suits whichever of them auto mode picks; providers without a
+    preset of their own count as the default box.
+    """
+    image_format = (os.getenv("IMAGE_FORMAT") or "jpeg").strip().lower()
+    if image_format not in OUTPUT_FORMATS:
+        image_format = "jpeg"
+    quality = env_int("IMAGE_QUALITY", 85)
+    max_side = env_int("IMAGE_MAX_SIDE", 1280)
+    presets = {
+        "default": ImagePreset("default", max_side, max_side, image_format, quality),
+        "a2e": ImagePreset("a2e", max_side, max_side, image_format, quality),
+        "did": ImagePreset("did", max_side, max_side, image_format, quality),
+        "heygen": ImagePreset(
+            "heygen",
+            env_int("HEYGEN_DIMENSION_WIDTH", 1280),
+            env_int("HEYGEN_DIMENSION_HEIGHT", 720),
+            image_format,
+            quality,
+        ),
+    }
+    candidates = [presets.get(name, presets["default"]) for name in auto_providers] or [presets["default"]]
+    presets["auto"] = ImagePreset(
+        "auto",
+        min(candidate.width for candidate in candidates),
+        min(candidate.height for candidate in candidates),
+        image_format,
+        min(candidate.quality for candidate in candidates),
+    )
+    return presets
+
+
+def render_derivative(
+    source_path: str, target_stem: str, size: Tuple[int, int], output_format: str, quality: int
+) -> str:
+    """
+    Resize, re-encode and strip metadata. Runs in a worker process.
+
+    EXIF orientation is applied to the pixels before the metadata is dropped,
+    and images are only ever scaled down to fit within `size`. Transparent
+    images keep their alpha channel: as WebP when that is the output format,
+    otherwise as PNG. Returns the extension the derivative was saved with.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        # Let the JPEG decoder downscale while decoding; much cheaper for large photos
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        if has_alpha:
+            save_format, extension = (
+                OUTPUT_FORMATS[output_format] if output_format in ALPHA_FORMATS else ALPHA_FALLBACK
+            )
+            target_mode = "RGBA"
+        else:
+            save_format, extension = OUTPUT_FORMATS[output_format]
+            target_mode = "RGB"
+        if image.mode != target_mode:
+            image = image.convert(target_mode)
+        image.thumbnail(size, Image.LANCZOS)
+
+        target_path = f"{target_stem}{extension}"
+        part_path = f"{target_path}.{uuid.uuid4().hex}.part"
+        try:
+            image.save(part_path, save_format, quality=quality, optimize=True)
+            os.replace(part_path, target_path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+    return extension
+
+
+class ImagePipeline:
+    """
+    Produces provider-ready derivatives of uploaded images in a process pool.
+
+    Derivatives are cached on disk as <sha256>-<preset key><ext> next to the
+    original (<ext> is .png for transparent images when the preset's format
+    has no alpha) (`path_for` maps a stored filename to its path), so each
+    (content hash, preset) pair is rendered once and concurrent requests for
+    the same pair share one render.
+    """
+
+    def __init__(self, path_for: Callable[[str], str], presets: Dict[str, ImagePreset], workers: int = 2):
+        self.path_for = path_for
+        self.presets = presets
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def available(self) -> bool:
+        return PILLOW_AVAILABLE
+
+    def preset(self, name: Optional[str]) -> ImagePreset:
+        """The preset called `name` ("default" when None); 400 if there is no such preset."""
+        preset = self.presets.get((name or "default").lower())
+        if preset is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown image preset: {name}. Supported presets: {', '.join(self.presets)}",
+            )
+        return preset
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def derive(self, sha256: str, source_filename: str, preset_name: Optional[str]) -> Optional[str]:
+        """Return the derivative filename for a stored upload, or None if it cannot be produced; 400 for an unknown preset."""
+        preset = self.preset(preset_name)
+        if not self.available:
+            return None
+        stem = f"{sha256}-{preset.key}"
+        for extension in (preset.extension, ALPHA_FALLBACK[1]):
+            if os.path.exists(self.path_for(stem + extension)):
+                return stem + extension
+
+        pending = self._pending.get(stem)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            # path_for only uses the name to pick the shard, so the stem maps next to the final file
+            pending = loop.run_in_executor(
+                self._get_executor(),
+                render_derivative,
+                self.path_for(source_filename),
+                self.path_for(stem),
+                (preset.width, preset.height),
+                preset.output_format,
+                preset.quality,
+            )
+            self._pending[stem] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(stem, None))
+
+        try:
+            extension = await asyncio.shield(pending)
+        except Exception as exc:
+            logger.warning("Could not render %s preset for %s: %s", preset.name, source_filename, exc)
+            return None
+        return stem + extension
+
+
+IMAGE_WORKERS = env_int("IMAGE_WORKERS", 2)
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+from services.metrics import queue_wait_seconds
+from services.settings import env_int
+
+logger = logging.getLogger(__name__)
+
+# Lanes in the order workers drain them
+PRIORITY_LANES = ("high", "normal", "low")
+
+JobRunner = Callable[[Dict], Awaitable[Dict]]
+
+
+class QueueFullError(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=429,
+            detail="Job queue is full, please retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class QueueBackend:
+    """Storage for queued jobs and their records; shared by every worker that uses it."""
+
+    async def push(self, job: Dict) -> bool:
+        """Enqueue a job in its priority lane; False when the queue is full."""
+        raise NotImplementedError
+
+    async def pop(self) -> Dict:
+        """Wait for the next job, highest priority lane first."""
+        raise NotImplementedError
+
+    async def depth(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    async def save(self, job: Dict) -> None:
+        raise NotImplementedError
+
+    async def load(self, job_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryQueueBackend(QueueBackend):
+    """In-process queue; jobs still waiting are lost if the process stops."""
+
+    def __init__(self, max_size: int, max_records: int = 10000):
+        self.max_size = max_size
+        self.max_records = max_records
+        self._lanes: Dict[str, Deque[Dict]] = {lane: deque() for lane in PRIORITY_LANES}
+        self._records: "OrderedDict[str, Dict]" = OrderedDict()
+        self._available: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+
+    async def push(self, job: Dict) -> bool:
+        condition = self._condition()
+        async with condition:
+            if sum(len(lane) for lane in self._lanes.values()) >= self.max_size:
+                return False
+            self._lanes[job["priority"]].append(job)
+            condition.notify()
+        return True
+
+    async def pop(self) -> Dict:
+        condition = self._condition()
+        async with condition:
+            while True:
+                for lane in PRIORITY_LANES:
+                    if self._lanes[lane]:
+                        return self._lanes[lane].popleft()
+                await condition.wait()
+
+    async def depth(self) -> Dict[str, int]:
+        return {lane: len(self._lanes[lane]) for lane in PRIORITY_LANES}
+
+    async def save(self, job: Dict) -> None:
+        self._records[job["job_id"]] = dict(job)
+        self._records.move_to_end(job["job_id"])
+        while len(self._records) > self.max_records:
+            self._records.popitem(last=False)
+
+    async def load(self, job_id: str) -> Optional[Dict]:
+        record = self._records.get(job_id)
+        return dict(record) if record else None
+
+
+class RedisQueueBackend(QueueBackend):
+    """
+    Queue in Redis (or any Redis-compatible server such as Valkey or KeyDB) so
+    several uvicorn workers share one queue. Lanes are lists drained with
+    BLPOP in priority order; job records are JSON strings that expire after a day.
+    """
+
+    # Checks the total depth and pushes atomically so the bound holds across processes
+    PUSH_SCRIPT = """
+    local total = 0
+    for i = 2, #KEYS do total = total + redis.call('LLEN', KEYS[i]) end
+    if total >= tonumber(ARGV[2]) then return 0 end
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+    return 1
+    """
+
+    def __init__(self, url: str, max_size: int, prefix: str = "i2v", record_ttl: int = 86400):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("QUEUE_BACKEND=redis requires the 'redis' package (pip install redis)")
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+        self.max_size = max_size
+        self.prefix = prefix
+        self.record_ttl = record_ttl
+        self._push = self._redis.register_script(self.PUSH_SCRIPT)
+
+    def _lane_key(self, lane: str) -> str:
+        return f"{self.prefix}:queue:{lane}"
+
+    def _record_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    async def push(self, job: Dict) -> bool:
+        keys = [self._lane_key(job["priority"])] + [self._lane_key(lane) for lane in PRIORITY_LANES]
+        return bool(await self._push(keys=keys, args=[json.dumps(job), self.max_size]))
+
+    async def pop(self) -> Dict:
+        while True:
+            item = await self._redis.blpop([self._lane_key(lane) for lane in PRIORITY_LANES], timeout=5)
+            if item is not None:
+                return json.loads(item[1])
+
+    async def depth(self) -> Dict[str, int]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for lane in PRIORITY_LANES:
+                pipe.llen(self._lane_key(lane))
+            counts = await pipe.execute()
+        return dict(zip(PRIORITY_LANES, counts))
+
+    async def save(self, job: Dict) -> None:
+        await self._redis.set(self._record_key(job["job_id"]), json.dumps(job), ex=self.record_ttl)
+
+    async def load(self, job_id: str) -> Optional[Dict]:
+        raw = await self._redis.get(self._record_key(job_id))
+        return json.loads(raw) if raw else None
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class JobQueue:
+    """
+    Bounded, prioritised queue of start requests drained by a fixed-size
+    async worker pool.
+
+    Enqueueing returns a local job id immediately; workers call `runner`
+    (which applies the per-provider concurrency limits) and store the
+    outcome on the job record. A full queue raises 429 with a Retry-After
+    estimated from recent throughput.
+    """
+
+    def __init__(self, backend: QueueBackend, runner: JobRunner, workers: int = 4, stats_window: int = 1000):
+        self.backend = backend
+        self.runner = runner
+        self.workers = workers
+        self._tasks = []
+        self._waits: Deque[float] = deque(maxlen=stats_window)
+        self._durations: Deque[float] = deque(maxlen=stats_window)
+        self.last_depth: Dict[str, int] = {}
+        self.active = 0
+        self.enqueued = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.backend.close()
+
+    async def enqueue(self, request: Dict, priority: str = "normal", idempotency_key: Optional[str] = None) -> Dict:
+        if priority not in PRIORITY_LANES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported priority: {priority}. Use one of: {', '.join(PRIORITY_LANES)}",
+            )
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "state": "queued",
+            "priority": priority,
+            "request": request,
+            "idempotency_key": idempotency_key,
+            "enqueued_at": time.time(),
+        }
+        await self.backend.save(job)
+        if not await self.backend.push(job):
+            self.rejected += 1
+            job["state"] = "rejected"
+            await self.backend.save(job)
+            raise QueueFullError(await self._retry_after())
+        self.enqueued += 1
+        return self._public(job)
+
+    async def get(self, job_id: str) -> Dict:
+        job = await self.backend.load(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Queued job not found")
+        return self._public(job)
+
+    @staticmethod
+    def _public(job: Dict) -> Dict:
+        return {key: value for key, value in job.items() if key not in ("request", "idempotency_key")}
+
+    async def depth(self) -> Dict[str, int]:
+        """Jobs waiting per lane; also kept as `last_depth` for the metrics gauge."""
+        self.last_depth = await self.backend.depth()
+        return self.last_depth
+
+    async def _retry_after(self) -> int:
+        depth = sum((await self.depth()).values())
+        if not self._durations:
+            return 5
+        per_job = sum(self._durations) / len(self._durations)
+        return max(1, math.ceil(depth * per_job / self.workers))
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await self.backend.pop()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error("Job queue pop failed: %s", exc)
+                await asyncio.sleep(1)
+                continue
+
+            dequeued_at = time.time()
+            self._waits.append(dequeued_at - job["enqueued_at"])
+            queue_wait_seconds.observe(job["priority"], value=dequeued_at - job["enqueued_at"])
+            job.update(state="starting", dequeued_at=dequeued_at)
+            await self.backend.save(job)
+            self.active += 1
+            try:
+                result = await self.runner(job)
+            except Exception as exc:
+                self.failed += 1
+                if isinstance(exc, HTTPException):
+                    job.update(state="failed", error=exc.detail, status_code=exc.status_code)
+                else:
+                    job.update(state="failed", error=str(exc), status_code=500)
+            else:
+                self.completed += 1
+                job.update(state="started", result=result)
+            finally:
+                self.active -= 1
+            self._durations.append(time.time() - dequeued_at)
+            job["finished_at"] = time.time()
+            await self.backend.save(job)
+
+    async def stats(self) -> Dict:
+        waits = sorted(self._waits)
+        return {
+            "depth": await self.depth(),
+            "workers": self.workers,
+            "active": self.active,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_seconds_avg": round(sum(waits) / len(waits), 4) if waits else None,
+            "wait_seconds_p95": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 4) if waits else None,
+        }
+
+
+def create_job_queue(runner: JobRunner) -> JobQueue:
+    max_size = env_int("QUEUE_MAX_SIZE", 1000)
+    backend_name = (os.getenv("QUEUE_BACKEND") or "memory").strip().lower()
+    if backend_name == "redis":
+        backend: QueueBackend = RedisQueueBackend(os.getenv("QUEUE_REDIS_URL") or "redis://localhost:6379/0", max_size)
+    elif backend_name == "memory":
+        backend = MemoryQueueBackend(max_size)
+    else:
+        raise RuntimeError(f"Unsupported QUEUE_BACKEND: {backend_name}. Use 'memory' or 'redis'")
+    return JobQueue(backend, runner, workers=env_int("QUEUE_WORKERS", 4))
@@ -0,0 +1,247 @@
+import base64
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from services.settings import DATA_DIR, env_int
+
+logger = logging.getLogger(__name__)
+
+JOB_COLUMNS = (
+    "id", "provider", "task_id", "status", "image_url", "text",
+    "result_url", "failed_message", "created_at", "updated_at",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    image_url TEXT,
+    text TEXT,
+    result_url TEXT,
+    failed_message TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (provider, task_id)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_provider_created ON jobs (provider, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at, id);
+
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, at);
+CREATE INDEX IF NOT EXISTS idx_job_events_at ON job_events (at);
+
+CREATE TRIGGER IF NOT EXISTS trg_jobs_insert AFTER INSERT ON jobs
+BEGIN
+    INSERT INTO job_events (job_id, status, at) VALUES (new.id, new.status, new.updated_at);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_jobs_status AFTER UPDATE OF status ON jobs
+WHEN old.status IS NOT new.status
+BEGIN
+    INSERT INTO job_events (job_id, status, at) VALUES (new.id, new.status, new.updated_at);
+END;
+"""
+
+# Insert a job or move it to a new state; rows whose state did not change are left untouched
+UPSERT_JOB = """
+INSERT INTO jobs (provider, task_id, status, image_url, text, result_url, failed_message, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (provider, task_id) DO UPDATE SET
+    status = excluded.status,
+    image_url = COALESCE(jobs.image_url, excluded.image_url),
+    text = COALESCE(jobs.text, excluded.text),
+    result_url = COALESCE(excluded.result_url, jobs.result_url),
+    failed_message = COALESCE(excluded.failed_message, jobs.failed_message),
+    updated_at = excluded.updated_at
+WHERE jobs.status IS NOT excluded.status
+    OR jobs.result_url IS NOT COALESCE(excluded.result_url, jobs.result_url)
+    OR (jobs.image_url IS NULL AND excluded.image_url IS NOT NULL)
+"""
+
+_STOP = object()
+
+
+def encode_cursor(created_at: float, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at!r}:{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split(":")
+        return float(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class JobStore:
+    """
+    SQLite registry of every started job and its status transitions.
+
+    Writes are queued and applied in batches by a dedicated writer thread, so
+    request handlers never wait on disk. Reads use their own connection in the
+    thread pool. Listing uses keyset pagination over (created_at, id) indexes,
+    which stays fast regardless of table size.
+    """
+
+    def __init__(self, path: str, max_pending: int = 100000, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._writer: Optional[threading.Thread] = None
+        self._read_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.executescript(SCHEMA)
+        self._reader = conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True)
+            self._writer.start()
+
+    def stop(self) -> None:
+        """Flush queued writes and stop the writer thread."""
+        if self._writer is not None:
+            self._pending.put(_STOP)
+            self._writer.join(timeout=10)
+            self._writer = None
+
+    def _enqueue(self, row: Tuple) -> None:
+        try:
+            self._pending.put_nowait(row)
+        except queue.Full:
+            logger.warning("Job store write queue is full; dropping update for %s/%s", row[0], row[1])
+
+    def record_start(self, provider: str, task_id: str, status: str, image_url: str, text: str) -> None:
+        if not task_id:
+            return
+        now = time.time()
+        self._enqueue((provider, task_id, status or "processing", image_url, text, None, None, now, now))
+
+    def record_status(self, provider: str, task_id: str, result: Dict) -> None:
+        now = time.time()
+        self._enqueue(
+            (
+                provider, task_id, result.get("status") or "processing", None, None,
+                result.get("result_url"), result.get("failed_message"), now, now,
+            )
+        )
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [row for row in batch if row is not _STOP]
+            if not batch:
+                continue
+            try:
+                with conn:
+                    conn.executemany(UPSERT_JOB, batch)
+            except sqlite3.Error as exc:
+                logger.error("Job store write of %s rows failed: %s", len(batch), exc)
+        conn.close()
+
+    def _list(self, provider: Optional[str], status: Optional[str], limit: int, cursor: Optional[str]) -> Dict:
+        clauses, params = [], []
+        if provider:
+            clauses.append("provider = ?")
+            params.append(provider)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if cursor:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs {where} "
+            "ORDER BY created_at DESC, id DESC LIMIT ?"
+        )
+        params.append(limit + 1)
+        with self._read_lock:
+            rows = self._reader.execute(sql, params).fetchall()
+
+        jobs = [dict(zip(JOB_COLUMNS, row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = jobs[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return {"jobs": jobs, "next_cursor": next_cursor}
+
+    async def list(self, provider: Optional[str] = None, status: Optional[str] = None,
+                   limit: int = 50, cursor: Optional[str] = None) -> Dict:
+        return await run_in_threadpool(self._list, provider, status, limit, cursor)
+
+    def _known(self, provider: str, task_id: str) -> bool:
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT 1 FROM jobs WHERE provider = ? AND task_id = ?", (provider, task_id)
+            ).fetchone()
+        return row is not None
+
+    async def known(self, provider: str, task_id: str) -> bool:
+        """Whether this backend started the task (writes still queued are not seen yet)."""
+        return await run_in_threadpool(self._known, provider, task_id)
+
+    def _in_flight(self, since: float, statuses: Tuple[str, ...]) -> List[Dict]:
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"SELECT provider, task_id, status, image_url FROM jobs "
+                f"WHERE created_at >= ? AND status NOT IN ({placeholders})",
+                (since, *statuses),
+            ).fetchall()
+        return [{"provider": row[0], "task_id": row[1], "status": row[2], "image_url": row[3]} for row in rows]
+
+    async def in_flight(self, since: float, terminal_statuses: Tuple[str, ...]) -> List[Dict]:
+        """Jobs created after `since` that have not reached a terminal state."""
+        return await run_in_threadpool(self._in_flight, since, terminal_statuses)
+
+    def _finished_images(self, since: float, statuses: Tuple[str, ...]) -> Set[str]:
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"SELECT DISTINCT jobs.image_url FROM job_events JOIN jobs ON jobs.id = job_events.job_id "
+                f"WHERE job_events.at >= ? AND job_events.status IN ({placeholders})",
+                (since, *statuses),
+            ).fetchall()
+        return {row[0] for row in rows if row[0]}
+
+    async def finished_images(self, since: float, terminal_statuses: Tuple[str, ...]) -> Set[str]:
+        """Image URLs of jobs that reached a terminal state after `since`."""
+        return await run_in_threadpool(self._finished_images, since, terminal_statuses)
+
+
+def create_job_store() -> JobStore:
+    path = os.getenv("JOB_STORE_PATH") or os.path.join(DATA_DIR, "jobs.sqlite3")
+    return JobStore(path, max_pending=env_int("JOB_STORE_MAX_PENDING", 100000))
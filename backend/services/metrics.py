@@ -0,0 +1,274 @@
+import asyncio
+import bisect
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.responses import Response
+
+from services.settings import env_float
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans fast status lookups up to slow render starts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bytes; 16 KB up to the default 20 MB upload cap
+SIZE_BUCKETS = tuple(16 * 1024 * 4 ** i for i in range(7))
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Base for metrics exported in the Prometheus text format.
+
+    Every label value must come from a small fixed set (provider names, route
+    templates, status codes) so the number of series stays bounded.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}"
+            for values, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric):
+    """Gauge set directly, or read from `callback` (returning {label values: value}) at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, *label_values: str, value: float) -> None:
+        self._values[label_values] = value
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def samples(self) -> List[str]:
+        values = dict(self._values)
+        if self.callback is not None:
+            try:
+                values.update(self.callback())
+            except Exception as exc:
+                logger.warning("Metric callback for %s failed: %s", self.name, exc)
+        return [
+            f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, *label_values: str, value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def response(self) -> Response:
+        return Response(self.render(), media_type=CONTENT_TYPE)
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "i2v_http_requests_total", "HTTP requests handled, by route template.", ("method", "route", "status")
+)
+http_request_seconds = registry.histogram(
+    "i2v_http_request_duration_seconds", "Time to send the response headers, by route template.", ("method", "route")
+)
+http_in_flight = registry.gauge("i2v_http_requests_in_flight", "HTTP requests currently being handled.")
+
+upstream_requests = registry.counter(
+    "i2v_upstream_requests_total", "Provider API calls by HTTP status code.", ("provider", "operation", "code")
+)
+upstream_seconds = registry.histogram(
+    "i2v_upstream_request_duration_seconds", "Provider API call latency per attempt.", ("provider", "operation")
+)
+upstream_in_flight = registry.gauge(
+    "i2v_upstream_requests_in_flight", "Provider API calls currently awaiting a response.", ("provider",)
+)
+
+jobs_started = registry.counter(
+    "i2v_jobs_started_total", "Video generation starts by provider and outcome.", ("provider", "outcome")
+)
+
+queue_wait_seconds = registry.histogram(
+    "i2v_queue_wait_seconds", "Time a queued job waited from enqueue until a worker started it.", ("lane",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+
+upload_bytes = registry.histogram(
+    "i2v_upload_size_bytes", "Size of accepted uploads.", buckets=SIZE_BUCKETS
+)
+upload_seconds = registry.histogram("i2v_upload_duration_seconds", "Time to receive and store an upload.")
+
+event_loop_lag = registry.histogram(
+    "i2v_event_loop_lag_seconds", "Delay between a scheduled event-loop wakeup and when it ran.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting requests per route template.
+
+    Routes are labelled by their template (e.g. /api/status/{provider}/{task_id}),
+    never the raw path, so arbitrary URLs cannot create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                route = scope.get("route")
+                labels = (scope["method"], getattr(route, "path", "unmatched"))
+                http_request_seconds.observe(*labels, value=time.perf_counter() - started)
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            route = scope.get("route")
+            http_requests.inc(scope["method"], getattr(route, "path", "unmatched"), str(status["code"]))
+
+
+class EventLoopLagMonitor:
+    """Sleeps for `interval` in a loop and records how late each wakeup was."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            event_loop_lag.observe(value=max(0.0, loop.time() - scheduled))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+loop_lag_monitor = EventLoopLagMonitor(env_float("METRICS_LOOP_LAG_INTERVAL", 0.5))
@@ -0,0 +1,100 @@
+import os
+from typing import Dict, Optional, Set, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from services.codecs import json_dumps
+from services.http_client import ProviderHTTPClient
+from services.settings import env_int
+
+# Pages (of STATUS_LIST_PAGE_SIZE jobs, newest first) a bulk status lookup may read
+STATUS_LIST_MAX_PAGES = env_int("STATUS_LIST_MAX_PAGES", 5)
+STATUS_LIST_PAGE_SIZE = env_int("STATUS_LIST_PAGE_SIZE", 100)
+
+
+class ProviderService:
+    """
+    Base class for video providers.
+
+    Subclasses set `name` (registry key, metrics label and the `provider`
+    field of every result), `label`, `credential_env` and `default_base_url`,
+    and implement start_video and get_status; providers that push updates
+    also implement parse_webhook. The base URL can be overridden with
+    <NAME>_BASE_URL. Construction raises RuntimeError when the credential is
+    missing, which the registry reports as "not configured".
+    """
+
+    name = ""
+    label = ""
+    credential_env = ""
+    default_base_url = ""
+    # Provider status -> normalized status ("completed", "failed"); others pass through unchanged
+    status_map: Dict[str, str] = {}
+    # Whether list_statuses can answer many status lookups with a few list calls
+    supports_bulk_status = False
+    # Cheap authenticated GET the readiness check uses to validate credentials (None = skip)
+    readiness_path: Optional[str] = None
+    # Longest script segment for segmented rendering; 0 when `text` is not narrated
+    script_segment_chars = env_int("SEGMENT_MAX_CHARS", 600)
+
+    def __init__(self):
+        # Strip whitespace/newlines to avoid invalid header bytes
+        self.api_key = (os.getenv(self.credential_env) or "").strip()
+        if not self.api_key:
+            raise RuntimeError(f"{self.credential_env} not found in environment variables")
+        self.base_url = (os.getenv(f"{self.name.upper()}_BASE_URL") or self.default_base_url).strip()
+        self.http = ProviderHTTPClient(self.name, self.base_url)
+        # Callback URL sent with start requests; None when the provider is polled only
+        self.webhook_url: Optional[str] = None
+        # Built once and shared by every request (httpx copies them, never mutates them)
+        self.auth_headers = self.build_auth_headers()
+        self.json_headers = {**self.auth_headers, "Content-Type": "application/json"}
+
+    def build_auth_headers(self) -> Dict[str, str]:
+        return {}
+
+    async def post_json(self, path: str, body: Dict, operation: str) -> httpx.Response:
+        return await self.http.post(path, operation=operation, headers=self.json_headers, content=json_dumps(body))
+
+    def request_config(self) -> Dict:
+        """Settings besides image and text that shape the render, for idempotency fingerprints."""
+        return {}
+
+    async def start_video(self, image_url: str, text: str) -> Dict:
+        raise NotImplementedError
+
+    async def get_status(self, task_id: str) -> Dict:
+        raise NotImplementedError
+
+    async def list_statuses(self, task_ids: Set[str]) -> Dict[str, Dict]:
+        """
+        Statuses for as many of `task_ids` as the provider's list endpoint
+        covers (recent jobs only); the rest are looked up one by one.
+        """
+        return {}
+
+    def parse_webhook(self, payload: Dict) -> Tuple[str, Dict]:
+        """Map a webhook payload to (task_id, status result)."""
+        raise HTTPException(status_code=404, detail=f"{self.label} does not send webhooks")
+
+    def started(self, task_id: Optional[str], status: Optional[str]) -> Dict:
+        """Result of a start request."""
+        return {"task_id": task_id, "status": status or "processing", "provider": self.name}
+
+    def normalize(self, status: Optional[str], result_url: Optional[str] = None, error: Optional[str] = None) -> Dict:
+        """
+        Status result in the shape every provider returns: the status mapped
+        through `status_map`, plus `result_url` once completed or
+        `failed_message` once failed.
+        """
+        status = self.status_map.get(status, status) if status else "processing"
+        result = {"status": status, "provider": self.name}
+        if status == "completed":
+            result["result_url"] = result_url
+        elif status == "failed":
+            result["failed_message"] = error or "Unknown error"
+        return result
+
+    def api_error(self, response: httpx.Response) -> HTTPException:
+        return HTTPException(status_code=response.status_code, detail=f"{self.label} API error: {response.text}")
@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from services.settings import env_float, env_int
+
+# Seconds of turnaround a failed job is assumed to cost when scoring providers
+FAILURE_COST_SECONDS = 600.0
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ProviderMetrics:
+    """
+    Rolling-window start latency, time-to-completion and error rate per provider.
+
+    Samples older than `window` seconds are discarded, and at most
+    `max_samples` are kept per provider and series.
+    """
+
+    def __init__(self, window: float = 900.0, max_samples: int = 500, max_pending: int = 10000):
+        self.window = window
+        self.max_samples = max_samples
+        self.max_pending = max_pending
+        # provider -> deque of (timestamp, latency seconds, ok)
+        self._starts: Dict[str, Deque[Tuple[float, float, bool]]] = {}
+        # provider -> deque of (timestamp, seconds from start to terminal state, ok)
+        self._completions: Dict[str, Deque[Tuple[float, float, bool]]] = {}
+        # (provider, task_id) -> start timestamp for jobs that have not finished yet
+        self._started: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+    def _series(self, store: Dict, provider: str) -> Deque:
+        series = store.get(provider)
+        if series is None:
+            series = store[provider] = deque(maxlen=self.max_samples)
+        return series
+
+    def _recent(self, series: Optional[Deque]) -> List[Tuple[float, float, bool]]:
+        if not series:
+            return []
+        cutoff = time.time() - self.window
+        while series and series[0][0] < cutoff:
+            series.popleft()
+        return list(series)
+
+    def record_start(self, provider: str, latency: float, ok: bool, task_id: Optional[str] = None) -> None:
+        now = time.time()
+        self._series(self._starts, provider).append((now, latency, ok))
+        if ok and task_id:
+            self._started[(provider, task_id)] = now
+            while len(self._started) > self.max_pending:
+                self._started.popitem(last=False)
+
+    def record_terminal(self, provider: str, task_id: str, ok: bool) -> None:
+        """Record time-to-completion the first time a started job is seen finished."""
+        started_at = self._started.pop((provider, task_id), None)
+        if started_at is not None:
+            now = time.time()
+            self._series(self._completions, provider).append((now, now - started_at, ok))
+
+    def snapshot(self, provider: str) -> Dict:
+        starts = self._recent(self._starts.get(provider))
+        completions = self._recent(self._completions.get(provider))
+        latencies = [latency for _, latency, _ in starts]
+        durations = [seconds for _, seconds, ok in completions if ok]
+        failures = sum(1 for _, _, ok in starts if not ok) + sum(1 for _, _, ok in completions if not ok)
+        outcomes = len(starts) + len(completions)
+        return {
+            "start_samples": len(starts),
+            "start_p50": _percentile(latencies, 50),
+            "start_p95": _percentile(latencies, 95),
+            "completion_samples": len(completions),
+            "completion_p50": _percentile(durations, 50),
+            "error_rate": round(failures / outcomes, 4) if outcomes else 0.0,
+        }
+
+    def score(self, provider: str) -> float:
+        """Expected turnaround in seconds plus the expected cost of failures; lower is better."""
+        snapshot = self.snapshot(provider)
+        if not snapshot["start_samples"]:
+            # Unmeasured providers are tried first so every candidate gets samples
+            return 0.0
+        turnaround = (snapshot["start_p95"] or 0.0) + (snapshot["completion_p50"] or 0.0)
+        return turnaround + snapshot["error_rate"] * FAILURE_COST_SECONDS
+
+    def rank(self, providers: Iterable[str]) -> List[str]:
+        return sorted(providers, key=self.score)
+
+
+provider_metrics = ProviderMetrics(
+    window=env_float("PROVIDER_METRICS_WINDOW", 900.0),
+    max_samples=env_int("PROVIDER_METRICS_MAX_SAMPLES", 500),
+)
@@ -0,0 +1,145 @@
+import importlib
+import logging
+import os
+from importlib.metadata import EntryPoint, entry_points
+from typing import Dict, Iterable, List, Optional, Union
+
+from fastapi import HTTPException
+
+from services.provider_base import ProviderService
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "image2video.providers"
+
+# name -> "module:Class"; modules are only imported when the provider is first used
+BUILTIN_PROVIDERS = {
+    "a2e": "services.a2e_service:A2EService",
+    "did": "services.did_service:DIDService",
+    "heygen": "services.heygen_service:HeyGenService",
+}
+
+PROVIDER_ALIASES = {"d-id": "did"}
+
+
+def _load_target(target: Union[str, EntryPoint]) -> type:
+    if isinstance(target, EntryPoint):
+        return target.load()
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def plugins_from_env() -> Dict[str, str]:
+    """Extra providers from PROVIDER_PLUGINS, e.g. "acme=acme_video.service:AcmeService,..."."""
+    plugins = {}
+    for item in (os.getenv("PROVIDER_PLUGINS") or "").split(","):
+        name, _, target = item.partition("=")
+        if name.strip() and ":" in target:
+            plugins[name.strip().lower()] = target.strip()
+        elif item.strip():
+            logger.warning("Ignoring malformed PROVIDER_PLUGINS entry %r (expected name=module:Class)", item)
+    return plugins
+
+
+class ProviderRegistry:
+    """
+    Provider services by name, each imported and constructed on first use.
+
+    Providers come from the built-in table, PROVIDER_PLUGINS and the
+    `image2video.providers` entry-point group (consulted only when a name is
+    not otherwise known, or when every provider is listed). A provider whose
+    credentials are missing is remembered as not configured, so lookups do
+    not retry the construction.
+    """
+
+    def __init__(
+        self,
+        targets: Dict[str, Union[str, EntryPoint]],
+        aliases: Optional[Dict[str, str]] = None,
+        entry_point_group: Optional[str] = None,
+    ):
+        self._targets = dict(targets)
+        self._aliases = dict(aliases or {})
+        self._entry_point_group = entry_point_group
+        self._services: Dict[str, ProviderService] = {}
+        # name -> why it could not be built
+        self._unavailable: Dict[str, str] = {}
+
+    def _discover(self) -> None:
+        if self._entry_point_group is None:
+            return
+        for entry_point in entry_points(group=self._entry_point_group):
+            # Built-in and configured providers win over installed packages of the same name
+            self._targets.setdefault(entry_point.name.lower(), entry_point)
+        self._entry_point_group = None
+
+    def names(self) -> List[str]:
+        self._discover()
+        return list(self._targets)
+
+    def canonical(self, provider: str) -> Optional[str]:
+        name = provider.lower()
+        name = self._aliases.get(name, name)
+        if name not in self._targets:
+            self._discover()
+        return name if name in self._targets else None
+
+    def _build(self, name: str) -> Optional[ProviderService]:
+        if name in self._services:
+            return self._services[name]
+        if name in self._unavailable:
+            return None
+        try:
+            service_class = _load_target(self._targets[name])
+        except Exception as exc:
+            logger.exception("Could not load provider %s", name)
+            self._unavailable[name] = f"Provider {name} could not be loaded: {exc}"
+            return None
+        try:
+            service = service_class()
+        except RuntimeError:
+            self._unavailable[name] = (
+                f"{service_class.label} service is not configured. Please set {service_class.credential_env} in .env"
+            )
+            return None
+        self._services[name] = service
+        logger.info("Loaded provider %s", name)
+        return service
+
+    def get(self, provider: str) -> ProviderService:
+        """The service for `provider`; 400 if it is unknown, 500 if it is not configured."""
+        name = self.canonical(provider)
+        if name is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported provider: {provider}. Supported providers: {', '.join(self.names())}",
+            )
+        service = self._build(name)
+        if service is None:
+            raise HTTPException(status_code=500, detail=self._unavailable[name])
+        return service
+
+    def configured(self, names: Optional[Iterable[str]] = None) -> List[ProviderService]:
+        """Configured services among `names` (default: every registered provider), building them if needed."""
+        services = []
+        for provider in self.names() if names is None else names:
+            name = self.canonical(provider)
+            service = self._build(name) if name else None
+            if service is not None and service not in services:
+                services.append(service)
+        return services
+
+    def unavailable(self) -> Dict[str, str]:
+        """Why each provider tried so far could not be built (usually a missing credential)."""
+        return dict(self._unavailable)
+
+    def loaded(self) -> List[ProviderService]:
+        """Services built so far."""
+        return list(self._services.values())
+
+    async def aclose(self) -> None:
+        for service in self.loaded():
+            await service.http.aclose()
+
+
+provider_registry = ProviderRegistry({**BUILTIN_PROVIDERS, **plugins_from_env()}, PROVIDER_ALIASES, ENTRY_POINT_GROUP)
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from services.metrics import registry
+from services.provider_base import ProviderService
+from services.provider_registry import ProviderRegistry, provider_registry
+from services.settings import env_bool, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessChecker:
+    """
+    Warms up configured providers and keeps a cached readiness report.
+
+    The first check runs in the background right after startup: it builds
+    every configured provider (paying their lazy imports now rather than on
+    the first request), resolves each base URL's host, opens
+    `warm_connections` pooled connections (TCP and TLS) with cheap requests
+    and, when `validate` is set, calls the provider's `readiness_path` with
+    its credentials. Checks repeat every `interval` seconds (0 = only at
+    startup), which also keeps pooled connections from going idle.
+    `report()` only reads the cached results, so health probes never wait on
+    a provider.
+
+    A provider is ready when its host resolves, a connection succeeds and
+    its credentials were not rejected; the instance is ready once at least
+    one configured provider is.
+    """
+
+    def __init__(
+        self,
+        providers: ProviderRegistry,
+        validate: bool,
+        warm_connections: int,
+        timeout: float,
+        interval: float,
+    ):
+        self.providers = providers
+        self.validate = validate
+        self.warm_connections = max(1, warm_connections)
+        self.timeout = timeout
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._results: Dict[str, Dict] = {}
+        self.checked_at: Optional[float] = None
+        self.started_at = time.time()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Provider readiness check failed")
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    async def check(self) -> Dict[str, Dict]:
+        services = self.providers.configured()
+        results = await asyncio.gather(*(self._check_provider(service) for service in services))
+        self._results = {service.name: result for service, result in zip(services, results)}
+        self.checked_at = time.time()
+        for name, result in self._results.items():
+            if not result["ready"]:
+                logger.warning("Provider %s is not ready: %s", name, result.get("error"))
+        return self._results
+
+    async def _check_provider(self, service: ProviderService) -> Dict:
+        result = {"ready": False, "base_url": service.base_url, "credentials": "unchecked"}
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._warm_up(service, result), self.timeout)
+        except asyncio.TimeoutError:
+            result["error"] = f"No answer within {self.timeout:.0f}s"
+        except Exception as exc:
+            result["error"] = f"{type(exc).__name__}: {exc}"
+        else:
+            result["ready"] = result["credentials"] != "rejected"
+        result["check_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    async def _warm_up(self, service: ProviderService, result: Dict) -> None:
+        parts = urlsplit(service.base_url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        started = time.perf_counter()
+        await asyncio.get_running_loop().getaddrinfo(parts.hostname, port)
+        result["dns_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        # Concurrent requests each open their own pooled keep-alive connection
+        await service.http.open()
+        client = service.http.client
+        started = time.perf_counter()
+        await asyncio.gather(*(client.head("/") for _ in range(self.warm_connections)))
+        result["connect_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        if self.validate and service.readiness_path:
+            started = time.perf_counter()
+            response = await client.get(service.readiness_path, headers=service.auth_headers)
+            result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            if response.status_code in (401, 403):
+                result["credentials"] = "rejected"
+                result["error"] = f"{service.label} rejected the credentials in {service.credential_env}"
+            elif response.status_code < 400:
+                result["credentials"] = "valid"
+            else:
+                raise RuntimeError(f"{service.readiness_path} returned HTTP {response.status_code}")
+
+    def ready(self) -> bool:
+        return any(result["ready"] for result in self._results.values())
+
+    def report(self) -> Dict:
+        providers: Dict[str, Dict] = dict(self._results)
+        for name, error in self.providers.unavailable().items():
+            providers[name] = {"ready": False, "configured": False, "error": error}
+        if self.checked_at is None:
+            status = "starting"
+        elif not self.ready():
+            status = "unavailable"
+        elif all(result["ready"] for result in self._results.values()):
+            status = "ready"
+        else:
+            status = "degraded"
+        return {
+            "status": status,
+            "checked_at": self.checked_at,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "providers": providers,
+        }
+
+    def gauge_values(self) -> Dict:
+        return {(name,): 1.0 if result["ready"] else 0.0 for name, result in self._results.items()}
+
+
+def create_readiness_checker(providers: ProviderRegistry) -> ReadinessChecker:
+    return ReadinessChecker(
+        providers,
+        validate=env_bool("READINESS_VALIDATE_CREDENTIALS", True),
+        warm_connections=env_int("READINESS_WARM_CONNECTIONS", 2),
+        timeout=env_float("READINESS_TIMEOUT", 10.0),
+        interval=env_float("READINESS_INTERVAL", 60.0),
+    )
+
+
+readiness_checker = create_readiness_checker(provider_registry)
+registry.gauge(
+    "i2v_provider_ready", "1 when the provider passed its last readiness check.", ("provider",),
+    callback=readiness_checker.gauge_values,
+)
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from services.settings import env_float, env_int
+from services.shared_state import SharedState, shared_state
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying for idempotent requests
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Failures that prove the request never reached the provider, so even a POST
+# (which would start a paid render) is safe to retry
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Unsent errors that are ours rather than the provider's (our connection pool is
+# exhausted), so they are retried but never count against the circuit
+LOCAL_ERRORS = (httpx.PoolTimeout,)
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    async def drain(self, seconds: float) -> None:
+        """Stop issuing tokens for `seconds`, e.g. after the provider answered 429."""
+        if self.rate > 0:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class SharedTokenBucket:
+    """TokenBucket kept in SharedState, so the limit holds across all worker processes."""
+
+    def __init__(self, state: SharedState, name: str, rate: float, capacity: float):
+        self.state = state
+        self.name = f"rate:{name}"
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            wait = await self.state.take_token(self.name, self.rate, self.capacity)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def drain(self, seconds: float) -> None:
+        if self.rate > 0:
+            await self.state.drain(self.name, self.rate, self.capacity, seconds)
+
+
+class CircuitOpenError(HTTPException):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{name} is temporarily unavailable (circuit open); retry in {retry_after:.0f}s",
+            headers={"Retry-After": str(max(1, int(retry_after)))},
+        )
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a provider is down.
+
+    Opens after `failure_threshold` consecutive failures, rejects calls for
+    `reset_timeout` seconds, then lets a single probe through (half-open);
+    the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def _probing(self) -> bool:
+        # A probe that never reported back (e.g. cancelled) must not hold the circuit forever
+        return self._probe_started is not None and time.monotonic() - self._probe_started < self.reset_timeout
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(self.name, max(remaining, 1.0))
+        if state == "half_open":
+            self._probe_started = time.monotonic()
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Circuit for %s closed", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.state == "closed" or self._probing:
+                logger.warning("Circuit for %s opened after %s failures", self.name, self.failures)
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After up to `max_retry_after`."""
+
+    def __init__(self, attempts: int, base_delay: float, max_delay: float, max_retry_after: float):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    @staticmethod
+    def retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+        value = response.headers.get("retry-after") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class ResiliencePolicy:
+    """Rate limiting, retries and circuit breaking around one provider's outbound calls."""
+
+    def __init__(self, name: str, bucket, breaker: CircuitBreaker, retry: RetryPolicy):
+        self.name = name
+        self.bucket = bucket
+        self.breaker = breaker
+        self.retry = retry
+        self.retries = 0
+
+    async def execute(self, send: Callable[[], Awaitable[httpx.Response]], idempotent: bool) -> httpx.Response:
+        """
+        Send a request, retrying when it is safe to do so.
+
+        Idempotent requests are retried on 429/5xx and transport errors. Others
+        (starting a render) are retried only on 429 and on errors raised before
+        the request was sent, so a retry can never create a duplicate job.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            with tracer.span("upstream.ratelimit"):
+                await self.bucket.acquire()
+            response = None
+            try:
+                response = await send()
+            except httpx.TransportError as exc:
+                if not isinstance(exc, LOCAL_ERRORS):
+                    self.breaker.record_failure()
+                retryable = idempotent or isinstance(exc, UNSENT_ERRORS)
+                if not retryable or attempt + 1 >= self.retry.attempts:
+                    raise
+                error = exc
+            else:
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                retryable = response.status_code == 429 or (
+                    idempotent and response.status_code in RETRYABLE_STATUSES
+                )
+                if not retryable or attempt + 1 >= self.retry.attempts:
+                    return response
+                error = f"HTTP {response.status_code}"
+
+            delay = self.retry.delay(attempt, response)
+            if response is not None and response.status_code == 429:
+                await self.bucket.drain(delay)
+            self.retries += 1
+            logger.info(
+                "Retrying %s request in %.2fs (attempt %s/%s): %s",
+                self.name, delay, attempt + 2, self.retry.attempts, error,
+            )
+            with tracer.span("upstream.backoff"):
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retries": self.retries,
+        }
+
+
+def create_resilience_policy(name: str) -> ResiliencePolicy:
+    prefix = name.upper()
+    rate = env_float(f"{prefix}_RATE_LIMIT", 10.0)
+    capacity = env_float(f"{prefix}_RATE_BURST", 20.0)
+    if shared_state.name == "memory":
+        bucket = TokenBucket(rate, capacity)
+    else:
+        bucket = SharedTokenBucket(shared_state, name, rate, capacity)
+    return ResiliencePolicy(
+        name,
+        bucket,
+        CircuitBreaker(
+            name,
+            failure_threshold=env_int("CIRCUIT_FAILURE_THRESHOLD", 5),
+            reset_timeout=env_float("CIRCUIT_RESET_TIMEOUT", 30.0),
+        ),
+        RetryPolicy(
+            attempts=env_int("HTTP_RETRY_ATTEMPTS", 3),
+            base_delay=env_float("HTTP_RETRY_BASE_DELAY", 0.5),
+            max_delay=env_float("HTTP_RETRY_MAX_DELAY", 10.0),
+            max_retry_after=env_float("HTTP_RETRY_MAX_RETRY_AFTER", 30.0),
+        ),
+    )
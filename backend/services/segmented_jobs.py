@@ -0,0 +1,384 @@
+import asyncio
+import logging
+import os
+import re
+import shutil
+import tempfile
+import textwrap
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from services.settings import DATA_DIR, env_float, env_int
+from services.shared_state import SharedState
+from services.status_cache import TERMINAL_STATUSES
+from services.status_poller import StatusPoller
+from services.tracing import start_detached
+from services.video_mirror import VideoMirror
+
+logger = logging.getLogger(__name__)
+
+StatusFetcher = Callable[[str, str], Awaitable[Dict]]
+
+# Stitch lease beyond the ffmpeg timeout, for downloading the segments first
+STITCH_LEASE_MARGIN = 600.0
+
+# Whitespace after sentence-ending punctuation (including CJK full stops)
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…。！？])\s+")
+
+
+def split_script(text: str, max_chars: int) -> List[str]:
+    """
+    Split a script into segments of at most `max_chars`, breaking between
+    sentences. Consecutive sentences share a segment while they fit; a single
+    sentence longer than `max_chars` is broken between words.
+    """
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    segments: List[str] = []
+    current = ""
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        for piece in textwrap.wrap(sentence, max_chars) if len(sentence) > max_chars else [sentence]:
+            if current and len(current) + 1 + len(piece) > max_chars:
+                segments.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        segments.append(current)
+    return segments
+
+
+class SegmentedJobs:
+    """
+    Long scripts rendered as several provider jobs and stitched into one video.
+
+    Each logical job is a record in shared state listing its segments' task
+    ids, so any worker can report on it; reports read segment statuses
+    through `fetch` (the status cache). The worker that created a job also
+    watches it by subscribing to the status poller's events for its
+    segments, so it is stitched without anyone polling it and without
+    upstream calls beyond the poller's own. Once every segment has
+    completed, the segment videos are fetched (through the video mirror when
+    it is enabled) and joined with ffmpeg's concat demuxer using stream copy,
+    without re-encoding; this works because all segments come from the same
+    provider and settings. A lease per job in shared state makes sure only
+    one worker stitches it and writes the result to its record. Stitched
+    videos are written to `directory` and removed after `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        state: SharedState,
+        fetch: StatusFetcher,
+        poller: StatusPoller,
+        mirror: VideoMirror,
+        directory: str,
+        ffmpeg: Optional[str],
+        ttl: float,
+        stitch_timeout: float,
+        max_segments: int,
+    ):
+        self.state = state
+        self.fetch = fetch
+        self.poller = poller
+        self.mirror = mirror
+        self.directory = directory
+        self.ffmpeg = ffmpeg
+        self.ttl = ttl
+        self.stitch_timeout = stitch_timeout
+        self.max_segments = max_segments
+        self._stitches: Dict[str, asyncio.Task] = {}
+        self._watchers: Dict[str, asyncio.Task] = {}
+        self.owner = uuid.uuid4().hex
+        self.stitched = 0
+        self.stitch_failures = 0
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"segmented:{job_id}"
+
+    @staticmethod
+    def video_path(job_id: str) -> str:
+        """Public path (under the API) the stitched video is served from."""
+        return f"/api/segmented/{job_id}/video"
+
+    def file_for(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.mp4")
+
+    def plan(self, text: str, max_chars: int) -> List[str]:
+        """Segments for a script, or 400 when it needs more than `max_segments`."""
+        if not self.ffmpeg:
+            raise HTTPException(
+                status_code=500,
+                detail="Segmented rendering needs ffmpeg. Install it or set FFMPEG_BINARY",
+            )
+        segments = split_script(text, max_chars)
+        if len(segments) > self.max_segments:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Script needs {len(segments)} segments of up to {max_chars} characters "
+                       f"(max {self.max_segments})",
+            )
+        return segments
+
+    @staticmethod
+    def _new_job(provider: str, image_url: str, task_ids: List[Optional[str]]) -> Dict:
+        return {
+            "job_id": uuid.uuid4().hex,
+            "provider": provider,
+            "image_url": image_url,
+            "task_ids": task_ids,
+            "created_at": time.time(),
+        }
+
+    async def create(self, provider: str, image_url: str, started: List[Dict]) -> Dict:
+        """Record a logical job for started segments (in script order) and start watching it."""
+        job = self._new_job(provider, image_url, [result["task_id"] for result in started])
+        await self.state.set(self._key(job["job_id"]), job, self.ttl)
+        self._watch(job)
+        return await self._report(job, started)
+
+    async def record_failed_start(self, provider: str, image_url: str, task_ids: List[Optional[str]],
+                                  error: str) -> str:
+        """
+        Record a job whose segments did not all start (None in `task_ids`) as
+        failed, so the segments that did start, and are billed, can still be
+        looked up. Returns its job id.
+        """
+        job = self._new_job(provider, image_url, task_ids)
+        job["start_error"] = error
+        await self.state.set(self._key(job["job_id"]), job, self.ttl)
+        return job["job_id"]
+
+    async def get(self, job_id: str) -> Dict:
+        job = await self.state.get(self._key(job_id))
+        if job is None:
+            raise HTTPException(status_code=404, detail="Segmented job not found")
+        statuses = await asyncio.gather(*(self._segment_status(job, task_id) for task_id in job["task_ids"]))
+        return await self._report(job, statuses)
+
+    async def _segment_status(self, job: Dict, task_id: Optional[str]) -> Dict:
+        if task_id is None:
+            return {"status": "failed", "failed_message": "Segment failed to start"}
+        try:
+            return await self.fetch(job["provider"], task_id)
+        except HTTPException as exc:
+            return {"status": "unknown", "error": exc.detail}
+        except Exception as exc:
+            return {"status": "unknown", "error": str(exc)}
+
+    async def _report(self, job: Dict, statuses: List[Dict]) -> Dict:
+        segments = []
+        for index, (task_id, status) in enumerate(zip(job["task_ids"], statuses)):
+            segment = {"index": index, "task_id": task_id, "status": status.get("status")}
+            for field in ("result_url", "failed_message", "error"):
+                if status.get(field):
+                    segment[field] = status[field]
+            segments.append(segment)
+        completed = sum(1 for segment in segments if segment["status"] == "completed")
+        report = {
+            "job_id": job["job_id"],
+            "provider": job["provider"],
+            "segments": segments,
+            "completed_segments": completed,
+            "total_segments": len(segments),
+        }
+
+        if job.get("start_error"):
+            report.update(status="failed", failed_message=job["start_error"])
+        elif any(segment["status"] == "failed" for segment in segments):
+            report.update(status="failed", failed_message="A segment failed to render")
+        elif job.get("stitch_error"):
+            report.update(status="failed", failed_message=job["stitch_error"])
+        elif job.get("stitched") and await run_in_threadpool(os.path.exists, self.file_for(job["job_id"])):
+            report.update(status="completed", result_url=self.video_path(job["job_id"]))
+        elif completed == len(segments):
+            self._stitch(job, segments)
+            report["status"] = "stitching"
+        else:
+            report["status"] = "processing"
+        return report
+
+    def _watch(self, job: Dict) -> None:
+        """Follow a job in the background so it is stitched without anyone polling it."""
+
+        async def run() -> None:
+            # Subscribed all at once, so events of segments finishing early wait in their queues
+            queues = [(task_id, self.poller.subscribe(job["provider"], task_id)) for task_id in job["task_ids"]]
+            try:
+                statuses = await asyncio.wait_for(self._final_statuses(queues), self.poller.max_age)
+            except asyncio.TimeoutError:
+                return
+            finally:
+                for task_id, queue in queues:
+                    self.poller.unsubscribe(job["provider"], task_id, queue)
+            if statuses is None:
+                return
+            latest = await self.state.get(self._key(job["job_id"]))
+            if latest is None:
+                return
+            await self._report(latest, statuses)
+            stitch = self._stitches.get(job["job_id"])
+            if stitch is not None:
+                await asyncio.shield(stitch)
+
+        task = start_detached(run())
+        self._watchers[job["job_id"]] = task
+        task.add_done_callback(lambda _: self._watchers.pop(job["job_id"], None))
+
+    async def _final_statuses(self, queues: List) -> Optional[List[Dict]]:
+        """Wait for every segment's terminal status; None once the poller gives up on one or one fails."""
+        statuses = []
+        for _, queue in queues:
+            while True:
+                event, payload = await queue.get()
+                if event == "error" and payload["failures"] >= self.poller.max_failures:
+                    return None
+                if event == "status" and payload.get("status") in TERMINAL_STATUSES:
+                    break
+            if payload["status"] != "completed":
+                return None
+            statuses.append(payload)
+        return statuses
+
+    def _stitch(self, job: Dict, segments: List[Dict]) -> None:
+        """Start stitching a job unless this worker already is (`_run_stitch` guards against other workers)."""
+        if job["job_id"] in self._stitches:
+            return
+        task = start_detached(self._run_stitch(job, [segment["result_url"] for segment in segments]))
+        self._stitches[job["job_id"]] = task
+        task.add_done_callback(lambda _: self._stitches.pop(job["job_id"], None))
+
+    async def _run_stitch(self, job: Dict, result_urls: List[str]) -> None:
+        """Stitch a job unless another worker holds its stitch lease or already stitched it."""
+        lease = f"segmented-stitch:{job['job_id']}"
+        if not await self.state.acquire_lease(lease, self.owner, self.stitch_timeout + STITCH_LEASE_MARGIN):
+            return
+        try:
+            # Reread under the lease: the record may have been written by the worker that held it before
+            latest = await self.state.get(self._key(job["job_id"]))
+            if latest is None or latest.get("stitch_error"):
+                return
+            if latest.get("stitched") and await run_in_threadpool(os.path.exists, self.file_for(job["job_id"])):
+                return
+            await self._stitch_locked(latest, result_urls)
+        finally:
+            await self.state.release_lease(lease, self.owner)
+
+    async def _stitch_locked(self, job: Dict, result_urls: List[str]) -> None:
+        started = time.monotonic()
+        try:
+            await run_in_threadpool(os.makedirs, self.directory, exist_ok=True)
+            work_dir = await run_in_threadpool(tempfile.mkdtemp, dir=self.directory)
+            try:
+                paths = [
+                    await self._segment_file(job["provider"], task_id, url, work_dir)
+                    for task_id, url in zip(job["task_ids"], result_urls)
+                ]
+                await self._concat(paths, work_dir, self.file_for(job["job_id"]))
+            finally:
+                await run_in_threadpool(shutil.rmtree, work_dir, True)
+        except Exception as exc:
+            self.stitch_failures += 1
+            logger.warning("Could not stitch segmented job %s: %s", job["job_id"], exc)
+            job["stitch_error"] = f"Could not stitch segments: {exc}"
+        else:
+            self.stitched += 1
+            logger.info(
+                "Stitched %s segments of job %s in %.1fs",
+                len(result_urls), job["job_id"], time.monotonic() - started,
+            )
+            job["stitched"] = True
+        remaining = job["created_at"] + self.ttl - time.time()
+        if remaining > 0:
+            await self.state.set(self._key(job["job_id"]), job, remaining)
+        await run_in_threadpool(self._remove_expired)
+
+    async def _segment_file(self, provider: str, task_id: str, result_url: str, work_dir: str) -> str:
+        if not result_url:
+            raise RuntimeError(f"segment {task_id} has no result_url")
+        if self.mirror.enabled:
+            return await self.mirror.ensure(provider, task_id, result_url)
+        path = os.path.join(work_dir, f"{task_id}.mp4")
+        handle = await run_in_threadpool(open, path, "wb")
+        try:
+            async with self.mirror.client.stream("GET", result_url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(self.mirror.chunk_size):
+                    await run_in_threadpool(handle.write, chunk)
+        finally:
+            await run_in_threadpool(handle.close)
+        return path
+
+    async def _concat(self, paths: List[str], work_dir: str, output: str) -> None:
+        list_path = os.path.join(work_dir, "segments.txt")
+        await run_in_threadpool(self._write_concat_list, list_path, paths)
+
+        part_path = os.path.join(work_dir, "stitched.mp4")
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", "-movflags", "+faststart", "-f", "mp4", part_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), self.stitch_timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise RuntimeError(f"ffmpeg took longer than {self.stitch_timeout:.0f}s")
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {process.returncode}: {stderr.decode(errors='replace')[-500:]}")
+        await run_in_threadpool(os.replace, part_path, output)
+
+    @staticmethod
+    def _write_concat_list(list_path: str, paths: List[str]) -> None:
+        with open(list_path, "w") as handle:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                handle.write(f"file '{escaped}'\n")
+
+    def _remove_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    async def aclose(self) -> None:
+        for task in list(self._watchers.values()) + list(self._stitches.values()):
+            task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "ffmpeg": self.ffmpeg,
+            "watching": len(self._watchers),
+            "stitching": len(self._stitches),
+            "stitched": self.stitched,
+            "stitch_failures": self.stitch_failures,
+        }
+
+
+def create_segmented_jobs(
+    state: SharedState, fetch: StatusFetcher, poller: StatusPoller, mirror: VideoMirror
+) -> SegmentedJobs:
+    return SegmentedJobs(
+        state,
+        fetch,
+        poller,
+        mirror,
+        directory=os.getenv("STITCHED_VIDEO_DIR") or os.path.join(DATA_DIR, "stitched"),
+        ffmpeg=os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg"),
+        ttl=env_float("SEGMENTED_JOB_TTL", 86400.0),
+        stitch_timeout=env_float("SEGMENT_STITCH_TIMEOUT", 300.0),
+        max_segments=env_int("SEGMENT_MAX_COUNT", 10),
+    )
@@ -0,0 +1,26 @@
+import os
+
+
+def env_int(name: str, fallback: int) -> int:
+    try:
+        return int(os.getenv(name, fallback))
+    except (TypeError, ValueError):
+        return fallback
+
+
+def env_float(name: str, fallback: float) -> float:
+    try:
+        return float(os.getenv(name, fallback))
+    except (TypeError, ValueError):
+        return fallback
+
+
+def env_bool(name: str, fallback: bool = False) -> bool:
+    value = (os.getenv(name) or "").strip().lower()
+    if not value:
+        return fallback
+    return value in ("1", "true", "yes", "on")
+
+
+# Directory for local state (SQLite databases); kept out of version control
+DATA_DIR = os.getenv("DATA_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
@@ -0,0 +1,302 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from services.codecs import json_dumps, json_loads
+from services.settings import DATA_DIR, env_int
+
+
+class SharedState:
+    """
+    State shared by every worker process: JSON values with a TTL,
+    token-bucket rate limiters and leases (expiring locks held by one owner).
+
+    The memory backend keeps the single-process behaviour; the SQLite (WAL)
+    and Redis backends let several uvicorn workers share caches, rate limits
+    and idempotency records.
+    """
+
+    name = ""
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def take_token(self, bucket: str, rate: float, capacity: float) -> float:
+        """Take one token; return 0 on success, else seconds until one is available."""
+        raise NotImplementedError
+
+    async def drain(self, bucket: str, rate: float, capacity: float, seconds: float) -> None:
+        """Withhold tokens for `seconds`, e.g. after the provider answered 429."""
+        raise NotImplementedError
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the lease `name` for `ttl` seconds; False while another owner holds it."""
+        raise NotImplementedError
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        """Give up a lease, if `owner` still holds it."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemorySharedState(SharedState):
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._values: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._values[key]
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._values[key] = (time.time() + ttl, value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+    async def take_token(self, bucket: str, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(bucket, (capacity, now))
+        tokens = _refill(tokens, updated, now, rate, capacity)
+        if tokens >= 1:
+            self._buckets[bucket] = (tokens - 1, now)
+            return 0.0
+        self._buckets[bucket] = (tokens, now)
+        return (1 - tokens) / rate
+
+    async def drain(self, bucket: str, rate: float, capacity: float, seconds: float) -> None:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(bucket, (capacity, now))
+        self._buckets[bucket] = (min(_refill(tokens, updated, now, rate, capacity), -seconds * rate), now)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        holder = self._leases.get(name)
+        if holder is not None and holder[0] != owner and holder[1] >= now:
+            return False
+        self._leases[name] = (owner, now + ttl)
+        return True
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        holder = self._leases.get(name)
+        if holder is not None and holder[0] == owner:
+            del self._leases[name]
+
+
+class SQLiteSharedState(SharedState):
+    """Shared state in a local SQLite file in WAL mode; for workers on one host."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        self._writes = 0
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return json_loads(row[0]) if row else None
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json_dumps(value).decode(), now + ttl),
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._conn.execute("DELETE FROM kv WHERE expires_at < ?", (now,))
+
+    def _update_bucket(self, bucket: str, rate: float, capacity: float, drain: Optional[float]) -> float:
+        # Wall-clock time, since monotonic clocks are not comparable across processes
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (bucket,)).fetchone()
+                tokens = _refill(row[0], row[1], now, rate, capacity) if row else capacity
+                if drain is not None:
+                    tokens, wait = min(tokens, -drain * rate), 0.0
+                elif tokens >= 1:
+                    tokens, wait = tokens - 1, 0.0
+                else:
+                    wait = (1 - tokens) / rate
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (bucket, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def _acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # One statement, so taking a free or expired lease is atomic across processes
+            cursor = self._conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (name, owner, now + ttl, now),
+            )
+            return cursor.rowcount > 0
+
+    def _release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await run_in_threadpool(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await run_in_threadpool(self._set, key, value, ttl)
+
+    async def take_token(self, bucket: str, rate: float, capacity: float) -> float:
+        return await run_in_threadpool(self._update_bucket, bucket, rate, capacity, None)
+
+    async def drain(self, bucket: str, rate: float, capacity: float, seconds: float) -> None:
+        await run_in_threadpool(self._update_bucket, bucket, rate, capacity, seconds)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return await run_in_threadpool(self._acquire_lease, name, owner, ttl)
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        await run_in_threadpool(self._release_lease, name, owner)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSharedState(SharedState):
+    """Shared state in Redis or a Redis-compatible server (Valkey, KeyDB); works across hosts."""
+
+    name = "redis"
+
+    # Refill and take (or drain) atomically; returns the wait in seconds as a string
+    BUCKET_SCRIPT = """
+    local rate, capacity, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = capacity
+    if state[1] then
+        tokens = math.min(capacity, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+    end
+    local wait = 0
+    if ARGV[4] ~= '' then
+        tokens = math.min(tokens, -tonumber(ARGV[4]) * rate)
+    elseif tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], 3600)
+    return tostring(wait)
+    """
+
+    # Takes the lease when it is free or already ours, renewing its expiry
+    LEASE_SCRIPT = """
+    local holder = redis.call('GET', KEYS[1])
+    if holder and holder ~= ARGV[1] then return 0 end
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then redis.call('DEL', KEYS[1]) end
+    return 1
+    """
+
+    def __init__(self, url: str, prefix: str = "i2v"):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("SHARED_STATE=redis requires the 'redis' package (pip install redis)")
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._bucket = self._redis.register_script(self.BUCKET_SCRIPT)
+        self._lease = self._redis.register_script(self.LEASE_SCRIPT)
+        self._release = self._redis.register_script(self.RELEASE_SCRIPT)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._redis.get(f"{self.prefix}:kv:{key}")
+        return json_loads(raw) if raw else None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._redis.set(f"{self.prefix}:kv:{key}", json_dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def _run_bucket(self, bucket: str, rate: float, capacity: float, drain: str) -> float:
+        keys = [f"{self.prefix}:bucket:{bucket}"]
+        return float(await self._bucket(keys=keys, args=[rate, capacity, time.time(), drain]))
+
+    async def take_token(self, bucket: str, rate: float, capacity: float) -> float:
+        return await self._run_bucket(bucket, rate, capacity, "")
+
+    async def drain(self, bucket: str, rate: float, capacity: float, seconds: float) -> None:
+        await self._run_bucket(bucket, rate, capacity, str(seconds))
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        keys = [f"{self.prefix}:lease:{name}"]
+        return bool(await self._lease(keys=keys, args=[owner, max(1, int(ttl * 1000))]))
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        await self._release(keys=[f"{self.prefix}:lease:{name}"], args=[owner])
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_shared_state() -> SharedState:
+    backend = (os.getenv("SHARED_STATE") or "memory").strip().lower()
+    if backend == "sqlite":
+        return SQLiteSharedState(os.getenv("SHARED_STATE_PATH") or os.path.join(DATA_DIR, "shared.sqlite3"))
+    if backend == "redis":
+        return RedisSharedState(os.getenv("SHARED_STATE_REDIS_URL") or "redis://localhost:6379/0")
+    if backend == "memory":
+        return MemorySharedState(env_int("SHARED_STATE_MAX_ENTRIES", 10000))
+    raise RuntimeError(f"Unsupported SHARED_STATE: {backend}. Use 'memory', 'sqlite' or 'redis'")
+
+
+shared_state = create_shared_state()
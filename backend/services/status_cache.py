@@ -0,0 +1,148 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from services.settings import env_float, env_int
+from services.shared_state import SharedState, shared_state
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+# How long finished results stay in the shared state for other workers
+SHARED_TERMINAL_TTL = 86400.0
+
+CacheKey = Tuple[str, str]
+Loader = Callable[[], Awaitable[Dict]]
+
+
+class StatusCache:
+    """
+    In-process cache for task status lookups keyed by (provider, task_id).
+
+    - Non-terminal results are served for `ttl` seconds (callers may pass a
+      longer ttl, e.g. for jobs whose updates arrive by webhook).
+    - Terminal results (completed/failed) never expire, only LRU-evicted.
+    - Concurrent lookups for the same key share one upstream request.
+    - With a `shared` state, misses are looked up there before going
+      upstream, so one worker's result serves every worker.
+    Errors are never cached; they propagate to every coalesced caller.
+    """
+
+    def __init__(self, ttl: float = 2.0, max_entries: int = 10000, shared: Optional[SharedState] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def is_terminal(result: Dict) -> bool:
+        return result.get("status") in TERMINAL_STATUSES
+
+    def peek(self, key: CacheKey):
+        """Return a fresh cached result for key, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    async def latest(self, key: CacheKey) -> Optional[Dict]:
+        """Last known result here or from another worker, without an upstream lookup."""
+        result = self.peek(key)
+        if result is None and self.shared is not None:
+            result = await self.shared.get(self._shared_key(key))
+        return result
+
+    def put(self, key: CacheKey, result: Dict, ttl: Optional[float] = None) -> None:
+        expires_at = 0.0 if self.is_terminal(result) else time.monotonic() + (ttl or self.ttl)
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _shared_key(self, key: CacheKey) -> str:
+        return f"status:{key[0]}:{key[1]}"
+
+    async def _share(self, key: CacheKey, result: Dict, ttl: Optional[float]) -> None:
+        if self.shared is not None:
+            shared_ttl = SHARED_TERMINAL_TTL if self.is_terminal(result) else (ttl or self.ttl)
+            await self.shared.set(self._shared_key(key), result, shared_ttl)
+
+    async def publish(self, key: CacheKey, result: Dict, ttl: Optional[float] = None) -> None:
+        """Store a result obtained without a lookup (webhook, start) here and for other workers."""
+        self.put(key, result, ttl)
+        await self._share(key, result, ttl)
+
+    async def _load(self, key: CacheKey, loader: Loader, ttl: Optional[float]) -> Dict:
+        if self.shared is not None:
+            result = await self.shared.get(self._shared_key(key))
+            if result is not None:
+                return result
+        result = await loader()
+        await self._share(key, result, ttl)
+        return result
+
+    async def get(self, key: CacheKey, loader: Loader, ttl: Optional[float] = None) -> Dict:
+        cached = self.peek(key)
+        if cached is not None:
+            self.hits += 1
+            return dict(cached)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return dict(await asyncio.shield(pending))
+            except asyncio.CancelledError:
+                # The leader was cancelled (client went away); retry unless we were too
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.get(key, loader, ttl)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._load(key, loader, ttl)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an exception with no waiters is not logged as unhandled
+            future.exception()
+            raise
+        else:
+            self.put(key, result, ttl)
+            future.set_result(result)
+            return dict(result)
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+        }
+
+
+status_cache = StatusCache(
+    ttl=env_float("STATUS_CACHE_TTL", 2.0),
+    max_entries=env_int("STATUS_CACHE_MAX_ENTRIES", 10000),
+    shared=None if shared_state.name == "memory" else shared_state,
+)
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from services.settings import env_float, env_int
+from services.status_cache import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+TaskKey = Tuple[str, str]
+StatusFetcher = Callable[[str, str], Awaitable[Dict]]
+
+
+class TrackedTask:
+    __slots__ = (
+        "provider", "task_id", "base_interval", "interval", "next_poll", "tracked_at", "last_result", "failures",
+    )
+
+    def __init__(self, provider: str, task_id: str, interval: float):
+        self.provider = provider
+        self.task_id = task_id
+        self.base_interval = interval
+        self.interval = interval
+        self.next_poll = time.monotonic()
+        self.tracked_at = time.monotonic()
+        self.last_result: Optional[Dict] = None
+        self.failures = 0
+
+
+class StatusPoller:
+    """
+    Background scheduler that polls in-flight tasks and pushes status changes.
+
+    Each tracked task is polled on an adaptive schedule: the interval starts at
+    `initial_interval`, grows by `backoff` after every unchanged poll up to
+    `max_interval`, and resets when the status changes. Subscribers receive
+    ("status", result) events on change and ("error", detail) events on
+    upstream failures; tasks stop being tracked once they reach a terminal
+    state, exceed `max_age` seconds, or fail `max_failures` polls in a row.
+
+    Results pushed by provider webhooks go through `publish`; tasks tracked
+    with a longer `interval` are then only polled as a fallback.
+    """
+
+    def __init__(
+        self,
+        fetch: StatusFetcher,
+        initial_interval: float = 2.0,
+        max_interval: float = 15.0,
+        backoff: float = 1.5,
+        max_age: float = 7200.0,
+        max_failures: int = 5,
+        concurrency: int = 10,
+    ):
+        self._fetch = fetch
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_age = max_age
+        self.max_failures = max_failures
+        self.concurrency = concurrency
+        self._tasks: Dict[TaskKey, TrackedTask] = {}
+        self._subscribers: Dict[TaskKey, Set[asyncio.Queue]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._polls: Set[asyncio.Task] = set()
+
+    def track(self, provider: str, task_id: str, initial: Optional[Dict] = None,
+              interval: Optional[float] = None) -> None:
+        """Start polling a task unless it is already tracked or finished."""
+        if not task_id:
+            return
+        key = (provider, task_id)
+        if key in self._tasks:
+            return
+        if initial and initial.get("status") in TERMINAL_STATUSES:
+            return
+        task = TrackedTask(provider, task_id, interval or self.initial_interval)
+        task.last_result = initial
+        if initial is not None:
+            task.next_poll = time.monotonic() + task.interval
+        self._tasks[key] = task
+        self._wake()
+
+    def tracking(self, provider: str, task_id: str) -> bool:
+        return (provider, task_id) in self._tasks
+
+    def subscriber_count(self, provider: str, task_id: str) -> int:
+        return len(self._subscribers.get((provider, task_id), ()))
+
+    def subscribe(self, provider: str, task_id: str) -> asyncio.Queue:
+        key = (provider, task_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(key, set()).add(queue)
+        task = self._tasks.get(key)
+        if task is None:
+            self.track(provider, task_id)
+        elif task.last_result is not None:
+            queue.put_nowait(("status", task.last_result))
+        return queue
+
+    def unsubscribe(self, provider: str, task_id: str, queue: asyncio.Queue) -> None:
+        key = (provider, task_id)
+        queues = self._subscribers.get(key)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[key]
+
+    def _emit(self, key: TaskKey, event: str, payload) -> None:
+        for queue in self._subscribers.get(key, ()):
+            queue.put_nowait((event, payload))
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._runner is None:
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        polls = list(self._polls)
+        for poll in polls:
+            poll.cancel()
+        # Let cancelled polls unwind before the HTTP clients they use are closed
+        await asyncio.gather(*polls, return_exceptions=True)
+
+    async def _run(self) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def poll_one(task: TrackedTask) -> None:
+            async with semaphore:
+                await self._poll(task)
+
+        while True:
+            now = time.monotonic()
+            for task in list(self._tasks.values()):
+                if task.next_poll <= now:
+                    # Parked until the poll finishes so a slow upstream is not polled twice
+                    task.next_poll = float("inf")
+                    poll = asyncio.create_task(poll_one(task))
+                    self._polls.add(poll)
+                    poll.add_done_callback(self._polls.discard)
+
+            self._wakeup.clear()
+            next_due = min((task.next_poll for task in self._tasks.values()), default=float("inf"))
+            timeout = None if next_due == float("inf") else max(0.0, next_due - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, task: TrackedTask) -> None:
+        key = (task.provider, task.task_id)
+        if time.monotonic() - task.tracked_at > self.max_age:
+            logger.info("Stopped tracking %s task %s after max age", task.provider, task.task_id)
+            self._drop(key)
+            return
+
+        try:
+            result = await self._fetch(task.provider, task.task_id)
+        except Exception as exc:
+            task.failures += 1
+            detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+            logger.warning(
+                "Status poll failed for %s task %s (%s/%s): %s",
+                task.provider, task.task_id, task.failures, self.max_failures, detail,
+            )
+            self._emit(key, "error", {"detail": detail, "failures": task.failures})
+            if task.failures >= self.max_failures:
+                self._drop(key)
+            else:
+                task.interval = min(task.interval * self.backoff, max(self.max_interval, task.base_interval))
+                task.next_poll = time.monotonic() + task.interval
+                self._wake()
+            return
+
+        if self._tasks.get(key) is not task:
+            # Finished by a webhook while this poll was in flight
+            return
+        task.failures = 0
+        self._apply(task, result)
+
+    def publish(self, provider: str, task_id: str, result: Dict) -> None:
+        """Apply a status that arrived without polling, e.g. from a provider webhook."""
+        key = (provider, task_id)
+        task = self._tasks.get(key)
+        if task is not None:
+            polling = task.next_poll == float("inf")
+            self._apply(task, result)
+            if polling and key in self._tasks:
+                # Keep it parked; the poll in flight reschedules it when it finishes
+                task.next_poll = float("inf")
+            return
+        self._emit(key, "status", result)
+        if result.get("status") in TERMINAL_STATUSES:
+            self._emit(key, "end", None)
+
+    def _apply(self, task: TrackedTask, result: Dict) -> None:
+        key = (task.provider, task.task_id)
+        changed = task.last_result is None or task.last_result.get("status") != result.get("status")
+        task.last_result = result
+        if changed:
+            self._emit(key, "status", result)
+            task.interval = task.base_interval
+        else:
+            task.interval = min(task.interval * self.backoff, max(self.max_interval, task.base_interval))
+        task.next_poll = time.monotonic() + task.interval
+        self._wake()
+
+        if result.get("status") in TERMINAL_STATUSES:
+            self._drop(key)
+
+    def _drop(self, key: TaskKey) -> None:
+        self._tasks.pop(key, None)
+        self._emit(key, "end", None)
+
+    def stats(self) -> Dict:
+        return {
+            "tracked": len(self._tasks),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+        }
+
+
+def create_status_poller(fetch: StatusFetcher) -> StatusPoller:
+    return StatusPoller(
+        fetch,
+        initial_interval=env_float("STATUS_POLL_INITIAL_INTERVAL", 2.0),
+        max_interval=env_float("STATUS_POLL_MAX_INTERVAL", 15.0),
+        backoff=env_float("STATUS_POLL_BACKOFF", 1.5),
+        max_age=env_float("STATUS_POLL_MAX_AGE", 7200.0),
+        max_failures=env_int("STATUS_POLL_MAX_FAILURES", 5),
+        concurrency=env_int("STATUS_POLL_CONCURRENCY", 10),
+    )
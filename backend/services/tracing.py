@@ -0,0 +1,369 @@
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Coroutine, Dict, Iterator, Optional, TextIO
+
+from services.settings import DATA_DIR, env_bool, env_float
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+# httpcore trace events (without their "http11."/"connection." prefix) -> phase of an upstream call
+HTTP_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "send_request_headers": "send",
+    "send_request_body": "send",
+    "receive_response_headers": "wait",
+    "receive_response_body": "receive",
+}
+
+
+class Trace:
+    """Spans of one request (or one incoming trace), plus per-name durations for Server-Timing."""
+
+    __slots__ = ("trace_id", "sampled", "timings")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.timings: Dict[str, float] = {}
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], kind: int = KIND_INTERNAL,
+                 start_ns: Optional[int] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = random.getrandbits(64).to_bytes(8, "big").hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple]:
+    """(trace_id, parent span id, sampled) from a W3C traceparent header, or None if invalid."""
+    parts = (header or "").strip().lower().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class SpanExporter:
+    """
+    Writes finished spans as OTLP/JSON lines (one `resourceSpans` document per
+    batch), the format the OpenTelemetry Collector's file exporter writes and
+    its otlpjsonfile receiver reads. Spans are queued and written by a
+    background thread so request handlers never wait on the stream.
+    """
+
+    def __init__(self, stream: TextIO, service_name: str, max_pending: int = 10000, batch_size: int = 512):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.resource = {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]}
+        self._pending: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._writer: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+            self._writer.start()
+
+    def stop(self) -> None:
+        """Flush queued spans and stop the writer thread."""
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join(timeout=10)
+            self._writer = None
+
+    def export(self, span: Span) -> None:
+        try:
+            self._pending.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self) -> None:
+        # Imported here: codecs is imported by modules this one instruments
+        from services.codecs import json_dumps
+
+        stopping = False
+        while not stopping:
+            batch = [self._pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [span for span in batch if span is not None]
+            if not batch:
+                continue
+            document = {
+                "resourceSpans": [{
+                    "resource": self.resource,
+                    "scopeSpans": [{"scope": {"name": "image2video"}, "spans": [span.to_otlp() for span in batch]}],
+                }]
+            }
+            try:
+                self.stream.write(json_dumps(document).decode() + "\n")
+                self.stream.flush()
+            except (OSError, ValueError) as exc:
+                logger.error("Writing %s spans failed: %s", len(batch), exc)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("i2v_current_span", default=None)
+
+
+class Tracer:
+    """
+    Minimal OpenTelemetry-compatible tracer.
+
+    Spans are opened with `span()` inside a request's root span (see
+    TracingMiddleware) and nest through a context variable, so concurrent
+    requests and tasks started from a request keep their own parents. Work
+    outside a request (status poller, janitor) is not traced, nor is work a
+    request leaves running in the background (see `start_detached`). Every
+    span's duration feeds the request's Server-Timing header; spans of
+    sampled traces are also handed to the exporter, when one is configured.
+    """
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_ratio: float = 1.0):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+    def start_request(self, name: str, traceparent: Optional[str], attributes: Dict[str, Any]) -> Span:
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id = random.getrandbits(128).to_bytes(16, "big").hex()
+            parent_id, sampled = None, random.random() < self.sample_ratio
+        return Span(Trace(trace_id, sampled), name, parent_id, KIND_SERVER, attributes=attributes)
+
+    def finish(self, span: Span, end_ns: Optional[int] = None) -> None:
+        span.end_ns = end_ns or time.time_ns()
+        timings = span.trace.timings
+        timings[span.name] = timings.get(span.name, 0.0) + (span.end_ns - span.start_ns) / 1e6
+        if self.exporter is not None and span.trace.sampled:
+            self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Time a block as a child of the current span; a no-op outside a request."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, parent.span_id, kind, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, **attributes: Any) -> None:
+        """Add an already finished child span (e.g. from httpx trace events) to the current span."""
+        parent = _current_span.get()
+        if parent is not None:
+            self.finish(Span(parent.trace, name, parent.span_id, start_ns=start_ns, attributes=attributes), end_ns)
+
+    def http_trace_hook(self, prefix: str):
+        """
+        httpx `trace` extension recording connect/TLS/send/wait/receive phases
+        of one upstream call as `<prefix>.<phase>` spans; None outside a request.
+        """
+        if _current_span.get() is None:
+            return None
+        started: Dict[str, int] = {}
+
+        async def hook(event: str, info: Dict) -> None:
+            step, _, stage = event.partition(".")[2].rpartition(".")
+            phase = HTTP_PHASES.get(step)
+            if phase is None:
+                return
+            if stage == "started":
+                started[step] = time.time_ns()
+            elif step in started:
+                self.record(f"{prefix}.{phase}", started.pop(step), time.time_ns())
+
+        return hook
+
+
+def start_detached(coro: Coroutine) -> asyncio.Task:
+    """
+    Start a task outside the current request's trace. Tasks copy the context
+    they are created in, so work that outlives the request (stitching,
+    mirroring) would otherwise keep adding spans to its finished trace.
+    """
+    context = contextvars.copy_context()
+    context.run(_current_span.set, None)
+    return context.run(asyncio.create_task, coro)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+
+def server_timing(trace: Trace, total_ms: float) -> str:
+    """Server-Timing header value: total request time plus the summed duration of each span name."""
+    entries = [f"total;dur={total_ms:.1f}"]
+    for name, duration in trace.timings.items():
+        entries.append(f"{name.replace(' ', '_')};dur={duration:.1f}")
+    return ", ".join(entries)
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the root span of every HTTP request.
+
+    An incoming W3C `traceparent` header continues the caller's trace. The
+    response carries `traceparent` (this request's span) and a
+    `Server-Timing` header with the time spent in each phase so far, e.g.
+    `total;dur=182.4, resolve;dur=0.1, upstream;dur=171.0, upstream.wait;dur=160.2`.
+    """
+
+    def __init__(self, app, tracer: "Tracer", timing_header: bool = True):
+        self.app = app
+        self.tracer = tracer
+        self.timing_header = timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        root = self.tracer.start_request(
+            f"{scope['method']} {scope['path']}", traceparent, {"http.request.method": scope["method"]}
+        )
+        token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.response.status_code", message["status"])
+                headers = list(message.get("headers", []))
+                headers.append((b"traceparent", root.traceparent.encode()))
+                if self.timing_header:
+                    total_ms = (time.time_ns() - root.start_ns) / 1e6
+                    headers.append((b"server-timing", server_timing(root.trace, total_ms).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            root.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                # Named by route template, like the metrics, rather than the raw path
+                root.name = f"{scope['method']} {route.path}"
+                root.set("http.route", route.path)
+            self.tracer.finish(root)
+
+
+def install_log_context() -> None:
+    """Give every log record a `trace_id` attribute ("-" outside a request) for use in log formats."""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "adds_trace_id", False):
+        return
+
+    def record_factory(*args, **kwargs) -> logging.LogRecord:
+        record = factory(*args, **kwargs)
+        record.trace_id = current_trace_id() or "-"
+        return record
+
+    record_factory.adds_trace_id = True
+    logging.setLogRecordFactory(record_factory)
+
+
+def _create_exporter() -> Optional[SpanExporter]:
+    target = (os.getenv("TRACE_EXPORTER") or "none").strip().lower()
+    service_name = os.getenv("OTEL_SERVICE_NAME") or "image2video-backend"
+    if target == "none":
+        return None
+    if target == "stdout":
+        return SpanExporter(sys.stdout, service_name)
+    if target == "file":
+        path = os.getenv("TRACE_FILE") or os.path.join(DATA_DIR, "traces.jsonl")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return SpanExporter(open(path, "a", buffering=1), service_name)
+    raise RuntimeError(f"Unsupported TRACE_EXPORTER: {target}. Use 'none', 'stdout' or 'file'")
+
+
+tracer = Tracer(_create_exporter(), env_float("TRACE_SAMPLE_RATIO", 1.0))
+SERVER_TIMING = env_bool("SERVER_TIMING", True)
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from services.settings import env_float, env_int
+from services.shared_state import SharedState
+from services.upload_store import UploadStore, upload_keys
+
+logger = logging.getLogger(__name__)
+
+# Index rows handled per query while expiring or evicting
+SWEEP_BATCH = 500
+
+
+class UploadJanitor:
+    """
+    Background task that keeps the upload store bounded.
+
+    Each sweep brings forward the expiry of uploads whose jobs finished (to
+    `release_grace` seconds from now), deletes expired files, then evicts the
+    least recently served files while the store holds more than `max_bytes`
+    (0 = no quota). Uploads used by jobs that are still running are never
+    removed. Candidates come from the upload index, so sweeps do not list the
+    upload directories; only the first sweep scans the top level once to move
+    files from the old flat layout into shards.
+
+    With several workers, only the one holding the janitor lease in `state`
+    sweeps; the others just write the last-served times they collected to
+    the index every `interval` seconds, for the sweeping worker to use.
+    """
+
+    def __init__(
+        self,
+        store: UploadStore,
+        state: SharedState,
+        interval: float,
+        release_grace: float,
+        max_bytes: int,
+        finished_images: Callable[[float], Awaitable[Set[str]]],
+        active_images: Callable[[], Awaitable[Set[str]]],
+    ):
+        self.store = store
+        self.state = state
+        self.owner = uuid.uuid4().hex
+        # Per host, since uploads live on the host's disk
+        self.lease = f"upload-janitor:{socket.gethostname()}"
+        self.interval = interval
+        self.release_grace = release_grace
+        self.max_bytes = max_bytes
+        self.finished_images = finished_images
+        self.active_images = active_images
+        self._task: Optional[asyncio.Task] = None
+        self._migrated = False
+        # Jobs that finished before this were handled by an earlier sweep (or already expired by TTL)
+        self._released_until = time.time() - store.ttl if store.ttl > 0 else 0.0
+        self.files = 0
+        self.bytes = 0
+        self.expired = 0
+        self.evicted = 0
+        self.sweeps = 0
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._tick()
+            except Exception:
+                logger.exception("Upload sweep failed")
+            await asyncio.sleep(self.interval)
+
+    async def _tick(self) -> None:
+        # Outlives one interval plus a slow sweep, so the lease only moves once its holder stops
+        if await self.state.acquire_lease(self.lease, self.owner, 2 * self.interval + 60):
+            await self.sweep()
+        else:
+            await run_in_threadpool(self.store.flush_access)
+            self.files, self.bytes = await run_in_threadpool(self.store.index.totals)
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                # Lets another worker take over at its next tick
+                await self.state.release_lease(self.lease, self.owner)
+            except Exception as exc:
+                logger.warning("Could not release the upload janitor lease: %s", exc)
+        await run_in_threadpool(self.store.flush_access)
+
+    async def sweep(self) -> Dict:
+        now = time.time()
+        if not self._migrated:
+            moved = await run_in_threadpool(self.store.migrate_flat_files)
+            self._migrated = True
+            if moved:
+                logger.info("Moved %s uploads into sharded directories", moved)
+        await run_in_threadpool(self.store.flush_access)
+
+        released = upload_keys(await self.finished_images(self._released_until))
+        if released:
+            await run_in_threadpool(self.store.index.release, released, now + self.release_grace)
+        self._released_until = now
+
+        protected = upload_keys(await self.active_images())
+        expired = await run_in_threadpool(self._delete_expired, now, protected)
+        evicted = await run_in_threadpool(self._enforce_quota, protected)
+        self.files, self.bytes = await run_in_threadpool(self.store.index.totals)
+        self.expired += expired
+        self.evicted += evicted
+        self.sweeps += 1
+        if expired or evicted:
+            logger.info("Upload sweep removed %s expired and %s evicted files", expired, evicted)
+        return {"expired": expired, "evicted": evicted}
+
+    def _delete_expired(self, now: float, protected: Set[str]) -> int:
+        deleted = skipped = 0
+        while True:
+            rows = self.store.index.expired(now, SWEEP_BATCH, skipped)
+            if not rows:
+                return deleted
+            victims = [row["filename"] for row in rows if row["sha256"] not in protected]
+            skipped += len(rows) - len(victims)
+            self.store.delete(victims)
+            deleted += len(victims)
+
+    def _enforce_quota(self, protected: Set[str]) -> int:
+        if self.max_bytes <= 0:
+            return 0
+        _, total = self.store.index.totals()
+        evicted = skipped = 0
+        while total > self.max_bytes:
+            rows = self.store.index.least_recent(SWEEP_BATCH, skipped)
+            if not rows:
+                break
+            victims = []
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                if row["sha256"] in protected:
+                    skipped += 1
+                    continue
+                victims.append(row["filename"])
+                total -= row["size"]
+            self.store.delete(victims)
+            evicted += len(victims)
+        return evicted
+
+    def stats(self) -> Dict:
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.store.ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "sweeps": self.sweeps,
+        }
+
+
+def create_upload_janitor(
+    store: UploadStore,
+    state: SharedState,
+    finished_images: Callable[[float], Awaitable[Set[str]]],
+    active_images: Callable[[], Awaitable[Set[str]]],
+) -> UploadJanitor:
+    return UploadJanitor(
+        store,
+        state,
+        interval=env_float("UPLOAD_JANITOR_INTERVAL", 300.0),
+        release_grace=env_float("UPLOAD_RELEASE_GRACE_SECONDS", 3600.0),
+        max_bytes=env_int("UPLOAD_QUOTA_BYTES", 5 * 1024 * 1024 * 1024),
+        finished_images=finished_images,
+        active_images=active_images,
+    )
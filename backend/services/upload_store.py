@@ -0,0 +1,475 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from services.metrics import upload_bytes, upload_seconds
+from services.settings import env_float, env_int
+
+# Magic-byte prefixes for the image formats providers accept: (offset, signature, content type, extension)
+IMAGE_SIGNATURES = (
+    (0, b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (0, b"GIF87a", "image/gif", ".gif"),
+    (0, b"GIF89a", "image/gif", ".gif"),
+    (8, b"WEBP", "image/webp", ".webp"),
+)
+
+# Bytes needed to recognise every signature above
+SNIFF_BYTES = 16
+
+# Content-addressed names (<sha256>.<ext>) plus legacy uuid names; no separators or dotfiles
+SAFE_FILENAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,127}\.[A-Za-z0-9]{1,5}$")
+CONTENT_ADDRESSED_FILENAME = re.compile(r"^([0-9a-f]{64}(?:-[a-z0-9]+)?)\.[a-z0-9]{1,5}$")
+
+# Public upload URLs, as handed to providers in image_url
+UPLOAD_URL_FILENAME = re.compile(r"/api/uploads/([^/?#]+)")
+
+# Partial writes older than this were left behind by a crash
+STALE_PART_SECONDS = 3600
+
+# Stored files never change in place, so browsers and CDNs may cache them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def sniff_image_type(header: bytes) -> Optional[Tuple[str, str]]:
+    """Return (content_type, extension) for a supported image header, else None."""
+    for offset, signature, content_type, extension in IMAGE_SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            if signature == b"WEBP" and not header.startswith(b"RIFF"):
+                continue
+            return content_type, extension
+    return None
+
+
+def content_key(filename: str) -> str:
+    """SHA-256 an original and its derivatives share (the name stem for legacy uploads)."""
+    match = CONTENT_ADDRESSED_FILENAME.match(filename)
+    return match.group(1)[:64] if match else os.path.splitext(filename)[0]
+
+
+def upload_keys(urls: Iterable[Optional[str]]) -> Set[str]:
+    """Content keys of the uploads referenced by `urls`; other URLs are ignored."""
+    keys = set()
+    for url in urls:
+        match = UPLOAD_URL_FILENAME.search(url or "")
+        if match:
+            keys.add(content_key(match.group(1)))
+    return keys
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large (max {max_bytes / (1024 * 1024):.1f} MB)",
+    )
+
+
+async def serve_file(path: str, request_headers: Headers, etag: Optional[str] = None,
+                     cache_control: str = IMMUTABLE_CACHE_CONTROL) -> Response:
+    """
+    Serve a file that never changes in place.
+
+    Conditional requests get 304 Not Modified; Range/If-Range and zero-copy
+    pathsend (on servers that support it) are handled by FileResponse. Without
+    an explicit `etag` one is derived from mtime and size.
+    """
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    etag = etag or f'"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request_headers.get("if-modified-since")
+        not_modified = bool(if_modified_since) and _not_modified_since(if_modified_since, stat_result.st_mtime)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, headers=headers, stat_result=stat_result)
+
+
+class UploadIndex:
+    """
+    Small SQLite index mapping content hashes to upload metadata, plus one
+    row per stored file (originals and derivatives) with its size, last
+    access and expiry, so lifecycle sweeps never list the upload directories.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        # Every worker process opens the same index; writers wait for each other instead of failing
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS uploads (
+                    sha256 TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_type TEXT NOT NULL,
+                    original_name TEXT,
+                    created_at REAL NOT NULL,
+                    upload_count INTEGER NOT NULL DEFAULT 1
+                )
+                """
+            )
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    filename TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256);
+                CREATE INDEX IF NOT EXISTS idx_files_expires ON files (expires_at);
+                CREATE INDEX IF NOT EXISTS idx_files_last_access ON files (last_access);
+                """
+            )
+
+    def record(self, sha256: str, filename: str, size: int, content_type: str, original_name: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO uploads (sha256, filename, size, content_type, original_name, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET upload_count = upload_count + 1
+                """,
+                (sha256, filename, size, content_type, original_name, time.time()),
+            )
+
+    def get(self, sha256: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, filename, size, content_type, original_name, created_at, upload_count "
+                "FROM uploads WHERE sha256 = ?",
+                (sha256,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("sha256", "filename", "size", "content_type", "original_name", "created_at", "upload_count")
+        return dict(zip(keys, row))
+
+    def track(self, filename: str, sha256: str, size: int, last_access: float, expires_at: float) -> None:
+        """Add a stored file; storing it again refreshes its last access and can only extend its expiry."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO files (filename, sha256, size, last_access, expires_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    last_access = MAX(files.last_access, excluded.last_access),
+                    expires_at = MAX(files.expires_at, excluded.expires_at)
+                """,
+                (filename, sha256, size, last_access, expires_at),
+            )
+
+    def touch(self, accesses: Iterable[Tuple[str, float]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE files SET last_access = MAX(last_access, ?) WHERE filename = ?",
+                [(at, filename) for filename, at in accesses],
+            )
+
+    def release(self, sha256s: Iterable[str], expires_at: float) -> None:
+        """Bring forward the expiry of every file with these content hashes."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE files SET expires_at = MIN(expires_at, ?) WHERE sha256 = ?",
+                [(expires_at, sha256) for sha256 in sha256s],
+            )
+
+    def _files(self, where: str, order: str, params: Tuple, limit: int, offset: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT filename, sha256, size FROM files {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [{"filename": row[0], "sha256": row[1], "size": row[2]} for row in rows]
+
+    def expired(self, now: float, limit: int, offset: int = 0) -> List[Dict]:
+        return self._files("WHERE expires_at < ?", "expires_at", (now,), limit, offset)
+
+    def least_recent(self, limit: int, offset: int = 0) -> List[Dict]:
+        return self._files("", "last_access", (), limit, offset)
+
+    def totals(self) -> Tuple[int, int]:
+        """(file count, total bytes) of every tracked file."""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        return count, total
+
+    def remove(self, filenames: List[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM files WHERE filename = ?", [(name,) for name in filenames])
+            self._conn.executemany("DELETE FROM uploads WHERE filename = ?", [(name,) for name in filenames])
+
+
+class UploadStore:
+    """
+    Content-addressed store for uploaded images.
+
+    Chunks are copied from the request's spooled upload to disk through the
+    thread pool, hashing as they go, so neither the full image nor blocking
+    file I/O ever sits on the event loop. Files are named by their SHA-256,
+    so re-uploading the same image returns the existing file and URL. The
+    size cap is enforced while copying and the image type is decided by
+    magic bytes, not the client's content_type.
+
+    Files live in subdirectories named by the first two characters of the
+    filename (256 shards for content-addressed names), so no directory
+    grows large. Every stored file is tracked in the index with an expiry
+    `ttl` seconds after its last upload (0 keeps files until evicted); the
+    UploadJanitor enforces expiry and the disk quota.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, chunk_size: int = 1024 * 1024, ttl: float = 0.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        # Dot-prefixed so it is never served as an upload
+        self.index = UploadIndex(os.path.join(directory, ".index.sqlite3"))
+        # filename -> last time it was served, written to the index in batches by flush_access
+        self._accessed: Dict[str, float] = {}
+
+    def path_for(self, filename: str) -> str:
+        return os.path.join(self.directory, filename[:2], filename)
+
+    def legacy_path_for(self, filename: str) -> str:
+        """Location in the old flat layout, until migrate_flat_files has moved it."""
+        return os.path.join(self.directory, filename)
+
+    def expires_at(self, now: float) -> float:
+        return now + self.ttl if self.ttl > 0 else float("inf")
+
+    async def save(self, file: UploadFile) -> Dict:
+        started = time.perf_counter()
+        first = await file.read(self.chunk_size)
+        sniffed = sniff_image_type(first[:SNIFF_BYTES])
+        if sniffed is None:
+            raise HTTPException(
+                status_code=400,
+                detail="File must be a JPEG, PNG, GIF or WebP image",
+            )
+        content_type, extension = sniffed
+
+        digest = hashlib.sha256()
+        part_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.part")
+        handle = await run_in_threadpool(open, part_path, "wb")
+        size = 0
+        try:
+            chunk = first
+            while chunk:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise _too_large(self.max_bytes)
+                await run_in_threadpool(self._write_chunk, handle, digest, chunk)
+                chunk = await file.read(self.chunk_size)
+            await run_in_threadpool(handle.close)
+        except BaseException:
+            await run_in_threadpool(self._discard, handle, part_path)
+            raise
+
+        sha256 = digest.hexdigest()
+        filename = f"{sha256}{extension}"
+        deduplicated = await run_in_threadpool(self._commit, part_path, filename)
+        await run_in_threadpool(
+            self.index.record, sha256, filename, size, content_type, file.filename or ""
+        )
+        now = time.time()
+        await run_in_threadpool(self.index.track, filename, sha256, size, now, self.expires_at(now))
+        upload_bytes.observe(value=size)
+        upload_seconds.observe(value=time.perf_counter() - started)
+        return {
+            "filename": filename,
+            "sha256": sha256,
+            "size": size,
+            "content_type": content_type,
+            "deduplicated": deduplicated,
+        }
+
+    async def track_derivative(self, sha256: str, filename: str) -> None:
+        """Index a derivative rendered from the upload `sha256`, so it expires and is evicted with the rest."""
+        try:
+            size = (await run_in_threadpool(os.stat, self.path_for(filename))).st_size
+        except FileNotFoundError:
+            return
+        now = time.time()
+        await run_in_threadpool(self.index.track, filename, sha256, size, now, self.expires_at(now))
+
+    def resolve(self, filename: str) -> Optional[str]:
+        """Map a public filename to its path, refusing anything that could escape the store."""
+        if not SAFE_FILENAME.match(filename):
+            return None
+        path = self.path_for(filename)
+        if os.path.dirname(os.path.dirname(os.path.realpath(path))) != os.path.realpath(self.directory):
+            return None
+        return path
+
+    async def serve(self, filename: str, request_headers: Headers) -> Response:
+        """
+        Serve a stored file with strong validators and long-lived caching.
+
+        Content-addressed files use their SHA-256 as a strong ETag; see serve_file.
+        """
+        path = self.resolve(filename)
+        if path is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        match = CONTENT_ADDRESSED_FILENAME.match(filename)
+        etag = f'"{match.group(1)}"' if match else None
+        try:
+            response = await serve_file(path, request_headers, etag)
+        except HTTPException:
+            # Not moved into its shard yet
+            response = await serve_file(self.legacy_path_for(filename), request_headers, etag)
+        self._accessed[filename] = time.time()
+        return response
+
+    def flush_access(self) -> None:
+        """Write the last-served times collected since the previous flush to the index."""
+        accessed, self._accessed = self._accessed, {}
+        if accessed:
+            self.index.touch(accessed.items())
+
+    def delete(self, filenames: List[str]) -> None:
+        for filename in filenames:
+            try:
+                os.remove(self.path_for(filename))
+            except FileNotFoundError:
+                pass
+        self.index.remove(filenames)
+
+    def migrate_flat_files(self) -> int:
+        """
+        Move files from the old flat layout into their shards and index them;
+        also drops partial writes left by a crash. Returns the number moved.
+        """
+        moved = 0
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat_result = entry.stat()
+                if entry.name.endswith(".part"):
+                    if now - stat_result.st_mtime > STALE_PART_SECONDS:
+                        os.remove(entry.path)
+                    continue
+                if not SAFE_FILENAME.match(entry.name):
+                    continue
+                os.makedirs(os.path.dirname(self.path_for(entry.name)), exist_ok=True)
+                os.replace(entry.path, self.path_for(entry.name))
+                self.index.track(
+                    entry.name, content_key(entry.name), stat_result.st_size,
+                    stat_result.st_mtime, self.expires_at(stat_result.st_mtime),
+                )
+                moved += 1
+        return moved
+
+    @staticmethod
+    def _write_chunk(handle, digest, chunk: bytes) -> None:
+        handle.write(chunk)
+        digest.update(chunk)
+
+    def _commit(self, part_path: str, filename: str) -> bool:
+        """Move the part file into place; returns True if the content already existed."""
+        final_path = self.path_for(filename)
+        if os.path.exists(final_path):
+            os.remove(part_path)
+            return True
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(part_path, final_path)
+        return False
+
+    @staticmethod
+    def _discard(handle, part_path: str) -> None:
+        handle.close()
+        try:
+            os.remove(part_path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects oversized uploads from their Content-Length header before the
+    multipart body is read. Chunked uploads without a length are still
+    capped by UploadStore while streaming.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length and content_length.isdigit():
+                if int(content_length) > self.max_bytes + MULTIPART_OVERHEAD:
+                    exc = _too_large(self.max_bytes)
+                    body = json.dumps({"detail": exc.detail}).encode()
+                    await send(
+                        {
+                            "type": "http.response.start",
+                            "status": exc.status_code,
+                            "headers": [
+                                (b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close"),
+                            ],
+                        }
+                    )
+                    await send({"type": "http.response.body", "body": body})
+                    return
+        await self.app(scope, receive, send)
+
+
+UPLOAD_MAX_BYTES = env_int("UPLOAD_MAX_BYTES", 20 * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = env_int("UPLOAD_CHUNK_BYTES", 1024 * 1024)
+# Seconds an upload is kept after it was last uploaded (0 = until evicted by the quota)
+UPLOAD_TTL_SECONDS = env_float("UPLOAD_TTL_SECONDS", 7 * 86400.0)
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from services.http_client import build_limits, build_timeout
+from services.settings import DATA_DIR, env_bool, env_int
+from services.shared_state import SharedState
+from services.tracing import start_detached
+
+logger = logging.getLogger(__name__)
+
+# Seconds a download holds its lease between renewals; a worker that dies mid-download blocks others this long
+DOWNLOAD_LEASE_SECONDS = 60.0
+LEASE_POLL_SECONDS = 0.5
+# A .part file nobody has written to for this long belongs to a download whose worker died
+STALE_PART_SECONDS = 3600.0
+
+
+class VideoTooLarge(Exception):
+    pass
+
+
+class VideoMirror:
+    """
+    Local copies of finished videos, so viewers are not sent to slow,
+    expiring provider links.
+
+    Videos are streamed to disk chunk by chunk (never held in memory), one
+    download per video however many requests ask for it at once. Worker
+    processes share the directory as their index: a worker downloads a
+    video only while holding its lease in shared state (the others wait for
+    its file), serving a video touches the file's mtime, and the cap of
+    `max_bytes` applies to the whole directory, evicting the least recently
+    served videos first.
+    """
+
+    def __init__(self, state: SharedState, directory: str, max_bytes: int, chunk_size: int = 1024 * 1024,
+                 enabled: bool = True):
+        self.state = state
+        self.owner = uuid.uuid4().hex
+        # Per host, since each host mirrors to its own disk
+        self._lease_prefix = f"video-mirror:{socket.gethostname()}:"
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.enabled = enabled
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._prefetches: Set[asyncio.Task] = set()
+        # filename -> size as of the last directory scan, including other workers' videos
+        self._entries: Dict[str, int] = {}
+        self._total = 0
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """(mtime, filename, size) of every mirrored video, least recently served first."""
+        files = []
+        stale = time.time() - STALE_PART_SECONDS
+        for entry in os.scandir(self.directory):
+            try:
+                stat_result = entry.stat()
+                if entry.name.endswith(".part"):
+                    # Other workers may be writing theirs right now
+                    if stat_result.st_mtime < stale:
+                        os.remove(entry.path)
+                elif entry.is_file():
+                    files.append((stat_result.st_mtime, entry.name, stat_result.st_size))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        self._entries = {name: size for _, name, size in files}
+        self._total = sum(size for _, _, size in files)
+        return files
+
+    @staticmethod
+    def filename(provider: str, task_id: str) -> str:
+        return hashlib.sha256(f"{provider}/{task_id}".encode()).hexdigest() + ".mp4"
+
+    @staticmethod
+    def mirror_path(provider: str, task_id: str) -> str:
+        """Public path (under the API) the mirrored video is served from."""
+        return f"/api/videos/{provider}/{task_id}"
+
+    def path_for(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    async def cached(self, provider: str, task_id: str) -> Optional[str]:
+        """Path of a mirrored video (by any worker), marked as recently served, or None."""
+        return await self._touch(self.filename(provider, task_id))
+
+    async def _touch(self, filename: str) -> Optional[str]:
+        path = self.path_for(filename)
+        try:
+            # The mtime is the recency every worker's eviction goes by
+            await run_in_threadpool(os.utime, path)
+        except FileNotFoundError:
+            self._entries.pop(filename, None)
+            return None
+        return path
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=build_limits(), timeout=build_timeout(), follow_redirects=True)
+        return self._client
+
+    async def aclose(self) -> None:
+        for task in list(self._prefetches):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def ensure(self, provider: str, task_id: str, result_url: str) -> str:
+        """Return the local path of the video, downloading it first if needed."""
+        filename = self.filename(provider, task_id)
+        path = await self._touch(filename)
+        if path is not None:
+            return path
+
+        pending = self._pending.get(filename)
+        if pending is None:
+            pending = start_detached(self._fetch(filename, result_url))
+            self._pending[filename] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(filename, None))
+        # Shielded so a viewer disconnecting does not abort the download for everyone else
+        return await asyncio.shield(pending)
+
+    def prefetch(self, provider: str, task_id: str, result_url: str) -> None:
+        """Start mirroring a finished video in the background."""
+        if not self.enabled or not result_url or self.filename(provider, task_id) in self._entries:
+            return
+
+        async def run() -> None:
+            try:
+                await self.ensure(provider, task_id, result_url)
+            except Exception as exc:
+                logger.warning("Could not mirror %s video %s: %s", provider, task_id, exc)
+
+        task = start_detached(run())
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetches.discard)
+
+    async def _fetch(self, filename: str, result_url: str) -> str:
+        """Download a video under its lease, or use the copy another worker downloaded meanwhile."""
+        lease = self._lease_prefix + filename
+        while not await self.state.acquire_lease(lease, self.owner, DOWNLOAD_LEASE_SECONDS):
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+        try:
+            path = await self._touch(filename)
+            if path is not None:
+                return path
+            return await self._download(filename, result_url, lease)
+        finally:
+            await self.state.release_lease(lease, self.owner)
+
+    async def _download(self, filename: str, result_url: str, lease: str) -> str:
+        part_path = self.path_for(f".{uuid.uuid4().hex}.part")
+        handle = await run_in_threadpool(open, part_path, "wb")
+        size = 0
+        renew_at = time.monotonic() + DOWNLOAD_LEASE_SECONDS / 3
+        try:
+            async with self.client.stream("GET", result_url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise VideoTooLarge(f"video exceeds the mirror cap of {self.max_bytes} bytes")
+                    await run_in_threadpool(handle.write, chunk)
+                    if time.monotonic() >= renew_at:
+                        await self.state.acquire_lease(lease, self.owner, DOWNLOAD_LEASE_SECONDS)
+                        renew_at = time.monotonic() + DOWNLOAD_LEASE_SECONDS / 3
+            await run_in_threadpool(handle.close)
+            await run_in_threadpool(os.replace, part_path, self.path_for(filename))
+        except BaseException:
+            await run_in_threadpool(self._discard, handle, part_path)
+            raise
+
+        await run_in_threadpool(self._evict, filename)
+        logger.info("Mirrored %s (%s bytes)", filename, size)
+        return self.path_for(filename)
+
+    def _evict(self, keep: str) -> None:
+        """Remove the least recently served videos, whichever worker mirrored them, until under the cap."""
+        files = self._scan()
+        for _, filename, size in files:
+            if self._total <= self.max_bytes:
+                break
+            if filename == keep:
+                continue
+            try:
+                os.remove(self.path_for(filename))
+            except FileNotFoundError:
+                pass
+            self._entries.pop(filename, None)
+            self._total -= size
+
+    @staticmethod
+    def _discard(handle, part_path: str) -> None:
+        handle.close()
+        try:
+            os.remove(part_path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "videos": len(self._entries),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "downloading": len(self._pending),
+        }
+
+
+def create_video_mirror(state: SharedState) -> VideoMirror:
+    return VideoMirror(
+        state,
+        os.getenv("VIDEO_MIRROR_DIR") or os.path.join(DATA_DIR, "videos"),
+        max_bytes=env_int("VIDEO_MIRROR_MAX_BYTES", 5 * 1024 * 1024 * 1024),
+        chunk_size=env_int("VIDEO_MIRROR_CHUNK_BYTES", 1024 * 1024),
+        enabled=env_bool("VIDEO_MIRROR"),
+    )
@@ -0,0 +1,62 @@
+import hashlib
+import hmac
+import logging
+import os
+from typing import Optional
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+
+from services.settings import env_float
+
+logger = logging.getLogger(__name__)
+
+# Public URL the providers can reach this backend on, e.g. https://api.example.com
+WEBHOOK_BASE_URL = (os.getenv("WEBHOOK_BASE_URL") or "").strip().rstrip("/")
+WEBHOOK_SECRET = (os.getenv("WEBHOOK_SECRET") or "").strip()
+
+# Seconds between fallback polls (and lifetime of cached statuses) for jobs that report back by webhook
+WEBHOOK_FALLBACK_INTERVAL = env_float("WEBHOOK_FALLBACK_INTERVAL", 120.0)
+
+# Header carrying an HMAC-SHA256 of the raw body, for providers that sign their callbacks
+SIGNATURE_HEADERS = {"heygen": "signature"}
+DEFAULT_SIGNATURE_HEADER = "x-signature"
+
+
+def _webhooks_enabled() -> bool:
+    if WEBHOOK_BASE_URL and not WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_BASE_URL is set but WEBHOOK_SECRET is not; provider webhooks are disabled")
+        return False
+    return bool(WEBHOOK_BASE_URL)
+
+
+WEBHOOKS_ENABLED = _webhooks_enabled()
+
+
+def webhook_token(provider: str) -> str:
+    """Per-provider path token, so a URL leaked by one provider cannot post updates for another."""
+    return hmac.new(WEBHOOK_SECRET.encode(), provider.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def webhook_url(provider: str) -> Optional[str]:
+    """Callback URL to hand to `provider`, or None when webhooks are not configured."""
+    if not WEBHOOKS_ENABLED:
+        return None
+    return f"{WEBHOOK_BASE_URL}/api/webhooks/{provider}/{webhook_token(provider)}"
+
+
+def verify_webhook(provider: str, token: str, body: bytes, headers: Headers) -> None:
+    """
+    Reject callbacks that do not carry the provider's path token, or, when
+    <PROVIDER>_WEBHOOK_SIGNING_SECRET is set, a valid HMAC-SHA256 body signature.
+    """
+    if not WEBHOOKS_ENABLED or not hmac.compare_digest(token.encode(), webhook_token(provider).encode()):
+        # Same answer whether webhooks are off or the token is wrong
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    signing_secret = (os.getenv(f"{provider.upper()}_WEBHOOK_SIGNING_SECRET") or "").strip()
+    if signing_secret:
+        signature = headers.get(SIGNATURE_HEADERS.get(provider, DEFAULT_SIGNATURE_HEADER), "")
+        expected = hmac.new(signing_secret.encode(), body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature.lower().removeprefix("sha256=").encode(), expected.encode()):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
@@ -18,12 +18,15 @@ function App() {
   const [loading, setLoading] = useState(false)
   const [uploading, setUploading] = useState(false)
   const [polling, setPolling] = useState(false)
-  const intervalRef = useRef(null)
+  const eventSourceRef = useRef(null)
   const fileInputRef = useRef(null)
   const hasHydratedRef = useRef(false)
 
   const API_BASE = BACKEND_URL
 
+  // Prefer the backend's local copy of the video when it mirrors results
+  const videoUrl = (data) => (data.mirror_url ? `${API_BASE}${data.mirror_url}` : data.result_url)
+
   useEffect(() => {
     if (typeof window === 'undefined') return
     try {
@@ -94,7 +97,8 @@ function App() {
       const formData = new FormData()
       formData.append('file', selectedFile)
 
-      const response = await fetch(`${API_BASE}/api/upload-image`, {
+      // The provider preset lets the backend resize the image for that provider
+      const response = await fetch(`${API_BASE}/api/upload-image?provider=${encodeURIComponent(provider)}`, {
         method: 'POST',
         body: formData,
       })
@@ -124,7 +128,7 @@ function App() {
       let errorMessage = error.message || 'An unexpected error occurred'
       
       // Make error messages more user-friendly
-      if (errorMessage.includes('must be an image')) {
+      if (errorMessage.includes('must be a')) {
         errorMessage = 'Please select a valid image file (JPG, PNG, etc.)'
       } else if (errorMessage.includes('network') || errorMessage.includes('fetch')) {
         errorMessage = `Network error: Could not connect to the server. Make sure the backend is running at ${API_BASE}.`
@@ -192,6 +196,8 @@ function App() {
       }
 
       const data = await response.json()
+      // In auto mode the backend reports which provider actually took the job
+      if (data.provider) setProvider(data.provider)
       setTaskId(data.task_id)
       setStatus(data.status)
     } catch (error) {
@@ -245,7 +251,7 @@ function App() {
       setFailedMessage(data.failed_message || '')
 
       if (data.status === 'completed' && data.result_url) {
-        setResultUrl(data.result_url)
+        setResultUrl(videoUrl(data))
         setPolling(false)
       } else if (data.status === 'failed') {
         setPolling(false)
@@ -266,63 +272,63 @@ function App() {
   const startPolling = () => {
     if (!taskId || polling) return
 
-    // Clear any existing interval
-    if (intervalRef.current) {
-      clearInterval(intervalRef.current)
+    // Close any existing stream
+    if (eventSourceRef.current) {
+      eventSourceRef.current.close()
     }
 
     setPolling(true)
 
-    // Initial check
-    const checkStatus = async () => {
-      try {
-        const response = await fetch(`${API_BASE}/api/status/${provider}/${taskId}`)
-        
-        if (!response.ok) {
-          clearInterval(intervalRef.current)
-          setPolling(false)
-          intervalRef.current = null
-          return
-        }
-
-        const data = await response.json()
-        setStatus(data.status)
-        setFailedMessage(data.failed_message || '')
-
-        if (data.status === 'completed' && data.result_url) {
-          setResultUrl(data.result_url)
-          clearInterval(intervalRef.current)
-          setPolling(false)
-          intervalRef.current = null
-        } else if (data.status === 'failed') {
-          clearInterval(intervalRef.current)
-          setPolling(false)
-          intervalRef.current = null
-          const failMsg = data.failed_message || 'Unknown error'
-          alert(`Task failed: ${failMsg}`)
-          setFailedMessage(failMsg)
-        }
-      } catch (error) {
-        clearInterval(intervalRef.current)
-        setPolling(false)
-        intervalRef.current = null
-        const errorMessage = error.message || 'Error checking status'
-        console.error('Polling error:', error)
-        setFailedMessage(errorMessage)
+    const closeStream = () => {
+      if (eventSourceRef.current) {
+        eventSourceRef.current.close()
+        eventSourceRef.current = null
       }
+      setPolling(false)
     }
 
-    // Check immediately
-    checkStatus()
+    // The backend polls the provider and pushes status changes as Server-Sent Events
+    const source = new EventSource(`${API_BASE}/api/events/${provider}/${taskId}`)
+    eventSourceRef.current = source
+
+    source.addEventListener('status', (event) => {
+      const data = JSON.parse(event.data)
+      setStatus(data.status)
+      setFailedMessage(data.failed_message || '')
 
-    // Then poll every 3 seconds
-    intervalRef.current = setInterval(checkStatus, 3000)
+      if (data.status === 'completed' && data.result_url) {
+        setResultUrl(videoUrl(data))
+        closeStream()
+      } else if (data.status === 'failed') {
+        closeStream()
+        const failMsg = data.failed_message || 'Unknown error'
+        alert(`Task failed: ${failMsg}`)
+        setFailedMessage(failMsg)
+      }
+    })
+
+    source.addEventListener('status-error', (event) => {
+      const data = JSON.parse(event.data)
+      console.error('Status update error:', data.detail)
+    })
+
+    source.addEventListener('end', () => {
+      closeStream()
+    })
+
+    source.onerror = () => {
+      // EventSource reconnects on its own unless the connection was closed for good
+      if (source.readyState === EventSource.CLOSED) {
+        closeStream()
+        setFailedMessage('Lost connection to the status stream')
+      }
+    }
   }
 
   const stopPolling = () => {
-    if (intervalRef.current) {
-      clearInterval(intervalRef.current)
-      intervalRef.current = null
+    if (eventSourceRef.current) {
+      eventSourceRef.current.close()
+      eventSourceRef.current = null
       setPolling(false)
     }
   }
@@ -338,8 +344,8 @@ function App() {
   // Cleanup on unmount
   useEffect(() => {
     return () => {
-      if (intervalRef.current) {
-        clearInterval(intervalRef.current)
+      if (eventSourceRef.current) {
+        eventSourceRef.current.close()
       }
     }
   }, [])
@@ -379,6 +385,7 @@ function App() {
               <option value="a2e">A2E</option>
               <option value="did">D-ID</option>
               <option value="heygen">HeyGen</option>
+              <option value="auto">Auto (fastest available)</option>
             </select>
           </div>
 
@@ -510,14 +517,14 @@ function App() {
                     onClick={startPolling} 
                     className="btn btn-secondary"
                   >
-                    Start Auto-Polling
+                    Start Live Updates
                   </button>
                 ) : (
                   <button 
                     onClick={stopPolling} 
                     className="btn btn-secondary"
                   >
-                    Stop Polling
+                    Stop Live Updates
                   </button>
                 )}
               </>